@@ -18,20 +18,25 @@ import matplotlib.cm as cm
 import gplately
 from gplately import pygplates
 import multiprocessing
+from resolved_topology_cache import ResolvedTopologyCache
 
 
-def SubductionZone(rotation_model, topology_features, age):
-    # Resolve our topological plate polygons (and deforming networks) to the current 'time'.
-    resolved_topologies = []
-    pygplates.resolve_topologies(topology_features, rotation_model, resolved_topologies, age)
-    
-    subduction = []
-    for resolved_topology in resolved_topologies:
-        boundary_sub_segments = resolved_topology.get_boundary_sub_segments()
-        for boundary_sub_segment in boundary_sub_segments:
-            if boundary_sub_segment.get_resolved_feature().get_feature_type() == pygplates.FeatureType.gpml_subduction_zone:
-                sub_segment_points = boundary_sub_segment.get_resolved_geometry().to_lat_lon_list()
-                subduction.append(sub_segment_points)
+def SubductionZone(rotation_model, topology_features, age, topology_cache=None):
+    if topology_cache is not None:
+        # load the subduction zone geometries cached on disk (resolving the topologies only if not cached yet)
+        subduction = topology_cache.get_boundary_segments(rotation_model, topology_features, age, 'gpml:SubductionZone')
+    else:
+        # Resolve our topological plate polygons (and deforming networks) to the current 'time'.
+        resolved_topologies = []
+        pygplates.resolve_topologies(topology_features, rotation_model, resolved_topologies, age)
+        
+        subduction = []
+        for resolved_topology in resolved_topologies:
+            boundary_sub_segments = resolved_topology.get_boundary_sub_segments()
+            for boundary_sub_segment in boundary_sub_segments:
+                if boundary_sub_segment.get_resolved_feature().get_feature_type() == pygplates.FeatureType.gpml_subduction_zone:
+                    sub_segment_points = boundary_sub_segment.get_resolved_geometry().to_lat_lon_list()
+                    subduction.append(sub_segment_points)
 
     # refine the subduction zone to the specified interval
     interval = 1.0
@@ -405,6 +410,7 @@ if __name__=='__main__':
     if not use_local_files:
         gdownload = gplately.download.DataServer("Muller2019")
         rotation_model, topology_features, static_polygons = gdownload.get_plate_reconstruction_files()
+        topology_cache = None
     #loading local files
     if use_local_files:
         input_directory = "./Muller_etal_2019_PlateMotionModel_v2.0_Tectonics_Updated/"
@@ -422,6 +428,8 @@ if __name__=='__main__':
                 topology_features.add( pygplates.FeatureCollection(topology_filename) )
             else:
                 topology_filenames.remove(topology_filename)
+        # cache the resolved topologies (keyed by the contents of the model files) for later runs
+        topology_cache = ResolvedTopologyCache('Resolved_topologies_cache/', rotation_filenames + topology_filenames)
     
     
     output_path = 'Carbon_VolumeDensity_SubductionZone/mean/'
@@ -434,7 +442,7 @@ if __name__=='__main__':
     reconstruction_age = np.arange(0, 100)
     for age in reconstruction_age:
         # step1: extract the location of past subduction zone from plate motion model
-        subduction = SubductionZone(rotation_model, topology_features, age)
+        subduction = SubductionZone(rotation_model, topology_features, age, topology_cache)
         p.apply_async(calculate_carbon_subduction, args=(age, subduction, output_path))
     p.close()
     p.join()
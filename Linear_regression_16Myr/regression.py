@@ -9,177 +9,555 @@ This code aimed to find the linear relationship between pCO2, tectonic degassing
 @author: shenhao
 @email: shenhao@mail.iggcas.ac.cn
 """
-import pandas as pd
+import os
+import sys
 import numpy as np
-import csv
+import warnings
+import multiprocessing
 import scipy
-from scipy import interpolate
-from scipy.optimize import curve_fit
+import scipy.special
 from scipy.stats import pearsonr
 from sklearn import linear_model
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from proxy_data import load_carbon_flux, load_Li_isotope, load_CO2, load_temperature, load_flux_file
 
 
-def load_carbon_flux(file):
-    df = pd.read_csv(file)
-    age = np.array(df['# time'][0:65])
-    carbon_flux = np.array(df['total_subducted_mean  (Mt C/yr)'][0:65])
 
-    # Normalization
-    flux_max = carbon_flux.max()
-    flux_min = carbon_flux.min()
-    carbon_flux_normalized = (carbon_flux-flux_min) / (flux_max-flux_min)
+def cosine_taper(freqs, flimit):
+    fl1, fl2 = flimit
+    taper = np.zeros_like(freqs)
     
-    return age, carbon_flux_normalized
+    a = (fl1 <= freqs) & (freqs <= fl2)
+    taper[a] = 0.5 * (1.0 + np.cos(np.pi * (freqs[a] - fl1) / (fl2 - fl1)))
 
+    b = freqs < fl1
+    taper[b] = 1.0
 
+    return taper
+    
+    
 
-def load_Li_isotope(file):
-    df = pd.read_excel(file, sheet_name='All Foram')
-    Age = np.array(df['Age'])[3:]
-    Li_isotope = np.array(df['Li'])[3:]
+def design_matrix(t, Age_flux, carbon_flux, Age_Li, Li_isotope, w_carbon=None):
+    '''
+    the columns (F_carbon, w_carbon*F_weathering, 1) of the model a*F_carbon + b*w_carbon*F_weathering + c
+    at ages t, so the model is X @ (a, b, c)
+    
+    the flux and Li isotope are interpolated only once (rather than at every model evaluation),
+    w_carbon (on the flux ages) defaults to the carbon flux itself
+    '''
+    if w_carbon is None:
+        w_carbon = carbon_flux
+    F_carbon = np.interp(t, Age_flux, carbon_flux)
+    w_carbon = np.interp(t, Age_flux, w_carbon)
+    F_weathering = np.interp(t, Age_Li, Li_isotope)
+    
+    return np.column_stack((F_carbon, w_carbon*F_weathering, np.ones_like(F_carbon)))
+
+
+
+def credible_interval(X, popt, pcov, size=1000, interval=95):
+    '''
+    lower and upper bounds of the credible interval of the model with design matrix X,
+    all parameter samples are evaluated in one matrix product (so size=100000 is cheap)
+    '''
+    param_samples = np.random.multivariate_normal(popt, pcov, size=size)
+    y_samples = param_samples @ X.T
+    y_lower, y_upper = np.percentile(y_samples, [(100-interval)/2, (100+interval)/2], axis=0)
+    
+    return y_lower, y_upper
+
+
+
+def lagged_design_matrices(t, lags, Age_flux, carbon_flux, Age_Li, Li_isotope, w_carbon=None):
+    '''
+    design matrices (lag, t, 3) of the model a*F_carbon(t+lag) + b*w_carbon(t+lag)*F_weathering(t) + c
+    for all lags (see design_matrix)
+    
+    also returns which samples (lag, t) are valid, ie, t+lag is not past the carbon flux ages
+    (np.interp would just repeat the oldest flux)
+    '''
+    if w_carbon is None:
+        w_carbon = carbon_flux
+    t = np.asarray(t, dtype=float)
+    lagged_t = t[np.newaxis, :] + np.asarray(lags, dtype=float)[:, np.newaxis]
+    F_carbon = np.interp(lagged_t, Age_flux, carbon_flux)
+    w_carbon = np.interp(lagged_t, Age_flux, w_carbon)
+    F_weathering = np.interp(t, Age_Li, Li_isotope)
+    
+    X = np.stack((F_carbon, w_carbon*F_weathering, np.ones_like(F_carbon)), axis=-1)
+    valid = (lagged_t >= np.min(Age_flux)) & (lagged_t <= np.max(Age_flux))
+    return X, valid
+
+
+
+def weighted_linear_fits(X, y, weights):
+    '''
+    closed-form weighted least-squares fits of the linear model with design matrices X (..., t, 3)
+    to series y with sample weights (..., t), eg, zero for invalid samples or bootstrap counts
+    
+    returns the parameters, root-mean-square misfit and correlation coefficient of each fit
+    (inf misfit and NaN correlation where there are too few samples to fit)
+    '''
+    XX = np.einsum('...t,...ti,...tj->...ij', weights, X, X)
+    Xy = np.einsum('...t,...ti,t->...i', weights, X, y)
+    yy = np.einsum('...t,t->...', weights, y * y)
+    ys = np.einsum('...t,t->...', weights, y)
+    n = weights.sum(axis=-1)
+    
+    params = (np.linalg.pinv(XX) @ Xy[..., np.newaxis])[..., 0]
+    sse = np.maximum(yy - np.einsum('...i,...i->...', params, Xy), 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sst = yy - ys * ys / n
+        corr_coef = np.sqrt(np.clip(1.0 - sse / sst, 0.0, 1.0))
+        misfit = np.sqrt(sse / n)
+    
+    # (the weights may be broadcast against the design matrices)
+    too_few = np.broadcast_to(np.count_nonzero(weights, axis=-1) <= X.shape[-1], misfit.shape)
+    misfit = np.where(too_few, np.inf, misfit)
+    corr_coef = np.where(too_few, np.nan, corr_coef)
+    return params, misfit, corr_coef
+
+
+
+def lag_scan_stage(X, valid, y, num_bootstrap, block_length, min_valid, rng):
+    '''
+    lag scan of one stage (see lag_scan)
+    '''
+    rng = np.random.default_rng(rng)
+    weights = valid.astype(float)
+    _, misfit, corr_coef = weighted_linear_fits(X, y, weights)
+    
+    # lags with fewer valid samples fit fewer points and would win on misfit alone, so they are excluded
+    num_valid = np.count_nonzero(valid, axis=-1)
+    too_few_valid = num_valid < min_valid
+    misfit = np.where(too_few_valid, np.inf, misfit)
+    corr_coef = np.where(too_few_valid, np.nan, corr_coef)
+    
+    # the best lag is undetermined (index -1) unless at least two lags can be compared
+    if np.count_nonzero(~too_few_valid) < 2:
+        return misfit, corr_coef, num_valid, -1, np.full(num_bootstrap, -1)
+    
+    # moving block bootstrap (blocks of consecutive samples, so autocorrelation is kept within blocks)
+    # each bootstrap sample is just a count of how many times each sample was drawn
+    num_samples = len(y)
+    block_length = min(block_length, num_samples)
+    num_blocks = -(-num_samples // block_length)
+    bootstrap_best_lags = np.empty(num_bootstrap, dtype=int)
+    chunk_size = 100
+    for chunk_start in range(0, num_bootstrap, chunk_size):
+        num_chunk = min(chunk_size, num_bootstrap - chunk_start)
+        block_starts = rng.integers(0, num_samples - block_length + 1, (num_chunk, num_blocks))
+        indices = (block_starts[:, :, np.newaxis] + np.arange(block_length)).reshape(num_chunk, -1)[:, :num_samples]
+        counts = np.zeros((num_chunk, num_samples))
+        np.add.at(counts, (np.arange(num_chunk)[:, np.newaxis], indices), 1)
         
+        _, bootstrap_misfit, _ = weighted_linear_fits(X, y, counts[:, np.newaxis, :] * weights)
+        bootstrap_misfit = np.where(too_few_valid, np.inf, bootstrap_misfit)
+        bootstrap_best_lags[chunk_start:chunk_start+num_chunk] = np.argmin(bootstrap_misfit, axis=-1)
+    
+    return misfit, corr_coef, num_valid, np.argmin(misfit), bootstrap_best_lags
+
+
+
+def lag_scan(t, y, lags, Age_flux, carbon_flux, Age_Li, Li_isotope, stage_breakpoints=None,
+             num_bootstrap=1000, block_length=5, min_valid=None, seed=None, num_cpus=1):
+    '''
+    fit the time-delayed model (carbon flux leading CO2 by the lag) at every lag, ie, scan the lags
+    rather than fitting the lag with curve_fit (which gets stuck in local minima)
+    
+    each stage (stages start at 0 and at each of the breakpoints) is scanned separately,
+    optionally in num_cpus processes (seed makes the bootstrap reproducible)
+    
+    only lags with at least min_valid valid samples in a stage are compared (default is the whole stage,
+    capped at the stage length), since the misfit over fewer samples is not comparable;
+    other lags have inf misfit and NaN correlation coefficient, and the best lag (and bootstrap lags)
+    of a stage with fewer than two such lags is NaN
+    
+    returns, for each stage, the RMS misfit, correlation coefficient and number of valid samples
+    at each lag (stage, lag), the best lag (stage,) and the best lags of the (block) bootstrap samples
+    (stage, bootstrap), eg, np.std(bootstrap_best_lags, axis=1) is the uncertainty of the best lag
+    '''
+    lags = np.asarray(lags, dtype=float)
+    y = np.asarray(y, dtype=float)
+    X, valid = lagged_design_matrices(t, lags, Age_flux, carbon_flux, Age_Li, Li_isotope)
+    
+    breakpoints = [] if stage_breakpoints is None else list(stage_breakpoints)
+    stages = list(zip([0] + breakpoints, breakpoints + [len(y)]))
+    stage_rngs = np.random.SeedSequence(seed).spawn(len(stages))
+    stage_args = [(X[:, start:end], valid[:, start:end], y[start:end], num_bootstrap, block_length,
+                   end - start if min_valid is None else min(min_valid, end - start), stage_rng)
+                  for (start, end), stage_rng in zip(stages, stage_rngs)]
+    if num_cpus > 1 and len(stages) > 1:
+        with multiprocessing.Pool(min(num_cpus, len(stages))) as pool:
+            stage_results = pool.starmap(lag_scan_stage, stage_args)
+    else:
+        stage_results = [lag_scan_stage(*args) for args in stage_args]
+    
+    misfit, corr_coef, num_valid, best_lag_index, bootstrap_best_lag_indices = (np.array(result) for result in zip(*stage_results))
+    best_lags = np.where(best_lag_index >= 0, lags[best_lag_index], np.nan)
+    bootstrap_best_lags = np.where(bootstrap_best_lag_indices >= 0, lags[bootstrap_best_lag_indices], np.nan)
+    return misfit, corr_coef, num_valid, best_lags, bootstrap_best_lags
+
+
+
+def load_flux_envelopes(flux_dir='../Carbon_flux',
+                        models=('TX2019slab', 'UU-P07', 'LLNL_G3D_JPS', 'MITP08', 'GLAD_M25'),
+                        limit_dirs=('Dismax800_Dmax200_min_newrate', 'Dismax1000_Dmax200_mean_newrate', 'Dismax1200_Dmax200_max_newrate'),
+                        max_age=65):
+    '''
+    total carbon flux (model, limit, age) of each tomography model for the min, mean and max flux limits,
+    at ages 1~max_age with interval of 1 Ma
+    '''
+    age = np.arange(1, max_age+1)
+    envelopes = np.empty((len(models), len(limit_dirs), len(age)))
+    for i, model in enumerate(models):
+        for j, limit_dir in enumerate(limit_dirs):
+            flux_age, _, carbon_flux = load_flux_file(f'{flux_dir}/{limit_dir}/flux_{model}.txt')
+            envelopes[i, j] = np.interp(age, flux_age, carbon_flux)
+        
+        # delete outliers at 1 Ma for models MIT-P08 and TX2019slab
+        if model=='MITP08' or model=='TX2019slab':
+            envelopes[i, :, 0] = np.nan
     
-    # 5 points running mean
-    num = 0 
-    Age_new = []
-    Li_isotope_new = []
-    Age_temp = 0
-    Li_isotope_temp = 0
-    for i in range(len(Age)):
-        num += 1
-        Age_temp += Age[i]
-        Li_isotope_temp += Li_isotope[i]
-        if num == 5:
-            Age_new.append(Age_temp/num)
-            Li_isotope_new.append(Li_isotope_temp/num)
-            num = 0 
-            Age_temp = 0
-            Li_isotope_temp = 0
-    if num != 0:
-        Age_new.append(Age_temp/num)
-        Li_isotope_new.append(Li_isotope_temp/num)
-    
-    
-    # interpolate to 1~65 with interval of 1 Ma
-    Age_interp = np.arange(1,66)
-    f = interpolate.interp1d(Age_new, Li_isotope_new)
-    Li_interp = f(Age_interp)
+    return age, envelopes
+
+
+
+def draw_flux_realizations(envelopes, num_realizations, rng=None):
+    '''
+    random normalized carbon flux realizations (realization, age) from the envelopes (see load_flux_envelopes)
     
-# =============================================================================
-#     # standardization
-#     mean = np.mean(Li_interp)
-#     std = np.std(Li_interp) # Standard Deviation
-#     Li_standardization = (Li_interp - mean) / std
-# =============================================================================
+    each realization is the mean of randomly drawn (with replacement) tomography models, where the flux of
+    each model is drawn between its min and max limits (uniformly, at the same position in the envelope at all ages)
+    '''
+    rng = np.random.default_rng(rng)
+    num_models = envelopes.shape[0]
+    model_indices = rng.integers(0, num_models, (num_realizations, num_models))
+    positions = rng.uniform(-1, 1, (num_realizations, num_models, 1))
     
-    # nomalization
-    Li_max = Li_interp.max()
-    Li_min = Li_interp.min()
-    Li_normalization = (Li_interp-Li_min) / (Li_max-Li_min)
+    flux_min, flux_mean, flux_max = envelopes[model_indices, 0], envelopes[model_indices, 1], envelopes[model_indices, -1]
+    flux = np.where(positions < 0, flux_mean + positions*(flux_mean - flux_min), flux_mean + positions*(flux_max - flux_mean))
     
-    return Age_interp, Li_normalization
-
+    # mean of the models (without the deleted outliers), if all drawn models are outliers use the next age
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        flux = np.nanmean(flux, axis=1)
+    for i in range(flux.shape[1]-2, -1, -1):
+        flux[:, i] = np.where(np.isnan(flux[:, i]), flux[:, i+1], flux[:, i])
+    
+    # Normalization
+    flux_max = flux.max(axis=1, keepdims=True)
+    flux_min = flux.min(axis=1, keepdims=True)
+    return (flux - flux_min) / (flux_max - flux_min)
+
 
 
-def load_CO2(file):
-    f = open(file, 'r', encoding=u'utf-8', errors='ignore')
-    reader = csv.reader(f)
-    reader = list(reader)
-    age = []
-    CO2 = []
-    for i in range(len(reader)):
-        age.append(float(reader[i][0]))
-        CO2.append(float(reader[i][1]))
-    age = np.array(age)
-    CO2 = np.array(CO2)
+def ensemble_stage_fits(flux, Age_flux, t, y, Age_Li, Li_isotope, stage_breakpoints):
+    '''
+    closed-form multi-stage fits of the model to y for all carbon flux realizations (realization, age) at once
     
-    # interpolate to 1~65 with interval of 1 Ma
-    age_interp = np.arange(1,66)
-    f = interpolate.interp1d(age, CO2)
-    CO2_interp = f(age_interp)
+    returns the parameters (realization, stage, 3), correlation coefficient of each stage (realization, stage)
+    and of the whole multi-stage fit (realization,)
+    '''
+    t = np.asarray(t, dtype=float)
     
+    # linear interpolation is a matrix (the same for all realizations)
+    interpolation = np.stack([np.interp(t, Age_flux, unit) for unit in np.eye(len(Age_flux))], axis=1)
+    F_carbon = flux @ interpolation.T
+    F_weathering = np.interp(t, Age_Li, Li_isotope)
+    X = np.stack((F_carbon, F_carbon*F_weathering, np.ones_like(F_carbon)), axis=-1)
     
-    # normalization
-    CO2_max = CO2_interp.max()
-    CO2_min = CO2_interp.min()
-    CO2_normalization = (CO2_interp-CO2_min) / (CO2_max-CO2_min)
+    breakpoints = list(stage_breakpoints)
+    stage_weights = np.zeros((len(breakpoints)+1, len(t)))
+    for stage, (start, end) in enumerate(zip([0] + breakpoints, breakpoints + [len(t)])):
+        stage_weights[stage, start:end] = 1
+    params, _, corr_coefs = weighted_linear_fits(X[:, np.newaxis], y, stage_weights)
     
+    # correlation coefficient of the multi-stage fit
+    y_pred = np.einsum('st,rti,rsi->rt', stage_weights, X, params)
+    y_pred = y_pred - y_pred.mean(axis=1, keepdims=True)
+    y_anomaly = y - np.mean(y)
+    corr_coef_mul = (y_pred @ y_anomaly) / np.sqrt((y_pred * y_pred).sum(axis=1) * (y_anomaly @ y_anomaly))
+    
+    return params, corr_coefs, corr_coef_mul
 
-    # calculate feedback strength (Caves et al., 2016)
-    CO2_modern = 278 # pre-industrial CO2 (Foster et al., 2015)
-    # feedback strength relative to modern 
-    R_CO2 = CO2_interp / CO2_modern
-    R_fs = np.log2(R_CO2) + 1
 
 
-    return age_interp, CO2_normalization, R_fs
+def ensemble_fit_chunk(envelopes, num_realizations, rng, Age_flux, t, y, Age_Li, Li_isotope, stage_breakpoints):
+    '''
+    draw and fit one chunk of the ensemble (see ensemble_fit)
+    '''
+    flux = draw_flux_realizations(envelopes, num_realizations, rng)
+    return ensemble_stage_fits(flux, Age_flux, t, y, Age_Li, Li_isotope, stage_breakpoints)
 
 
 
-def load_temperature(file):
-    f = open(file, 'r')
-    age = []
-    temperature = []
-    for each_line in f.readlines():
-        each_line = each_line.strip('\n')
-        each_line = each_line.split()
-        age.append(float(each_line[0]))
-        temperature.append(float(each_line[1]))
-    age = np.array(age)
-    temperature = np.array(temperature)
+def ensemble_fit(envelopes, Age_flux, t, y, Age_Li, Li_isotope, stage_breakpoints,
+                 num_realizations=10000, chunk_size=1000, seed=None, num_cpus=1):
+    '''
+    Monte Carlo propagation of the carbon flux uncertainty (across tomography models and the min/mean/max
+    flux limits, see draw_flux_realizations) into the multi-stage fit
+    
+    the realizations are drawn and fitted chunk_size at a time, the chunks in num_cpus processes
+    (seed makes the ensemble reproducible)
+    
+    returns the parameters (realization, stage, 3), correlation coefficient (and p value) of each stage
+    (realization, stage) and correlation coefficient of the whole multi-stage fit (realization,)
+    '''
+    chunk_sizes = [min(chunk_size, num_realizations - chunk_start) for chunk_start in range(0, num_realizations, chunk_size)]
+    chunk_args = [(envelopes, chunk_num_realizations, chunk_rng, Age_flux, t, y, Age_Li, Li_isotope, stage_breakpoints)
+                  for chunk_num_realizations, chunk_rng in zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes)))]
+    if num_cpus > 1 and len(chunk_args) > 1:
+        with multiprocessing.Pool(min(num_cpus, len(chunk_args))) as pool:
+            chunk_results = pool.starmap(ensemble_fit_chunk, chunk_args)
+    else:
+        chunk_results = [ensemble_fit_chunk(*args) for args in chunk_args]
+    
+    params, corr_coefs, corr_coef_mul = (np.concatenate(result) for result in zip(*chunk_results))
+    stage_lengths = np.diff([0] + list(stage_breakpoints) + [len(y)])
+    return params, corr_coefs, rolling_correlation_p_value(corr_coefs, stage_lengths), corr_coef_mul
+
+
+
+def segment_prefix_sums(X, y):
+    '''
+    cumulative sums of the normal equations (X^T X, X^T y, y^T y and sum of y) of the series,
+    so the normal equations of any segment [start, end) are the difference of two cumulative sums
+    '''
+    XX = np.cumsum(X[:, :, np.newaxis] * X[:, np.newaxis, :], axis=0)
+    Xy = np.cumsum(X * y[:, np.newaxis], axis=0)
+    yy = np.cumsum(y * y)
+    ys = np.cumsum(y)
+    
+    # prepend zeros (the sums of the empty segment)
+    return (np.concatenate((np.zeros((1,) + XX.shape[1:]), XX)), np.concatenate((np.zeros((1,) + Xy.shape[1:]), Xy)),
+            np.concatenate(([0.0], yy)), np.concatenate(([0.0], ys)))
+
+
+
+def fit_segments(prefix_sums, starts, ends):
+    '''
+    closed-form least-squares fit of the linear model on each segment [start, end) of the series
+    
+    returns the parameters (a, b, c), sum of squared residuals, X^T X (of each segment),
+    and the correlation coefficient (and its p value, same as pearsonr) between the series and the fit
+    '''
+    XX, Xy, yy, ys = prefix_sums
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    XX = XX[ends] - XX[starts]
+    Xy = Xy[ends] - Xy[starts]
+    yy = yy[ends] - yy[starts]
+    ys = ys[ends] - ys[starts]
+    n = ends - starts
+    
+    # pseudo-inverse (rather than solve) in case a segment is degenerate
+    params = (np.linalg.pinv(XX) @ Xy[..., np.newaxis])[..., 0]
+    sse = np.maximum(yy - np.einsum('...i,...i->...', params, Xy), 0.0)
+    sst = yy - ys * ys / n
+    
+    # the model has an intercept, so the correlation with the fit is sqrt(R^2)
+    r2 = np.clip(1.0 - sse / sst, 0.0, 1.0)
+    corr_coef = np.sqrt(r2)
+    p_value = scipy.special.betainc(0.5 * (n - 2), 0.5, 1.0 - r2)
+    
+    return params, sse, XX, corr_coef, p_value
+
+
+
+def segment_costs(prefix_sums, starts, num_samples, min_stage_length):
+    '''
+    sum of squared residuals of all segments [start, end) starting at starts (rows),
+    inf for segments shorter than min_stage_length
+    '''
+    costs = np.full((len(starts), num_samples + 1), np.inf)
+    rows, ends = np.nonzero(np.arange(num_samples + 1) - np.asarray(starts)[:, np.newaxis] >= min_stage_length)
+    if len(rows):
+        costs[rows, ends] = fit_segments(prefix_sums, np.asarray(starts)[rows], ends)[1]
+    return costs
+
+
+
+def search_breakpoints(X, y, num_stages=3, min_stage_length=5, num_cpus=1):
+    '''
+    find the stage boundaries minimizing the total sum of squared residuals of the multi-stage fit,
+    by dynamic programming over the (closed-form) fits of all admissible segments
+    (this is the same as the exhaustive search over all boundaries, for any number of stages)
+    
+    the segment fits can be split across num_cpus processes (only worthwhile for long series)
+    
+    returns the breakpoints (indices where stages 2, 3, ... start) and the fit of each stage (see fit_stages)
+    '''
+    num_samples = len(y)
+    if num_stages * min_stage_length > num_samples:
+        raise ValueError(f'{num_samples} samples cannot be split into {num_stages} stages of at least {min_stage_length} samples')
+    prefix_sums = segment_prefix_sums(X, y)
+    
+    # costs[start, end] of all segments
+    starts = np.arange(num_samples + 1)
+    if num_cpus > 1:
+        with multiprocessing.Pool(num_cpus) as pool:
+            costs = np.concatenate(pool.starmap(segment_costs,
+                [(prefix_sums, starts_chunk, num_samples, min_stage_length) for starts_chunk in np.array_split(starts, num_cpus)]))
+    else:
+        costs = segment_costs(prefix_sums, starts, num_samples, min_stage_length)
+    
+    # total_costs[end] is the minimum cost of splitting [0, end) into the stages so far
+    total_costs = costs[0]
+    previous_ends = []
+    for stage in range(1, num_stages):
+        candidate_costs = total_costs[:, np.newaxis] + costs
+        previous_ends.append(np.argmin(candidate_costs, axis=0))
+        total_costs = candidate_costs[previous_ends[-1], np.arange(num_samples + 1)]
+    
+    # backtrack the breakpoints from the end of the series
+    breakpoints = []
+    end = num_samples
+    for stage_previous_ends in reversed(previous_ends):
+        end = int(stage_previous_ends[end])
+        breakpoints.insert(0, end)
+    
+    params, pcovs, _, corr_coefs, p_values = fit_stages(X, y, breakpoints)
+    return breakpoints, params, pcovs, corr_coefs, p_values
+
+
+
+def fit_stages(X, y, breakpoints):
+    '''
+    closed-form fit of the linear model on each stage (stages start at 0 and at each of the breakpoints),
+    the same as curve_fit on each stage
+    
+    returns the parameters and their covariance (of each stage), the fitted series,
+    and the correlation coefficient (and p value) of each stage
+    '''
+    starts = np.array([0] + list(breakpoints))
+    ends = np.array(list(breakpoints) + [len(y)])
+    params, sse, XX, corr_coefs, p_values = fit_segments(segment_prefix_sums(X, y), starts, ends)
+    
+    # parameter covariance scaled by the residual variance (as curve_fit does by default)
+    num_params = X.shape[1]
+    pcovs = np.linalg.pinv(XX) * (sse / (ends - starts - num_params))[:, np.newaxis, np.newaxis]
+    y_pred = np.concatenate([X[start:end] @ stage_params for start, end, stage_params in zip(starts, ends, params)])
+    
+    return params, pcovs, y_pred, corr_coefs, p_values
+
+
+
+def rolling_correlation(x, y, windows):
+    '''
+    correlation coefficients between x and y in all sliding windows of all window widths at once,
+    using cumulative sums (window width w covers w+1 samples, same as slide_correlation)
     
-    age_interp = np.arange(1,66)
-    f = interpolate.interp1d(age, temperature, kind='cubic')
-    temp_interp = f(age_interp)
+    y can have leading dimensions (eg, surrogates of the series) that are kept in the output
     
-    # normalization
-    temp_max = temp_interp.max()
-    temp_min = temp_interp.min()
-    temp_normalization = (temp_interp-temp_min) / (temp_max-temp_min)
-    return age_interp, temp_normalization
+    returns the (..., window, position) correlation coefficients and numbers of samples in each window,
+    NaN where the window extends past the end of the series
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    windows = np.atleast_1d(windows)
+    num_samples = x.shape[-1]
+    
+    # remove the means (of the whole series) to reduce round-off in the cumulative sums
+    x = x - x.mean()
+    y = y - y.mean(axis=-1, keepdims=True)
+    
+    def window_sums(values):
+        cumsum = np.concatenate((np.zeros(values.shape[:-1] + (1,)), np.cumsum(values, axis=-1)), axis=-1)
+        return cumsum[..., ends] - cumsum[..., starts]
+    
+    starts = np.arange(num_samples)[np.newaxis, :]
+    ends = np.minimum(starts + windows[:, np.newaxis] + 1, num_samples)
+    n = (windows[:, np.newaxis] + 1) * np.ones_like(starts)
+    fits = starts + windows[:, np.newaxis] + 1 <= num_samples
+    
+    sum_x, sum_xx = window_sums(x), window_sums(x * x)
+    sum_y, sum_yy, sum_xy = window_sums(y), window_sums(y * y), window_sums(x * y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr_coef = (n*sum_xy - sum_x*sum_y) / np.sqrt((n*sum_xx - sum_x*sum_x) * (n*sum_yy - sum_y*sum_y))
+    corr_coef = np.where(fits, np.clip(corr_coef, -1.0, 1.0), np.nan)
+    
+    return corr_coef, n
+
+
+
+def rolling_correlation_p_value(corr_coef, n):
+    '''
+    two-sided (parametric) p value of correlation coefficients of n samples, same as pearsonr
+    '''
+    return scipy.special.betainc(0.5 * (n - 2), 0.5, 1.0 - corr_coef * corr_coef)
+
+
+
+def surrogate_series(y, num_surrogates, method='phase', rng=None):
+    '''
+    random surrogates (num_surrogates, len(y)) of series y, either
+    'phase': same amplitude spectrum (and so autocorrelation) as y but random Fourier phases, or
+    'permutation': random permutations of y
+    '''
+    rng = np.random.default_rng(rng)
+    y = np.asarray(y, dtype=float)
+    if method == 'permutation':
+        return y[np.argsort(rng.random((num_surrogates, len(y))), axis=-1)]
+    elif method == 'phase':
+        spectrum = np.fft.rfft(y - y.mean())
+        phases = rng.uniform(0, 2*np.pi, (num_surrogates, len(spectrum)))
+        # the zero (and Nyquist) frequency must stay real
+        phases[:, 0] = 0
+        if len(y) % 2 == 0:
+            phases[:, -1] = 0
+        return y.mean() + np.fft.irfft(np.abs(spectrum) * np.exp(1j*phases), n=len(y), axis=-1)
+    else:
+        raise ValueError(f"Unknown surrogate method '{method}' (should be 'phase' or 'permutation')")
 
 
 
-def cosine_taper(freqs, flimit):
-    fl1, fl2 = flimit
-    taper = np.zeros_like(freqs)
+def rolling_correlation_significance(x, y, windows, num_surrogates=1000, method='phase', rng=None, chunk_size=1000):
+    '''
+    sliding-window correlation coefficients (see rolling_correlation) and their p values from
+    surrogates of y (see surrogate_series), ie, the fraction of surrogates with a larger absolute
+    correlation in the same window, rather than the parametric p value of pearsonr
     
-    a = (fl1 <= freqs) & (freqs <= fl2)
-    taper[a] = 0.5 * (1.0 + np.cos(np.pi * (freqs[a] - fl1) / (fl2 - fl1)))
-
-    b = freqs < fl1
-    taper[b] = 1.0
-
-    return taper
+    the surrogates are processed chunk_size at a time (all windows of a chunk in one array operation)
     
+    returns the (window, position) correlation coefficients, surrogate p values and parametric p values
+    '''
+    rng = np.random.default_rng(rng)
+    corr_coef, n = rolling_correlation(x, y, windows)
     
+    num_exceeding = np.zeros(corr_coef.shape)
+    for chunk_start in range(0, num_surrogates, chunk_size):
+        surrogates = surrogate_series(y, min(chunk_size, num_surrogates - chunk_start), method, rng)
+        surrogate_corr_coef, _ = rolling_correlation(x, surrogates, windows)
+        num_exceeding += (np.abs(surrogate_corr_coef) >= np.abs(corr_coef)).sum(axis=0)
+    
+    p_value = np.where(np.isnan(corr_coef), np.nan, (num_exceeding + 1) / (num_surrogates + 1))
+    return corr_coef, p_value, rolling_correlation_p_value(corr_coef, n)
+
+
 
 def slide_correlation(Age_CO2, CO2, pCO2_pred, window, plot):
-    corr_coef_slide = []
-    p_value_slide = []
-    for i in range(len(CO2)-window):    
-        corr_coef, p_value = pearsonr(CO2[i:i+window+1], pCO2_pred[i:i+window+1])
-        corr_coef_slide.append(corr_coef)
-        p_value_slide.append(p_value)
-    corr_coef_slide = np.asarray(corr_coef_slide)
-    p_value_slide = np.asarray(p_value_slide)    
+    corr_coef, n = rolling_correlation(CO2, pCO2_pred, window)
+    num_positions = len(CO2) - window
+    corr_coef_slide = corr_coef[0, :num_positions]
+    p_value_slide = rolling_correlation_p_value(corr_coef_slide, n[0, :num_positions])
     
     Age_slide = Age_CO2[0:len(CO2)-window] + window/2
     
     # plot slide-window correlation coefficient with p<0.05
-    plot_index = np.where(p_value_slide<0.05)
+    plot_index = np.where(p_value_slide<0.05)[0]
     if len(plot_index) !=0 and plot == True:
         Age_plot = Age_slide[plot_index]
         corr_coef_plot = corr_coef_slide[plot_index]
         
-    fig, ax = plt.subplots(1)
-    ax.errorbar(Age_plot, corr_coef_plot, xerr=window/2, fmt='.--', color='#4489C8', linewidth=1.5,
-                ecolor='#008F91', elinewidth=1, capsize=2, capthick=1)
-    #ax.plot(Age_slide, corr_coef_slide, marker='o')
-    ax.set_xlim([0, 66])
-    #ax.set_ylim([0.4, 1])
+        fig, ax = plt.subplots(1)
+        ax.errorbar(Age_plot, corr_coef_plot, xerr=window/2, fmt='.--', color='#4489C8', linewidth=1.5,
+                    ecolor='#008F91', elinewidth=1, capsize=2, capthick=1)
+        #ax.plot(Age_slide, corr_coef_slide, marker='o')
+        ax.set_xlim([0, 66])
+        #ax.set_ylim([0.4, 1])
     
     return corr_coef_slide, p_value_slide, Age_slide
     
@@ -325,86 +703,74 @@ if __name__ == '__main__':
     # stag1: 1-20 Ma
     # stag2: 21-52 Ma
     # stag3: 52-65 Ma
+    X = design_matrix(Age_CO2, Age_flux, carbon_flux_mean, Age_Li, Li_isotope)
+    stage_breakpoints = [20, 52]
     
-    # Stage 1 fitting
-    def func(t, a, b, c):        
-        F_carbon = np.interp(t, Age_flux[0:20], carbon_flux_mean[0:20])
-        w_carbon = np.interp(t, Age_flux[0:20], carbon_flux_mean[0:20])
-        F_weathering = np.interp(t, Age_Li[0:20], Li_isotope[0:20])
-        
-        return a*F_carbon + b*w_carbon*F_weathering + c
- 
-    popt, pcov = curve_fit(func, Age_CO2[0:20], CO2[0:20])
-    a_opt1, b_opt1, c_opt1 = popt
-    print(f'Stage1: a={a_opt1}; b={b_opt1}; c={c_opt1}\n')
-    
-    pCO2_pred_stage1 = func(Age_CO2[0:20], a_opt1, b_opt1, c_opt1)    
-    corr_coef1, p_value1 = pearsonr(CO2[0:20], pCO2_pred_stage1)
-    print(f'Stage1: correlation coefficient = {corr_coef1}; p value = {p_value1}\n')
-    
-    # 95% credible interval
-    param_samples = np.random.multivariate_normal(popt, pcov, size=1000)
-    y_samples = np.array([func(Age_CO2[0:20], *p) for p in param_samples])
-    y1_lower, y1_upper = np.percentile(y_samples, [2.5, 97.5], axis=0)
-    
-    
-    # Stage 2 fitting
-    def func(t, a, b, c):        
-        F_carbon = np.interp(t, Age_flux[20:52], carbon_flux_mean[20:52])
-        w_carbon = np.interp(t, Age_flux[20:52], carbon_flux_mean[20:52])
-        F_weathering = np.interp(t, Age_Li[20:52], Li_isotope[20:52])
-        
-        return a*F_carbon + b*w_carbon*F_weathering + c
- 
-    popt, pcov = curve_fit(func, Age_CO2[20:52], CO2[20:52])
-    a_opt2, b_opt2, c_opt2 = popt
-    print(f'Stage2: a={a_opt2}; b={b_opt2}; c={c_opt2}\n')
-    
-    pCO2_pred_stage2 = func(Age_CO2[20:52], a_opt2, b_opt2, c_opt2)    
-    corr_coef2, p_value2 = pearsonr(CO2[20:52], pCO2_pred_stage2)
-    print(f'Stage2: correlation coefficient = {corr_coef2}; p value = {p_value2}\n')
-    
-    param_samples = np.random.multivariate_normal(popt, pcov, size=1000)
-    y_samples = np.array([func(Age_CO2[20:52], *p) for p in param_samples])
-    y2_lower, y2_upper = np.percentile(y_samples, [2.5, 97.5], axis=0)
-    
-    
-    # Stage 3 fitting
-    def func(t, a, b, c):        
-        F_carbon = np.interp(t, Age_flux[52:], carbon_flux_mean[52:])
-        w_carbon = np.interp(t, Age_flux[52:], carbon_flux_mean[52:])
-        F_weathering = np.interp(t, Age_Li[52:], Li_isotope[52:])
-        
-        return a*F_carbon + b*w_carbon*F_weathering + c
- 
-    popt, pcov = curve_fit(func, Age_CO2[52:], CO2[52:])
-    a_opt3, b_opt3, c_opt3 = popt
-    print(f'Stage3: a={a_opt3}; b={b_opt3}; c={c_opt3}\n')
+    # search the optimal stage boundaries (for comparison with the stages above)
+    optimal_breakpoints, _, _, optimal_corr_coefs, optimal_p_values = search_breakpoints(X, CO2, num_stages=3)
+    print(f'Optimal stages: {[f"{Age_CO2[i]}-{Age_CO2[j-1]} Ma" for i, j in zip([0]+optimal_breakpoints, optimal_breakpoints+[len(CO2)])]}; '
+          f'correlation coefficients = {optimal_corr_coefs}; p values = {optimal_p_values}\n')
     
-    pCO2_pred_stage3 = func(Age_CO2[52:], a_opt3, b_opt3, c_opt3)    
-    corr_coef3, p_value3 = pearsonr(CO2[52:], pCO2_pred_stage3)
-    print(f'Stage3: correlation coefficient = {corr_coef3}; p value = {p_value3}\n')
+    params, pcovs, pCO2_pred_mul, corr_coefs, p_values = fit_stages(X, CO2, stage_breakpoints)
+    pCO2_pred_lower = []
+    pCO2_pred_upper = []
+    for stage, (start, end) in enumerate(zip([0]+stage_breakpoints, stage_breakpoints+[len(CO2)])):
+        print(f'Stage{stage+1}: a={params[stage,0]}; b={params[stage,1]}; c={params[stage,2]}\n')
+        print(f'Stage{stage+1}: correlation coefficient = {corr_coefs[stage]}; p value = {p_values[stage]}\n')
     
-    param_samples = np.random.multivariate_normal(popt, pcov, size=1000)
-    y_samples = np.array([func(Age_CO2[52:], *p) for p in param_samples])
-    y3_lower, y3_upper = np.percentile(y_samples, [2.5, 97.5], axis=0)
+        # 95% credible interval
+        y_lower, y_upper = credible_interval(X[start:end], params[stage], pcovs[stage], size=1000)
+        pCO2_pred_lower.append(y_lower)
+        pCO2_pred_upper.append(y_upper)
     
     
     # output multi-stage fitting curve
-    pCO2_pred_mul = np.concatenate((pCO2_pred_stage1, pCO2_pred_stage2, pCO2_pred_stage3))
-    pCO2_pred_lower = np.concatenate((y1_lower, y2_lower, y3_lower))
-    pCO2_pred_upper = np.concatenate((y1_upper, y2_upper, y3_upper))
+    pCO2_pred_lower = np.concatenate(pCO2_pred_lower)
+    pCO2_pred_upper = np.concatenate(pCO2_pred_upper)
     corr_coef_mul, p_value_mul = pearsonr(CO2, pCO2_pred_mul)
     with open('fitting_curve_multi_stage_CO2.txt', 'w') as f:
-        f.write(f'stage 1: a={a_opt1};b={b_opt1}\tc={c_opt1}\tcorrelation coefficient={corr_coef1}\tp value={p_value1}\n')
-        f.write(f'stage 2: a={a_opt2};b={b_opt2}\tc={c_opt2}\tcorrelation coefficient={corr_coef2}\tp value={p_value2}\n')
-        f.write(f'stage 3: a={a_opt3};b={b_opt3}\tc={c_opt3}\tcorrelation coefficient={corr_coef3}\tp value={p_value3}\n')
+        for stage in range(len(params)):
+            f.write(f'stage {stage+1}: a={params[stage,0]};b={params[stage,1]}\tc={params[stage,2]}\tcorrelation coefficient={corr_coefs[stage]}\tp value={p_values[stage]}\n')
         f.write(f'multi-stage: correlation coefficient={corr_coef_mul}\tp value={p_value_mul}\n')
         for i in range(len(Age_CO2)):
             f.write(str(Age_CO2[i]) + '\t')
             f.write('{:.4f}'.format(pCO2_pred_mul[i]) + '\t')
             f.write('{:.4f}'.format(pCO2_pred_lower[i]) + '\t')
             f.write('{:.4f}'.format(pCO2_pred_upper[i]) + '\n')
+    
+    
+    # time delay between carbon flux and CO2 in each stage (scan 0-15 Myr)
+    lags = np.arange(0, 15.05, 0.1)
+    lag_misfit, lag_corr_coef, lag_num_valid, best_lags, bootstrap_best_lags = lag_scan(
+        Age_CO2, CO2, lags, Age_flux, carbon_flux_mean, Age_Li, Li_isotope, stage_breakpoints)
+    for stage in range(len(best_lags)):
+        scanned = np.isfinite(lag_misfit[stage])
+        if np.isnan(best_lags[stage]):
+            print(f'Stage{stage+1}: t_delay undetermined ({np.count_nonzero(scanned)} lags with the whole stage valid)\n')
+            continue
+        print(f'Stage{stage+1}: t_delay={best_lags[stage]:.1f}+-{np.std(bootstrap_best_lags[stage]):.1f} Myr; '
+              f'correlation coefficient = {lag_corr_coef[stage, np.argmin(lag_misfit[stage])]}; '
+              f'lags {lags[scanned].min():.1f}-{lags[scanned].max():.1f} Myr scanned\n')
+    with open('lag_scan_misfit.txt', 'w') as f:
+        f.write('lag\t' + '\t'.join(f'stage{stage+1} misfit\tstage{stage+1} valid samples' for stage in range(len(best_lags))) + '\n')
+        for i in range(len(lags)):
+            f.write('{:.1f}'.format(lags[i]))
+            for stage in range(len(best_lags)):
+                f.write('\t{:.4f}\t{}'.format(lag_misfit[stage, i], lag_num_valid[stage, i]))
+            f.write('\n')
+    
+    
+    # propagate the carbon flux uncertainty (tomography models and min/mean/max flux limits) into the multi-stage fit
+    Age_envelope, flux_envelopes = load_flux_envelopes()
+    ensemble_params, ensemble_corr_coefs, ensemble_p_values, ensemble_corr_coef_mul = ensemble_fit(
+        flux_envelopes, Age_envelope, Age_CO2, CO2, Age_Li, Li_isotope, stage_breakpoints,
+        num_realizations=10000, num_cpus=multiprocessing.cpu_count())
+    for stage in range(ensemble_params.shape[1]):
+        a_range, b_range, c_range = np.percentile(ensemble_params[:, stage], [2.5, 50, 97.5], axis=0).T
+        corr_range = np.percentile(ensemble_corr_coefs[:, stage], [2.5, 50, 97.5])
+        print(f'Stage{stage+1} ensemble (2.5, 50, 97.5 percentiles): a={a_range}; b={b_range}; c={c_range}; '
+              f'correlation coefficient = {corr_range}; p<0.05 in {np.mean(ensemble_p_values[:, stage]<0.05)*100:.1f}% of realizations\n')
+    print(f'multi-stage ensemble: correlation coefficient = {np.percentile(ensemble_corr_coef_mul, [2.5, 50, 97.5])}\n')
             
     
 # =============================================================================
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+wavelet coherence between the subducted carbon flux (of each tomography model,
+for the min, mean and max flux limits) and atmospheric CO2
+"""
+import os
+import sys
+import multiprocessing
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.ticker import NullLocator
+from wavelet import cwt_frequencies, coherence_significance
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from proxy_data import load_CO2, load_flux_file, normalize
+
+
+
+def plot_coherence(ages, frequencies, coherence, phase, significance, coi, arrow_spacing=(4, 8)):
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    
+    X, Y = np.meshgrid(ages, frequencies)
+    cax = ax.pcolormesh(X, Y, coherence, cmap='jet', vmin=0, vmax=1, shading='gouraud')
+    
+    # 95% confidence contour (against red noise) and cone of influence
+    ax.contour(X, Y, significance, levels=[1], colors='k', linewidths=1)
+    ax.contourf(X, Y, coi.astype(float), levels=[0.5, 1.5], colors='none', hatches=['xx'])
+    
+    # phase arrows where the coherence is significant (pointing right: in phase, up: flux leads CO2 by 90 degrees)
+    # the phase is positive if the flux leads along the age axis, ie, lags in time, so it is negated
+    arrow_age, arrow_frequency = arrow_spacing
+    subsample = np.zeros(coi.shape, dtype=bool)
+    subsample[::arrow_frequency, ::arrow_age] = True
+    arrows = (significance > 1) & ~coi & subsample
+    ax.quiver(X[arrows], Y[arrows], np.cos(phase[arrows]), -np.sin(phase[arrows]),
+              pivot='middle', scale=30, width=0.004, headwidth=4)
+    
+    ax.set_yscale('log')
+    # translate frequency axis to wavelength axis
+    yticks = [0.015625, 0.03125, 0.0625, 0.125, 0.25]
+    ylable = [64, 32, 16, 8, 4]
+    ax.set_yticks(yticks)
+    ax.set_yticklabels(ylable)
+    ax.yaxis.set_minor_locator(NullLocator())
+    ax.set_xlabel('Age (Ma)', fontproperties={'family':'Arial'}, fontsize=12)
+    ax.set_ylabel('Period (Myr)', fontproperties={'family':'Arial'}, fontsize=12)
+    
+    cbar = fig.colorbar(cax, ax=ax)
+    
+    return fig, ax
+
+
+
+if __name__ == '__main__':
+    # load CO2
+    file = 'CO2_CenCO2PIP_2023.csv'
+    Age_CO2, CO2, _ = load_CO2(file)
+    
+    # load carbon flux of each tomography model and flux limit
+    Models = ('TX2019slab', 'UU-P07', 'LLNL_G3D_JPS', 'MITP08', 'GLAD_M25')
+    Limits = {'min': 'Dismax800_Dmax200_min_newrate',
+              'mean': 'Dismax1000_Dmax200_mean_newrate',
+              'max': 'Dismax1200_Dmax200_max_newrate'}
+    names = []
+    carbon_flux = []
+    for model in Models:
+        for limit, limit_dir in Limits.items():
+            Age_flux, _, flux = load_flux_file('../Carbon_flux/{}/flux_{}.txt'.format(limit_dir, model))
+            flux = np.interp(Age_CO2, Age_flux, flux)
+            
+            # replace outliers at 1 Ma for models MIT-P08 and TX2019slab
+            if model=='MITP08' or model=='TX2019slab':
+                flux[0] = flux[1]
+            names.append(f'{model}_{limit}')
+            carbon_flux.append(normalize(flux))
+    carbon_flux = np.array(carbon_flux)
+    
+    
+    # wavelet coherence of all flux series with CO2 at once
+    dt = 1 # Myr
+    bandwidth_resolution = 10 # selected from Prokoph, 2008
+    f_max = 0.5 # corresponding to minimum wavelength 2 Myr
+    f_min = 0.015625 # corresponding to maximum wavelength 64 Myr
+    nf = 100
+    cross_wavelet, coherence, phase, significance, coi = coherence_significance(
+        carbon_flux, CO2, dt=dt, w0=bandwidth_resolution, fmin=f_min, fmax=f_max, nf=nf,
+        num_surrogates=1000, percentile=95, num_cpus=multiprocessing.cpu_count())
+    
+    
+    # plot coherence
+    os.makedirs('coherence', exist_ok=True)
+    frequencies = cwt_frequencies(f_min, f_max, nf)
+    for i, name in enumerate(names):
+        fig, ax = plot_coherence(Age_CO2, frequencies, coherence[i], phase[i], significance[i], coi)
+        plt.savefig(f'coherence/coherence_{name}.png', format='png', dpi=600)
+        plt.close(fig)
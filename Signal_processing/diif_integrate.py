@@ -4,29 +4,50 @@ Created on Sat Jul 19 15:17:47 2025
 
 @author: m1335
 """
+import os
+import sys
 import numpy as np
 import pandas as pd
-from scipy.integrate import trapz
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from proxy_data import load_flux_file
 
-def load_carbon_flux(file):
-    f = open(file, 'r')
-    age = []
-    slab_flux = []
-    carbon_flux = []
-    f.readline()
-    for each_line in f.readlines():
-        each_line = each_line.strip('\n')
-        each_line = each_line.split()
-        age.append(float(each_line[0]))
-        slab_flux.append(float(each_line[1]))
-        carbon_flux.append(float(each_line[6]))
-    age = np.array(age)
-    slab_flux = np.array(slab_flux)
-    carbon_flux = np.array(carbon_flux)
+
+def cumulative_integral(t, f, t_query):
+    '''
+    integral of the (piecewise linear) series f(t) from t[0] to each t_query,
+    from one cumulative trapezoid array (t_query need not be sample ages),
+    NaN where t_query is outside t[0]~t[-1]
+    '''
+    t = np.asarray(t, dtype=float)
+    f = np.asarray(f, dtype=float)
+    t_query = np.asarray(t_query, dtype=float)
+    cumulative_trapezoid = np.concatenate(([0.0], np.cumsum(0.5 * (f[1:] + f[:-1]) * np.diff(t))))
+    
+    # integral of the linear interpolation within the interval [t[k], t[k+1]] containing t_query
+    k = np.clip(np.searchsorted(t, t_query, side='right') - 1, 0, len(t) - 2)
+    dt = t_query - t[k]
+    slope = (f[k+1] - f[k]) / (t[k+1] - t[k])
+    integral = cumulative_trapezoid[k] + f[k] * dt + 0.5 * slope * dt * dt
     
-    return age, slab_flux, carbon_flux
+    tolerance = 1e-9 * (t[-1] - t[0])
+    return np.where((t_query < t[0] - tolerance) | (t_query > t[-1] + tolerance), np.nan, integral)
+
+
+
+def window_integral(t, f, half_widths):
+    '''
+    integral of f(t) over the windows [t-half_width, t+half_width] centred at each age t,
+    for each half-width (the same as trapz over each window when the half-width is a multiple of the sampling)
+    
+    returns a (window, age) array, NaN where the window extends past the ends of the series
+    '''
+    half_widths = np.asarray(half_widths, dtype=float)[:, np.newaxis]
+    t = np.asarray(t, dtype=float)
+    
+    return cumulative_integral(t, f, t + half_widths) - cumulative_integral(t, f, t - half_widths)
+
 
 
 # load mean data
@@ -34,7 +55,7 @@ Models = ('TX2019slab', 'UU-P07', 'LLNL_G3D_JPS', 'MITP08', 'GLAD_M25')
 carbon_flux_mean = 0
 for i in range(len(Models)):
     file = '../Carbon_flux/Dismax1000_Dmax200_mean_newrate/flux_{}.txt'.format(Models[i])
-    Age_flux, slab_flux, carbon_flux = load_carbon_flux(file)
+    Age_flux, slab_flux, carbon_flux = load_flux_file(file)
 
     # delete outliers at 1 Ma for models MIT-P08 and TX2019slab
     if Models[i]=='MITP08' or Models[i]=='TX2019slab':
@@ -54,45 +75,19 @@ carbon_flux_mean[0] = carbon_flux_mean[0] / (len(Models)-2)
 # plt.plot(Age_flux, dflux_dt)
 # =============================================================================
 
-# window-slide integral
-window = 5
-local_integral_5 = []
-center_age_5 = []
-
-for i in range(window, len(Age_flux)-window):
-    t_local = Age_flux[i-window : i+window+1]
-    f_local = carbon_flux_mean[i-window : i+window+1]
-    integral = trapz(f_local, t_local)
-    local_integral_5.append(integral)
-    center_age_5.append(Age_flux[i])
-
-window = 10
-local_integral_10 = []
-center_age_10 = []
-
-for i in range(window, len(Age_flux)-window):
-    t_local = Age_flux[i-window : i+window+1]
-    f_local = carbon_flux_mean[i-window : i+window+1]
-    integral = trapz(f_local, t_local)
-    local_integral_10.append(integral)
-    center_age_10.append(Age_flux[i])
-
-window = 15
-local_integral_15 = []
-center_age_15 = []
-
-for i in range(window, len(Age_flux)-window):
-    t_local = Age_flux[i-window : i+window+1]
-    f_local = carbon_flux_mean[i-window : i+window+1]
-    integral = trapz(f_local, t_local)
-    local_integral_15.append(integral)
-    center_age_15.append(Age_flux[i])
+# window-slide integral (half-widths of 5, 10 and 15 Myr)
+windows = [5, 10, 15]
+local_integral = window_integral(Age_flux, carbon_flux_mean, windows)
+
+# output window integrals (NaN where the window extends past the ends of the series)
+header = 'Age(Ma)' + ''.join(f'\t{window}Myr_window(Mt)' for window in windows)
+np.savetxt('window_integral.txt', np.column_stack((Age_flux, local_integral.T)), fmt='%.4f',
+           delimiter='\t', header=header, comments='')
     
     
 fig, ax = plt.subplots()
-ax.plot(center_age_5, local_integral_5, label='5 Myr window')
-ax.plot(center_age_10, local_integral_10, label='10 Myr window')
-ax.plot(center_age_15, local_integral_15, label='15 Myr window')
+for window, integral in zip(windows, local_integral):
+    ax.plot(Age_flux, integral, label=f'{window} Myr window')
 
 font={'family':'Arial', 'weight':'normal', 'size':9}
 ax.legend(prop=font, loc='best')
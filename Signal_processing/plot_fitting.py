@@ -5,10 +5,13 @@ Created on Sat Feb 15 12:06:05 2025
 @author: shenhao
 @mail:shenhao@mail.iggcas.ac.cn
 """
-import csv
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy import interpolate
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from proxy_data import load_CO2
 
 
 def load_reg_curve(file):
@@ -27,32 +30,6 @@ def load_reg_curve(file):
 
 
 
-def load_CO2(file):
-    f = open(file, 'r', encoding=u'utf-8', errors='ignore')
-    reader = csv.reader(f)
-    reader = list(reader)
-    age = []
-    CO2 = []
-    for i in range(len(reader)):
-        age.append(float(reader[i][0]))
-        CO2.append(float(reader[i][1]))
-    age = np.array(age)
-    CO2 = np.array(CO2)
-    
-    # interpolate to 1~65 with interval of 1 Ma
-    age_interp = np.arange(1,66)
-    f = interpolate.interp1d(age, CO2)
-    CO2_interp = f(age_interp)
-    
-    
-    # normalization
-    CO2_max = CO2_interp.max()
-    CO2_min = CO2_interp.min()
-    CO2_normalization = (CO2_interp-CO2_min) / (CO2_max-CO2_min)
-
-    return age_interp, CO2_normalization
-
-
 # load regression curve
 file = 'fitting_curve_this_study.txt'
 Age_reg, reg_curve_this_study = load_reg_curve(file)
@@ -65,7 +42,7 @@ Age_reg, reg_curve_noise_filt = load_reg_curve(file)
 
 # load CO2
 file = 'CO2_CenCO2PIP_2023.csv'
-Age_CO2, CO2 = load_CO2(file)
+Age_CO2, CO2, _ = load_CO2(file)
 
 
 # plot
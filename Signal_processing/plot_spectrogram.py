@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+plot the spectrograms written by cwt.py
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.ticker import NullLocator
+from obspy.imaging.cm import obspy_sequential
+from wavelet import read_cwt_netcdf
+
+
+
+def plot_spectrogram(ages, frequencies, spectrogram, vmin=0, vmax=0.8, significance=None, coi=None):
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    
+    X, Y = np.meshgrid(ages, frequencies)
+    cax = ax.pcolormesh(X, Y, np.abs(spectrogram), cmap=obspy_sequential, vmin=vmin, vmax=vmax, shading='gouraud')
+    
+    # 95% confidence contour (against red noise) and cone of influence
+    if significance is not None:
+        ax.contour(X, Y, significance, levels=[1], colors='k', linewidths=1)
+    if coi is not None:
+        ax.contourf(X, Y, coi.astype(float), levels=[0.5, 1.5], colors='none', hatches=['xx'])
+    
+    ax.set_yscale('log')
+    # translate frequency axis to wavelength axis
+    yticks = [0.015625, 0.03125, 0.0625, 0.125, 0.25]
+    ylable = [64, 32, 16, 8, 4]
+    ax.set_yticks(yticks)
+    ax.set_yticklabels(ylable)
+    ax.yaxis.set_minor_locator(NullLocator())
+    ax.set_xlabel('Age (Ma)', fontproperties={'family':'Arial'}, fontsize=12)
+    ax.set_ylabel('Period (Myr)', fontproperties={'family':'Arial'}, fontsize=12)
+    
+    cbar = fig.colorbar(cax, ax=ax)
+    
+    return fig, ax
+
+
+
+spectrograms, ages, frequencies, names, significance, coi = read_cwt_netcdf('spectrograms.nc')
+for i, name in enumerate(names):
+    fig, ax = plot_spectrogram(ages, frequencies, spectrograms[i],
+                               significance=None if significance is None else significance[i], coi=coi)
+    plt.savefig(f'spectrogram_{name}.png', format='png', dpi=600)
+    plt.close(fig)
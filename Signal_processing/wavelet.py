@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+continuous wavelet transform of many (equally sampled) series at once
+
+The Morlet wavelet transform is the same as obspy.signal.tf_misfit.cwt, but the FFTs of the
+wavelets (at all scales) are computed once and all series are convolved with them at once.
+"""
+import numpy as np
+
+
+
+def cwt_frequencies(fmin, fmax, nf=100):
+    '''
+    frequencies of the wavelet transform (log-spaced, same as obspy cwt)
+    '''
+    return np.logspace(np.log10(fmin), np.log10(fmax), nf)
+
+
+
+def morlet_scales(frequencies, w0):
+    '''
+    scales of the Morlet wavelet at the frequencies
+    '''
+    return w0 / (2 * np.pi * np.asarray(frequencies))
+
+
+
+def morlet_wavelet_ffts(npts, dt, w0, frequencies, nfft):
+    '''
+    FFTs (frequency, nfft) of the (time-reversed, conjugated) Morlet wavelets at all scales,
+    centred in a time window of npts samples
+    '''
+    t = np.linspace(0., (npts - 1) * dt, npts)
+    scales = morlet_scales(frequencies, w0)[:, np.newaxis]
+
+    # time shift necessary, because wavelet is defined around t = 0
+    with np.errstate(under='ignore'):
+        eta = -1 * (t - t[-1] / 2.) / scales
+        psi = np.pi ** (-.25) * np.exp(1j * w0 * eta) * np.exp(-eta ** 2 / 2.)
+        psih = psi.conjugate() / np.abs(scales) ** .5
+
+    return np.fft.fft(psih, n=nfft, axis=-1)
+
+
+
+def morlet_cwt(series, dt, w0, fmin, fmax, nf=100, chunk_size=100):
+    '''
+    continuous wavelet transform (Morlet wavelet) of a stack of equally sampled series
+
+    Parameters
+    ----------
+    series: the series (N, T), or a single series (T,)
+    dt: sampling interval
+    w0: the bandwidth resolution (parameter of the Morlet wavelet)
+    fmin, fmax, nf: the (log-spaced) frequencies, see cwt_frequencies
+    chunk_size: the number of series transformed at once (to limit memory)
+
+    Returns
+    -------
+    the complex wavelet transforms (N, nf, T), or (nf, T) for a single series,
+    each is the same as obspy.signal.tf_misfit.cwt(series[i], dt, w0, fmin, fmax, nf, wl='morlet')
+    '''
+    series = np.asarray(series, dtype=float)
+    single_series = series.ndim == 1
+    series = np.atleast_2d(series)
+    num_series, num_samples = series.shape
+
+    npts = num_samples * 2
+    nfft = int(2 ** np.ceil(np.log2(npts))) * 2
+    psihf = morlet_wavelet_ffts(npts, dt, w0, cwt_frequencies(fmin, fmax, nf), nfft)
+    t = np.linspace(0., (npts - 1) * dt, npts)
+    tminin = int(t[-1] / 2. / (t[1] - t[0]))
+
+    spectrograms = np.empty((num_series, nf, num_samples), dtype=complex)
+    for chunk_start in range(0, num_series, chunk_size):
+        sf = np.fft.fft(series[chunk_start:chunk_start+chunk_size], n=nfft, axis=-1)
+        with np.errstate(under='ignore'):
+            convolved = np.fft.ifft(psihf[np.newaxis] * sf[:, np.newaxis], axis=-1)
+        spectrograms[chunk_start:chunk_start+chunk_size] = convolved[..., tminin:tminin + num_samples] * dt
+
+    return spectrograms[0] if single_series else spectrograms
+
+
+
+def fit_ar1(series):
+    '''
+    fit an AR(1) (red noise) process x[t] = mean + alpha*(x[t-1] - mean) + noise to each series (N, T)
+
+    Returns
+    -------
+    the lag-1 autocorrelation alpha, mean and standard deviation of each series (N,)
+    '''
+    series = np.atleast_2d(np.asarray(series, dtype=float))
+    mean = series.mean(axis=-1)
+    anomaly = series - mean[:, np.newaxis]
+    variance = (anomaly * anomaly).mean(axis=-1)
+    alpha = (anomaly[:, 1:] * anomaly[:, :-1]).mean(axis=-1) / variance
+
+    return alpha, mean, np.sqrt(variance)
+
+
+
+def ar1_surrogates(alpha, mean, std, num_surrogates, num_samples, rng=None):
+    '''
+    random (stationary) AR(1) surrogates (num_surrogates, num_samples) with
+    lag-1 autocorrelation alpha, mean and standard deviation std
+    '''
+    from scipy.signal import lfilter
+
+    rng = np.random.default_rng(rng)
+    noise = rng.normal(0, std * np.sqrt(1 - alpha * alpha), (num_surrogates, num_samples))
+    # the first sample is drawn from the stationary distribution
+    noise[:, 0] = rng.normal(0, std, num_surrogates)
+
+    return mean + lfilter([1.], [1., -alpha], noise, axis=-1)
+
+
+
+def surrogate_power_chunk(alpha, mean, std, num_surrogates, num_samples, dt, w0, fmin, fmax, nf, rng):
+    '''
+    wavelet power (num_surrogates, nf, num_samples) of AR(1) surrogates (see cwt_significance)
+    '''
+    surrogates = ar1_surrogates(alpha, mean, std, num_surrogates, num_samples, rng)
+    spectrograms = morlet_cwt(surrogates, dt, w0, fmin, fmax, nf)
+
+    return (spectrograms.real ** 2 + spectrograms.imag ** 2).astype(np.float32)
+
+
+
+def cone_of_influence(num_samples, dt, w0, frequencies):
+    '''
+    mask (frequency, T) of the cone of influence, ie, where the wavelet transform is affected by the
+    edges of the series (the edge is within the e-folding time sqrt(2)*scale of the Morlet wavelet)
+    '''
+    t = np.arange(num_samples) * dt
+    edge_distance = np.minimum(t, t[-1] - t)
+    e_folding_time = np.sqrt(2) * morlet_scales(frequencies, w0)
+
+    return edge_distance[np.newaxis, :] < e_folding_time[:, np.newaxis]
+
+
+
+def cwt_significance(series, dt, w0, fmin, fmax, nf=100, num_surrogates=1000, percentile=95,
+                     chunk_size=100, seed=None, num_cpus=1):
+    '''
+    wavelet transform of each series (see morlet_cwt) and its significance against red noise,
+    ie, the wavelet power of num_surrogates AR(1) surrogates (fitted to each series) at each
+    frequency and age (so edge effects are included)
+
+    the surrogates are transformed chunk_size at a time, the chunks in num_cpus processes
+    (seed makes the surrogates reproducible), the surrogate power is kept as float32
+    (num_surrogates * nf * T * 4 bytes per series)
+
+    Returns
+    -------
+    the wavelet transforms (N, nf, T), the ratio (N, nf, T) of the wavelet power to the percentile of
+    the surrogate power (significant where > 1, eg, the 95% confidence contour is the contour at 1)
+    and the cone of influence mask (nf, T)
+    '''
+    series = np.atleast_2d(np.asarray(series, dtype=float))
+    num_series, num_samples = series.shape
+    spectrograms = morlet_cwt(series, dt, w0, fmin, fmax, nf)
+    alphas, means, stds = fit_ar1(series)
+
+    chunk_sizes = [min(chunk_size, num_surrogates - chunk_start) for chunk_start in range(0, num_surrogates, chunk_size)]
+    chunk_rngs = np.random.SeedSequence(seed).spawn(num_series * len(chunk_sizes))
+    pool = None
+    if num_cpus > 1 and len(chunk_sizes) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(num_cpus)
+
+    significance = np.empty((num_series, nf, num_samples))
+    try:
+        for i in range(num_series):
+            chunk_args = [(alphas[i], means[i], stds[i], chunk_num_surrogates, num_samples, dt, w0, fmin, fmax, nf, chunk_rng)
+                          for chunk_num_surrogates, chunk_rng in zip(chunk_sizes, chunk_rngs[i*len(chunk_sizes):(i+1)*len(chunk_sizes)])]
+            if pool is not None:
+                surrogate_power = np.concatenate(pool.starmap(surrogate_power_chunk, chunk_args))
+            else:
+                surrogate_power = np.concatenate([surrogate_power_chunk(*args) for args in chunk_args])
+            threshold = np.percentile(surrogate_power, percentile, axis=0)
+            significance[i] = np.abs(spectrograms[i]) ** 2 / threshold
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return spectrograms, significance, cone_of_influence(num_samples, dt, w0, cwt_frequencies(fmin, fmax, nf))
+
+
+
+def smooth_wavelet(power, dt, w0, frequencies, scale_smoothing=0.6):
+    '''
+    smooth (..., frequency, T) wavelet spectra in time (Gaussian of width the scale, as the Morlet wavelet)
+    and in scale (boxcar of scale_smoothing octaves), as used for the wavelet coherence (Torrence and Webster, 1999)
+    '''
+    from scipy.ndimage import uniform_filter1d
+
+    num_samples = power.shape[-1]
+    nfft = int(2 ** np.ceil(np.log2(2 * num_samples)))
+    scales = morlet_scales(frequencies, w0)[:, np.newaxis]
+    omega = 2 * np.pi * np.fft.fftfreq(nfft, dt)
+
+    # Gaussian convolution (unit area) in the frequency domain, with zero padding
+    gaussian = np.exp(-0.5 * (scales * omega[np.newaxis, :]) ** 2)
+    smoothed = np.fft.ifft(np.fft.fft(power, n=nfft, axis=-1) * gaussian, axis=-1)[..., :num_samples]
+    if not np.iscomplexobj(power):
+        smoothed = smoothed.real
+
+    # boxcar over the (log-spaced) scales
+    octaves_per_scale = np.abs(np.log2(frequencies[-1] / frequencies[0])) / (len(frequencies) - 1)
+    boxcar_width = max(1, int(round(scale_smoothing / octaves_per_scale)))
+    if np.iscomplexobj(smoothed):
+        return (uniform_filter1d(smoothed.real, boxcar_width, axis=-2, mode='nearest') +
+                1j * uniform_filter1d(smoothed.imag, boxcar_width, axis=-2, mode='nearest'))
+    return uniform_filter1d(smoothed, boxcar_width, axis=-2, mode='nearest')
+
+
+
+def coherence_from_cwt(cwt_x, cwt_y, dt, w0, frequencies):
+    '''
+    wavelet coherence (squared, 0~1) and phase (radians) from the wavelet transforms
+    (..., frequency, T) of x and y (broadcast against each other)
+
+    the phase is positive if x leads y along the sample axis, ie, as the sample index increases;
+    for series ordered by age (increasing into the past) a positive phase means x lags y in time
+    '''
+    scales = morlet_scales(frequencies, w0)[:, np.newaxis]
+    smoothed_cross = smooth_wavelet(cwt_x * cwt_y.conjugate() / scales, dt, w0, frequencies)
+    smoothed_x = smooth_wavelet((cwt_x.real ** 2 + cwt_x.imag ** 2) / scales, dt, w0, frequencies)
+    smoothed_y = smooth_wavelet((cwt_y.real ** 2 + cwt_y.imag ** 2) / scales, dt, w0, frequencies)
+    coherence = np.abs(smoothed_cross) ** 2 / (smoothed_x * smoothed_y)
+
+    return np.clip(coherence, 0, 1), np.angle(smoothed_cross)
+
+
+
+def wavelet_coherence(x, y, dt, w0, fmin, fmax, nf=100):
+    '''
+    cross wavelet transform, wavelet coherence and phase of series x (N, T) or (T,) and y (T,) or (N, T)
+
+    Returns
+    -------
+    the cross wavelet transforms W_x * conj(W_y), squared coherence and phase (radians, positive if x leads y
+    along the sample axis, see coherence_from_cwt), all (N, nf, T) (or (nf, T) if both x and y are single series)
+    '''
+    frequencies = cwt_frequencies(fmin, fmax, nf)
+    cwt_x = morlet_cwt(x, dt, w0, fmin, fmax, nf)
+    cwt_y = morlet_cwt(y, dt, w0, fmin, fmax, nf)
+    coherence, phase = coherence_from_cwt(cwt_x, cwt_y, dt, w0, frequencies)
+
+    return cwt_x * cwt_y.conjugate(), coherence, phase
+
+
+
+def surrogate_coherence_chunk(ar1_x, ar1_y, num_surrogates, num_samples, dt, w0, fmin, fmax, nf, rng):
+    '''
+    wavelet coherence (N, num_surrogates, nf, num_samples) between AR(1) surrogates of each x series
+    (ar1_x is the (alpha, mean, std) of each series) and AR(1) surrogates of y (see coherence_significance)
+    '''
+    rng = np.random.default_rng(rng)
+    frequencies = cwt_frequencies(fmin, fmax, nf)
+    cwt_y = morlet_cwt(ar1_surrogates(*ar1_y, num_surrogates, num_samples, rng), dt, w0, fmin, fmax, nf)
+
+    # the same y surrogates are used for all x series
+    coherence = np.empty((len(ar1_x[0]), num_surrogates, nf, num_samples), dtype=np.float32)
+    for i, (alpha, mean, std) in enumerate(zip(*ar1_x)):
+        cwt_x = morlet_cwt(ar1_surrogates(alpha, mean, std, num_surrogates, num_samples, rng), dt, w0, fmin, fmax, nf)
+        coherence[i] = coherence_from_cwt(cwt_x, cwt_y, dt, w0, frequencies)[0]
+
+    return coherence
+
+
+
+def coherence_significance(x, y, dt, w0, fmin, fmax, nf=100, num_surrogates=1000, percentile=95,
+                           chunk_size=50, seed=None, num_cpus=1):
+    '''
+    wavelet coherence of each series x (N, T) with y (T,) (see wavelet_coherence) and its significance,
+    ie, the coherence between num_surrogates pairs of AR(1) surrogates (fitted to each x series and to y)
+    at each frequency and age
+
+    the surrogates are processed chunk_size at a time, the chunks in num_cpus processes
+    (seed makes the surrogates reproducible)
+
+    Returns
+    -------
+    the cross wavelet transforms, squared coherence, phase, the ratio of the coherence to the percentile of
+    the surrogate coherence (significant where > 1), all (N, nf, T), and the cone of influence mask (nf, T)
+    '''
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    y = np.asarray(y, dtype=float)
+    num_samples = x.shape[-1]
+    cross_wavelet, coherence, phase = wavelet_coherence(x, y, dt, w0, fmin, fmax, nf)
+    ar1_x = fit_ar1(x)
+    ar1_y = tuple(parameter[0] for parameter in fit_ar1(y))
+
+    chunk_sizes = [min(chunk_size, num_surrogates - chunk_start) for chunk_start in range(0, num_surrogates, chunk_size)]
+    chunk_args = [(ar1_x, ar1_y, chunk_num_surrogates, num_samples, dt, w0, fmin, fmax, nf, chunk_rng)
+                  for chunk_num_surrogates, chunk_rng in zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes)))]
+    if num_cpus > 1 and len(chunk_args) > 1:
+        import multiprocessing
+        with multiprocessing.Pool(num_cpus) as pool:
+            surrogate_coherence = np.concatenate(pool.starmap(surrogate_coherence_chunk, chunk_args), axis=1)
+    else:
+        surrogate_coherence = np.concatenate([surrogate_coherence_chunk(*args) for args in chunk_args], axis=1)
+
+    significance = coherence / np.percentile(surrogate_coherence, percentile, axis=1)
+    coi = cone_of_influence(num_samples, dt, w0, cwt_frequencies(fmin, fmax, nf))
+
+    return cross_wavelet, coherence, phase, significance, coi
+
+
+
+def write_cwt_netcdf(filename, spectrograms, ages, frequencies, names, significance=None, coi=None):
+    '''
+    write the wavelet transforms (series, frequency, age) of the named series to a NetCDF file
+    (real and imaginary parts, since NetCDF has no complex type),
+    optionally with their significance (series, frequency, age) and cone of influence (frequency, age),
+    see cwt_significance
+    '''
+    import netCDF4
+
+    with netCDF4.Dataset(filename, 'w') as cdf:
+        cdf.createDimension('series', len(names))
+        cdf.createDimension('frequency', len(frequencies))
+        cdf.createDimension('age', len(ages))
+
+        cdf_names = cdf.createVariable('series', str, ('series',))
+        for i, name in enumerate(names):
+            cdf_names[i] = name
+        cdf_frequency = cdf.createVariable('frequency', 'f8', ('frequency',))
+        cdf_frequency[:] = frequencies
+        cdf_frequency.units = '1/Myr'
+        cdf_age = cdf.createVariable('age', 'f8', ('age',))
+        cdf_age[:] = ages
+        cdf_age.units = 'Ma'
+
+        cdf_real = cdf.createVariable('cwt_real', 'f8', ('series', 'frequency', 'age'), zlib=True)
+        cdf_real[:] = spectrograms.real
+        cdf_imag = cdf.createVariable('cwt_imag', 'f8', ('series', 'frequency', 'age'), zlib=True)
+        cdf_imag[:] = spectrograms.imag
+
+        if significance is not None:
+            cdf_significance = cdf.createVariable('significance', 'f8', ('series', 'frequency', 'age'), zlib=True)
+            cdf_significance[:] = significance
+        if coi is not None:
+            cdf_coi = cdf.createVariable('coi', 'i1', ('frequency', 'age'), zlib=True)
+            cdf_coi[:] = coi
+
+
+
+def read_cwt_netcdf(filename):
+    '''
+    read the wavelet transforms written by write_cwt_netcdf
+
+    Returns
+    -------
+    the complex wavelet transforms (series, frequency, age), ages, frequencies, series names,
+    significance and cone of influence (None if not written)
+    '''
+    import netCDF4
+
+    with netCDF4.Dataset(filename, 'r') as cdf:
+        names = list(cdf['series'][:])
+        frequencies = np.array(cdf['frequency'][:])
+        ages = np.array(cdf['age'][:])
+        spectrograms = np.array(cdf['cwt_real'][:]) + 1j * np.array(cdf['cwt_imag'][:])
+        significance = np.array(cdf['significance'][:]) if 'significance' in cdf.variables else None
+        coi = np.array(cdf['coi'][:], dtype=bool) if 'coi' in cdf.variables else None
+
+    return spectrograms, ages, frequencies, names, significance, coi
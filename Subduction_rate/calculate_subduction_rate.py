@@ -7,15 +7,19 @@ Created on Tue Nov 19 09:05:54 2024
 import os 
 import glob
 import warnings
+import multiprocessing
 import ptt
 import pygplates
 import numpy as np
 import pandas as pd
+from scipy.special import erfinv
 from pygplates_helper import *
 
 
 # common data files
 agegrid_filename = "../Muller_etal_2019_Tectonics_v2.0_netCDF/Muller_etal_2019_Tectonics_v2.0_AgeGrid-{:.0f}.nc"
+# the age grids are cached here (and memory-mapped when re-read)
+agegrid_cache_dir = "../Muller_etal_2019_Tectonics_v2.0_netCDF_cache/"
 
 # common variables
 extent_globe = [-180, 180, -90, 90]
@@ -32,15 +36,18 @@ lonq, latq = np.meshgrid(lon_grid,lat_grid)
 input_directory = "../Muller_etal_2019_PlateMotionModel_v2.0_Tectonics_Updated/"
 
 
-rotation_filenames = glob.glob(os.path.join(input_directory, '*.rot'))
-rotation_model = pygplates.RotationModel(rotation_filenames)
+model_cache_dir = "../Muller_etal_2019_PlateMotionModel_v2.0_Tectonics_Updated_cache/"
+
 
+rotation_filenames = glob.glob(os.path.join(input_directory, '*.rot'))
 
-topology_filenames = glob.glob(os.path.join(input_directory, '*.gpml'))
-topology_features = pygplates.FeatureCollection()
-for topology_filename in topology_filenames:
-    if "Inactive" not in topology_filename:
-        topology_features.add( pygplates.FeatureCollection(topology_filename) )
+# the "Inactive" topology files and slab topologies are excluded, and the files are only parsed
+# when first needed (or loaded from the cache if no model file was modified since it was written)
+plate_model = ptt.utils.plate_model_cache.PlateModel(
+    rotation_filenames,
+    glob.glob(os.path.join(input_directory, '*.gpml')),
+    cache_dir=model_cache_dir)
+topology_filenames = plate_model.get_topology_filenames()
 
 
 # We define a custom interpolator that optionally returns indices and distances
@@ -54,47 +61,104 @@ def sample_grid(lon, lat, grid, extent=[-180,180,-90,90], return_indices=False,
 def My2s(Ma):
     return Ma*3.1536e13
 
-def plate_temp(age, z, PLATE_THICKNESS) :
+# cooling plate model constants
+KAPPA = 0.804e-6
+T_MANTLE = 1350.0
+T_SURFACE = 0.0
+PLATE_THICKNESS = 125e3 # as in Parsons/Sclater
+
+# the series terms k = 1..19 of the cooling plate solution and their coefficients 2*(Tm-Ts)/(pi*k),
+# shaped (19, 1) so they broadcast against the (flattened) ages
+series_k = np.arange(1, 20, dtype=float).reshape(-1, 1)
+series_coefficients = 2.0 * (T_MANTLE - T_SURFACE) / (np.pi * series_k)
+
+def plate_temp(age, z, PLATE_THICKNESS=PLATE_THICKNESS, return_gradient=False):
     "Computes the temperature in a cooling plate for age = t\
-    and at a depth = z."
+    and at a depth = z (and optionally the temperature gradient dT/dz)."
 
-    KAPPA = 0.804e-6
-    T_MANTLE = 1350.0
-    T_SURFACE = 0.0
+    age = np.asarray(age, dtype=float)
+    z = np.asarray(z, dtype=float)
+    shape = np.broadcast(age, z).shape
+    age = np.broadcast_to(age, shape).ravel()
+    z = np.broadcast_to(z, shape).ravel()
 
-    sine_arg = np.pi * z / PLATE_THICKNESS
-    exp_arg = -KAPPA * np.pi * np.pi * age / (PLATE_THICKNESS * PLATE_THICKNESS)
-    k = np.ones_like(age)*np.arange(1, 20).reshape(-1,1)
-    cumsum = ( np.sin(k * sine_arg) * np.exp(k*k*exp_arg)/k ).sum(axis=0)
+    sine_arg = series_k * (np.pi * z / PLATE_THICKNESS)
+    decay = np.exp(series_k * series_k * (-KAPPA * np.pi * np.pi / (PLATE_THICKNESS * PLATE_THICKNESS)) * age)
+    temp = T_SURFACE + (series_coefficients * decay * np.sin(sine_arg)).sum(axis=0) \
+        + (T_MANTLE - T_SURFACE) * z / PLATE_THICKNESS
+    if not return_gradient:
+        return temp.reshape(shape)
 
-    return T_SURFACE + 2.0 * cumsum * (T_MANTLE - T_SURFACE)/np.pi + (T_MANTLE - T_SURFACE) * z/PLATE_THICKNESS
+    gradient = (series_coefficients * series_k * (np.pi / PLATE_THICKNESS) * decay * np.cos(sine_arg)).sum(axis=0) \
+        + (T_MANTLE - T_SURFACE) / PLATE_THICKNESS
+    return temp.reshape(shape), gradient.reshape(shape)
 
-def plate_isotherm_depth(age, temp=1250.0):
+def plate_isotherm_depth(age, temp=1250.0, rtol=0.001, max_iterations=50):
     "Computes the depth to the temp - isotherm in a cooling plate mode.\
-    Solution by iteration. By default the plate thickness is 125 km as\
-    in Parsons/Sclater."
+    Solution by Newton iteration (safeguarded by bisection), starting from the\
+    half-space cooling depth. By default the plate thickness is 125 km as\
+    in Parsons/Sclater. NaN ages give a NaN depth (the previous bisection\
+    solver returned its first midpoint, 62.5 km, for them)."
 
-    PLATE_THICKNESS = 125e3
-    
-    z = 0.0 # starting depth is 0
-    rtol = 0.001 # error tolerance
-    
-    z_too_small = np.atleast_1d(np.zeros_like(age, dtype=float))
-    z_too_big = np.atleast_1d(np.full_like(age, PLATE_THICKNESS, dtype=float))
-    
-    for i in range(20):
-        zi = 0.5 * (z_too_small + z_too_big)
-        ti = plate_temp (age, zi, PLATE_THICKNESS)
-        t_diff = temp - ti
-        z_too_big[t_diff < -rtol] = zi[t_diff < -rtol]
-        z_too_small[t_diff > rtol] = zi[t_diff > rtol]
-        
-        if (np.abs(t_diff) < rtol).all():
+    age = np.atleast_1d(np.asarray(age, dtype=float))
+    shape = age.shape
+    age = age.ravel()
+
+    # the isotherm is bracketed by [z_too_small, z_too_big] (the temperature increases with depth)
+    z_too_small = np.zeros_like(age)
+    z_too_big = np.full_like(age, PLATE_THICKNESS)
+
+    # initial guess from the half-space cooling model (close to the plate model for young ages)
+    half_space_factor = 2.0 * erfinv((temp - T_SURFACE) / (T_MANTLE - T_SURFACE)) * np.sqrt(KAPPA)
+    zi = np.clip(half_space_factor * np.sqrt(np.maximum(age, 0.0)), 0.0, PLATE_THICKNESS)
+
+    # only the points that have not converged yet are iterated (shared convergence mask)
+    active = np.flatnonzero(age > 0)
+    for i in range(max_iterations):
+        if active.size == 0:
             break
-            
+        z_active = zi[active]
+        ti, dtdz = plate_temp(age[active], z_active, PLATE_THICKNESS, return_gradient=True)
+        t_diff = ti - temp
+
+        converged = np.abs(t_diff) < rtol
+        too_big = t_diff > 0
+        z_too_big[active[too_big]] = z_active[too_big]
+        z_too_small[active[~too_big]] = z_active[~too_big]
+
+        # Newton step, falling back to bisection if it leaves the bracket
+        lo, hi = z_too_small[active], z_too_big[active]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_new = z_active - t_diff / dtdz
+        use_bisection = ~((z_new > lo) & (z_new < hi))
+        z_new[use_bisection] = 0.5 * (lo[use_bisection] + hi[use_bisection])
+
+        zi[active[~converged]] = z_new[~converged]
+        active = active[~converged]
+
     # protect against negative ages
     zi[age <= 0] = 0
-    return np.squeeze(zi)
+    return np.squeeze(zi.reshape(shape))
+
+# tabulated isotherm depths (one table per isotherm temperature), see plate_isotherm_depth_interpolated
+isotherm_depth_tables = {}
+
+def plate_isotherm_depth_interpolated(age, temp=1250.0, max_age=My2s(1000.0), num_ages=2001):
+    "Same as plate_isotherm_depth but interpolated from a table of isotherm depths\
+    (computed once per temp). The table is uniformly spaced in sqrt(age) since the\
+    depth increases as sqrt(age) for young ages. Ages older than max_age are clamped\
+    and NaN ages give a NaN depth (as in plate_isotherm_depth)."
+
+    table_key = (temp, max_age, num_ages)
+    if table_key not in isotherm_depth_tables:
+        sqrt_ages = np.linspace(0.0, np.sqrt(max_age), num_ages)
+        isotherm_depth_tables[table_key] = (sqrt_ages, np.atleast_1d(plate_isotherm_depth(sqrt_ages * sqrt_ages, temp)))
+    sqrt_ages, depths = isotherm_depth_tables[table_key]
+
+    age = np.asarray(age, dtype=float)
+    # protect against negative ages (depth is zero)
+    depth = np.interp(np.sqrt(np.maximum(age, 0.0)), sqrt_ages, depths)
+    return np.where(np.isnan(age), np.nan, depth)
 
 
 """
@@ -103,35 +167,36 @@ Calculate some tectonic parameters for the plate reconstruction model,
 reference from Muller 2022
 
 """
-def plate_tectonic_stats(reconstruction_time):
+def plate_tectonic_stats(reconstruction_time, subduction_data=None):
     
         
-    # calculate subduction convergence
+    # calculate subduction convergence (unless already calculated, eg, by subduction_convergence_time_series)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        subduction_data = ptt.subduction_convergence.subduction_convergence(
-            rotation_model,
-            topology_features,
-            tessellation_threshold_radians,
-            reconstruction_time,
-            anchor_plate_id=0)
-        subduction_data = np.vstack(subduction_data)
-        subduction_lon  = subduction_data[:,0]
-        subduction_lat  = subduction_data[:,1]
-        subduction_len  = np.radians(subduction_data[:,6]) * 1e3 * pygplates.Earth.mean_radius_in_kms
+        if subduction_data is None:
+            subduction_data = ptt.subduction_convergence.subduction_convergence(
+                plate_model.get_rotation_model(),
+                plate_model.get_topology_features(),
+                tessellation_threshold_radians,
+                reconstruction_time,
+                anchor_plate_id=0,
+                output_structured_array=True)
+        subduction_lon  = subduction_data['lon']
+        subduction_lat  = subduction_data['lat']
+        subduction_len  = np.radians(subduction_data['arc_length']) * 1e3 * pygplates.Earth.mean_radius_in_kms
     
         
     # protect against "negative" subduction
-    subduction_data[:,2] = np.clip(subduction_data[:,2], 0.0, 1e99)
+    subduction_data['conv_rate'] = np.clip(subduction_data['conv_rate'], 0.0, 1e99)
     # horizental component (normal to trench) of the subduction velocity (relative to trench in cm/yr) 
-    subduction_vel = np.fabs(subduction_data[:,2])*1e-2 * np.cos(np.radians(subduction_data[:,3])) 
+    subduction_vel = np.fabs(subduction_data['conv_rate'])*1e-2 * np.cos(np.radians(subduction_data['conv_obliquity'])) 
     subd_vel_mean, subd_vel_std = np.mean(subduction_vel), np.std(subduction_vel)
     
-    # sample age grid
-    age_grid = read_netcdf_grid(agegrid_filename.format(reconstruction_time), resample=(spacingX,spacingY))
-    age_grid_filled = fill_ndimage(age_grid)
-    age_interp = sample_grid(subduction_lon, subduction_lat, age_grid_filled)
-    thickness = plate_isotherm_depth(My2s(age_interp))
+    # sample age grid at the trench points only (trench points in age grid gaps take the nearest valid age)
+    age_grid, age_lon, age_lat = read_netcdf_grid(agegrid_filename.format(reconstruction_time), return_grids=True,
+                                                  cache_dir=agegrid_cache_dir)
+    age_interp = sample_grid_nearest_valid(subduction_lon, subduction_lat, age_grid, age_lon, age_lat)
+    thickness = plate_isotherm_depth_interpolated(My2s(age_interp))
     
     # how can get this relationship?
     slab_dip = 1.88e-3*subduction_vel*thickness + 21.9
@@ -141,11 +206,28 @@ def plate_tectonic_stats(reconstruction_time):
     vertical_vel = subduction_vel * np.sin(np.radians(slab_dip))
     vert_vel_mean, vert_vel_std = np.mean(vertical_vel), np.std(vertical_vel)
 
-    del subduction_data, age_grid, age_grid_filled # clean up
+    del subduction_data, age_grid # clean up
 
     return(subd_vel_mean, subd_vel_std, slab_dip_mean, slab_dip_std, vert_vel_mean, vert_vel_std)
 
 
+def plate_tectonic_stats_at_age(rotation_model, topology_features, age):
+    
+    # resolve the topologies only once at this age, and derive both the global trench/ridge statistics
+    # (trench and ridge lengths, convergence and spreading rates, area fluxes) and the stats above from them
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        boundary_stats, subduction_data = ptt.plate_boundary_statistics.plate_boundary_statistics(
+            rotation_model,
+            topology_features,
+            age,
+            tessellation_threshold_radians,
+            anchor_plate_id=0,
+            return_subduction_data=True)
+    
+    return boundary_stats, plate_tectonic_stats(age, subduction_data)
+
+
 if __name__ == '__main__':
     Ages = np.arange(251)
     stats_data = {}
@@ -153,9 +235,16 @@ if __name__ == '__main__':
     stats_data['Subduction rate mean (cm/yr)'] = []
     stats_data['Shallow slab dip mean (deg)'] = []
     stats_data['Vertical subduction rate mean (cm/yr)'] = []
-    for age in Ages:
-        print(f'working at {age} Ma...')
-        stats_Ma = plate_tectonic_stats(age)
+
+    boundary_stats_data = []
+
+    # calculate the stats at all ages in parallel (each process loads the rotation and topology files only once,
+    # and the ages arrive in order)
+    ages_stats = ptt.utils.plate_model_cache.imap_plate_model(
+        plate_tectonic_stats_at_age, [(age,) for age in Ages], plate_model, num_cpus=multiprocessing.cpu_count())
+    for age, (boundary_stats, stats_Ma) in zip(Ages, ages_stats):
+        print(f'finished {age} Ma...')
+        boundary_stats_data.append(boundary_stats)
         stats_data['Age'].append(age)
         stats_data['Subduction rate mean (cm/yr)'].append(stats_Ma[0]*1e2)
         stats_data['Shallow slab dip mean (deg)'].append(stats_Ma[2])
@@ -163,6 +252,12 @@ if __name__ == '__main__':
 
     df = pd.DataFrame(stats_data)
     df.to_excel('shallow_vertical_rate.xlsx', index=False, engine='openpyxl')
+
+    # trench and ridge lengths (km), length-weighted convergence and spreading rates (cm/yr)
+    # and subducted and created area fluxes (km^2/yr), one row per age
+    ptt.plate_boundary_statistics.write_time_series_file(
+        'plate_boundary_statistics.txt',
+        np.array(boundary_stats_data, dtype=ptt.plate_boundary_statistics.STATISTICS_DTYPE))
      
     
     
@@ -2,6 +2,7 @@ from .documentation import install_documentation
 from . import utils
 from . import subduction_convergence
 from . import ridge_spreading_rate
+from . import plate_boundary_statistics
 from . import cleanup_topologies
 from . import remove_plate_rotations
 from . import separate_ridge_transform_segments
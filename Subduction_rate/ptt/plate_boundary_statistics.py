@@ -0,0 +1,304 @@
+
+"""
+    Copyright (C) 2024 The University of Sydney, Australia
+
+    This program is free software; you can redistribute it and/or modify it under
+    the terms of the GNU General Public License, version 2, as published by
+    the Free Software Foundation.
+
+    This program is distributed in the hope that it will be useful, but WITHOUT
+    ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+    for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+
+###################################################################################
+# Global trench and ridge lengths, rates and area fluxes through time.            #
+#                                                                                 #
+# The topologies are resolved only once per time, and both the trench             #
+# convergence and the ridge spreading statistics are derived from them.           #
+###################################################################################
+
+
+from __future__ import print_function
+import math
+import numpy as np
+import pygplates
+from . import ridge_spreading_rate
+from . import separate_ridge_transform_segments
+from . import subduction_convergence
+from .utils import cached_rotation_model
+from .utils import plate_model_cache
+
+
+# The statistics of each time (one record per time).
+#
+# Lengths are in kms, rates are in cm/yr and area fluxes are in km^2/yr.
+#
+#   trench_length:                    total length of trenches with a subducting plate
+#   ridge_length:                     total length of the ridge segments of spreading features (excludes transform segments)
+#   mean_convergence_rate:            length-weighted mean convergence rate (relative to trench) along trenches
+#   mean_orthogonal_convergence_rate: length-weighted mean of the trench-orthogonal component of convergence
+#                                     (negative components, ie, divergence, are treated as zero)
+#   mean_spreading_rate:              length-weighted mean spreading rate along ridges
+#   subduction_area_flux:             area of seafloor subducted per year (orthogonal convergence rate times trench length)
+#   spreading_area_flux:              area of seafloor created per year (spreading rate times ridge length)
+#
+STATISTICS_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('trench_length', np.float64),
+    ('ridge_length', np.float64),
+    ('mean_convergence_rate', np.float64),
+    ('mean_orthogonal_convergence_rate', np.float64),
+    ('mean_spreading_rate', np.float64),
+    ('subduction_area_flux', np.float64),
+    ('spreading_area_flux', np.float64)])
+
+
+def plate_boundary_statistics(
+        rotation_features_or_model,
+        topology_features,
+        time,
+        threshold_sampling_distance_radians,
+        velocity_delta_time = 1.0,
+        anchor_plate_id = 0,
+        spreading_feature_types = None,
+        transform_segment_deviation_in_radians = separate_ridge_transform_segments.DEFAULT_TRANSFORM_SEGMENT_DEVIATION_RADIANS,
+        return_subduction_data = False):
+    """
+    Calculates the global trench and ridge statistics (see STATISTICS_DTYPE) at 'time'.
+
+    The topologies are resolved once (excluding slab topologies) and the resolved boundary sections are used both
+    to sample convergence along trenches (see 'subduction_convergence.subduction_convergence()') and
+    spreading along ridges (see 'ridge_spreading_rate.spreading_rates_dense()').
+
+    rotation_features_or_model: Rotation model or feature collection(s), or list of features, or filename(s).
+
+    topology_features: Topology feature collection(s), or list of features, or filename(s) or any combination of those.
+
+    time: Reconstruction time to resolved topologies.
+
+    threshold_sampling_distance_radians: Threshold sampling distance along trenches and ridges (in radians).
+
+    velocity_delta_time: Delta time interval used to calculate velocities.
+
+    spreading_feature_types: Only spreading features with a feature type contained in this list are considered ridges.
+                             If None then only mid-ocean ridges (gpml:MidOceanRidge) are considered.
+
+    transform_segment_deviation_in_radians: See 'ridge_spreading_rate.spreading_rates_dense()'.
+
+    return_subduction_data: Whether to also return the trench sample points (so callers can derive more trench statistics
+                            without resolving the topologies again).
+
+    Returns: A tuple of the statistics (in the order of the fields of STATISTICS_DTYPE).
+             If 'return_subduction_data' is True then a 2-tuple of the statistics and the trench sample points
+             (the structured array returned by 'subduction_convergence.subduction_convergence()' with 'output_structured_array') is returned.
+    """
+    time = float(time)
+
+    if spreading_feature_types is None:
+        spreading_feature_types = [pygplates.FeatureType.gpml_mid_ocean_ridge]
+
+    # Turn rotation data into a CachedRotationModel (if not already).
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
+
+    # Turn topology data into a list of features (if not already), and ignore slab topologies (usually flat slabs).
+    topology_features = [
+        topology_feature for topology_feature in pygplates.FeaturesFunctionArgument(topology_features).get_features()
+            if topology_feature.get_feature_type().to_qualified_string() != "gpml:TopologicalSlabBoundary"]
+
+    # Resolve our topological plate polygons (and deforming networks) to the current 'time' only once.
+    resolved_topologies = []
+    shared_boundary_sections = []
+    pygplates.resolve_topologies(topology_features, rotation_model.get_rotation_model(), resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
+
+    subduction_data = subduction_convergence.subduction_convergence_from_shared_boundary_sections(
+            shared_boundary_sections,
+            rotation_model,
+            threshold_sampling_distance_radians,
+            time,
+            velocity_delta_time,
+            anchor_plate_id,
+            output_structured_array = True)
+
+    spreading_data = ridge_spreading_rate.spreading_rates_dense_from_shared_boundary_sections(
+            shared_boundary_sections,
+            rotation_model,
+            time,
+            threshold_sampling_distance_radians,
+            spreading_feature_types,
+            transform_segment_deviation_in_radians,
+            velocity_delta_time,
+            output_structured_array = True)
+
+    # Arc lengths (in kms) of the sample points.
+    trench_arc_lengths = np.radians(subduction_data['arc_length']) * pygplates.Earth.mean_radius_in_kms
+    ridge_arc_lengths = np.radians(spreading_data['arc_length']) * pygplates.Earth.mean_radius_in_kms
+
+    # Trench-orthogonal convergence (protect against "negative" subduction).
+    orthogonal_convergence_rates = np.maximum(
+            subduction_data['conv_rate'] * np.cos(np.radians(subduction_data['conv_obliquity'])), 0.0)
+
+    statistics = (
+        time,
+        trench_arc_lengths.sum(),
+        ridge_arc_lengths.sum(),
+        _length_weighted_mean(subduction_data['conv_rate'], trench_arc_lengths),
+        _length_weighted_mean(orthogonal_convergence_rates, trench_arc_lengths),
+        _length_weighted_mean(spreading_data['spreading_rate'], ridge_arc_lengths),
+        # Convert cm/yr to km/yr.
+        1e-5 * np.dot(orthogonal_convergence_rates, trench_arc_lengths),
+        1e-5 * np.dot(spreading_data['spreading_rate'], ridge_arc_lengths))
+
+    if return_subduction_data:
+        return statistics, subduction_data
+
+    return statistics
+
+
+def plate_boundary_statistics_time_series(
+        rotation_filenames,
+        topology_filenames,
+        times,
+        threshold_sampling_distance_radians,
+        velocity_delta_time = 1.0,
+        anchor_plate_id = 0,
+        spreading_feature_types = None,
+        transform_segment_deviation_in_radians = separate_ridge_transform_segments.DEFAULT_TRANSFORM_SEGMENT_DEVIATION_RADIANS,
+        num_cpus = None,
+        model_cache_dir = None):
+    """
+    Calculates the global trench and ridge statistics (see 'plate_boundary_statistics()') at a sequence of times.
+
+    The times are distributed across a pool of processes (see 'utils.plate_model_cache.imap_plate_model()').
+    Each process loads (parses) the rotation and topology files only once (when first needed).
+
+    num_cpus: The number of processes to distribute the times across. If None (or zero) then all available CPUs are used.
+              If one then all times are processed serially in the current process.
+
+    model_cache_dir: Optional directory to cache the parsed rotation and topology files in (see 'utils.plate_model_cache').
+                     If None then the files are always parsed.
+
+    Returns: A NumPy structured array (with dtype STATISTICS_DTYPE) with one record per time (in the order of 'times').
+    """
+    times = [float(time) for time in times]
+
+    # The arguments of 'plate_boundary_statistics()' after the rotation model and topology features.
+    statistics_args = [
+        (time, threshold_sampling_distance_radians, velocity_delta_time, anchor_plate_id,
+            spreading_feature_types, transform_segment_deviation_in_radians)
+        for time in times]
+
+    # Read/parse the topological features once per process so we're not doing at each time iteration
+    # (or load them from the cache, if one is specified and it's up-to-date).
+    # Slab topologies are excluded here (rather than at each time).
+    #
+    # Rotations are cached across all times processed by each process.
+    plate_model = plate_model_cache.PlateModel(
+            rotation_filenames,
+            topology_filenames,
+            model_cache_dir,
+            exclude_inactive_files=False)
+
+    statistics = list(plate_model_cache.imap_plate_model(plate_boundary_statistics, statistics_args, plate_model, num_cpus))
+
+    return np.array(statistics, dtype=STATISTICS_DTYPE)
+
+
+def write_time_series_file(output_filename, time_series_statistics):
+    """
+    Write the statistics returned by 'plate_boundary_statistics_time_series()' to a text file (one row per time).
+
+    The header line contains the field names.
+    """
+    np.savetxt(
+            output_filename,
+            np.column_stack([time_series_statistics[field_name] for field_name in STATISTICS_DTYPE.names]),
+            fmt='%g',
+            header=' '.join(STATISTICS_DTYPE.names))
+
+
+##################
+# Implementation #
+##################
+
+
+def _length_weighted_mean(values, lengths):
+
+    total_length = lengths.sum()
+    if total_length <= 0:
+        return float('nan')
+
+    return np.dot(values, lengths) / total_length
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    __description__ = \
+    """Calculate the global trench and ridge lengths, length-weighted convergence and spreading rates,
+    and subducted and created seafloor area fluxes over a range of times.
+
+    One row per time is written to the output file (with the field names in the header line).
+
+    NOTE: Separate the positional and optional arguments with '--' (workaround for bug in argparse module).
+    For example...
+
+    python -m ptt.plate_boundary_statistics -r rotations.rot -m topologies.gpml -t 0 250 -- stats.txt
+    """
+
+    parser = argparse.ArgumentParser(description = __description__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('-r', '--rotation_filenames', type=str, nargs='+', required=True,
+            metavar='rotation_filename', help='One or more rotation files.')
+    parser.add_argument('-m', '--topology_filenames', type=str, nargs='+', required=True,
+            metavar='topology_filename', help='One or more topology files to generate resolved topologies.')
+    parser.add_argument('-a', '--anchor', type=int, default=0,
+            dest='anchor_plate_id',
+            help='Anchor plate id used for reconstructing. Defaults to zero.')
+    parser.add_argument('-d', '--threshold_sampling_distance_degrees', type=float,
+            default=subduction_convergence.DEFAULT_THRESHOLD_SAMPLING_DISTANCE_DEGREES,
+            help='Threshold sampling distance along trenches and ridges (in degrees). '
+                'Defaults to {0} degrees.'.format(subduction_convergence.DEFAULT_THRESHOLD_SAMPLING_DISTANCE_DEGREES))
+    parser.add_argument('-t', '--time_range', type=float, nargs=2,
+            metavar=('young_time', 'old_time'),
+            default=[subduction_convergence.DEFAULT_TIME_RANGE_YOUNG_TIME, subduction_convergence.DEFAULT_TIME_RANGE_OLD_TIME],
+            help='The time range (in Ma) from young time to old time. '
+                'Defaults to {0} -> {1} Ma.'.format(
+                    subduction_convergence.DEFAULT_TIME_RANGE_YOUNG_TIME, subduction_convergence.DEFAULT_TIME_RANGE_OLD_TIME))
+    parser.add_argument('-i', '--time_increment', type=float,
+            default=subduction_convergence.DEFAULT_TIME_INCREMENT,
+            help='The time increment in My. Defaults to {0} My.'.format(subduction_convergence.DEFAULT_TIME_INCREMENT))
+    parser.add_argument('-j', '--num_cpus', type=int, default=0,
+            help='The number of processes to distribute the times across. Defaults to all available CPUs.')
+    parser.add_argument('-c', '--model_cache_dir', type=str,
+            help='Optional directory to cache the parsed rotation and topology files in.')
+    parser.add_argument('output_filename', type=str,
+            help='The output filename.')
+
+    args = parser.parse_args()
+
+    young_time, old_time = args.time_range
+    if old_time < young_time:
+        parser.error("Old time must be greater than young time.")
+    if args.time_increment <= 0:
+        parser.error("The time increment must be positive.")
+
+    times = np.arange(young_time, old_time + 0.5 * args.time_increment, args.time_increment)
+
+    time_series_statistics = plate_boundary_statistics_time_series(
+            args.rotation_filenames,
+            args.topology_filenames,
+            times,
+            math.radians(args.threshold_sampling_distance_degrees),
+            anchor_plate_id = args.anchor_plate_id,
+            num_cpus = args.num_cpus,
+            model_cache_dir = args.model_cache_dir)
+
+    write_time_series_file(args.output_filename, time_series_statistics)
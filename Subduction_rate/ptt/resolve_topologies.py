@@ -20,6 +20,7 @@ from __future__ import print_function
 import argparse
 import math
 from . import separate_ridge_transform_segments
+from .utils import cached_rotation_model
 import sys
 import os.path
 import pygplates
@@ -64,7 +65,8 @@ def resolve_topologies(
     """
     
     # Turn rotation data into a RotationModel (if not already).
-    rotation_model = pygplates.RotationModel(rotation_features_or_model)
+    # Note: A CachedRotationModel is unwrapped since pyGPlates functions require an actual RotationModel.
+    rotation_model = cached_rotation_model.get_rotation_model(rotation_features_or_model)
 
     # Get topology features (could include filenames).    
     topology_features = pygplates.FeaturesFunctionArgument(topology_features).get_features()
@@ -130,7 +132,8 @@ def resolve_topologies_into_features(
     time = float(time)
     
     # Turn rotation data into a RotationModel (if not already).
-    rotation_model = pygplates.RotationModel(rotation_features_or_model)
+    # Note: A CachedRotationModel is unwrapped since pyGPlates functions require an actual RotationModel.
+    rotation_model = cached_rotation_model.get_rotation_model(rotation_features_or_model)
     
     # Turn topology data into a list of features (if not already).
     topology_features = pygplates.FeaturesFunctionArgument(topology_features)
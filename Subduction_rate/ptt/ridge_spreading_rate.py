@@ -25,12 +25,32 @@
 
 
 from __future__ import print_function
-import math
+import numpy as np
 import pygplates
 from . import separate_ridge_transform_segments
+from .utils import cached_rotation_model
+from .utils import great_circle_arcs
 import sys
 
 
+# The NumPy structured dtype of the array returned by 'spreading_rates()' when 'output_structured_array' is True.
+SPREADING_RATES_DTYPE = np.dtype([
+    ('lon', np.float64),
+    ('lat', np.float64),
+    ('spreading_rate', np.float64),
+    ('arc_length', np.float64)])
+
+# The NumPy structured dtype of the array returned by 'spreading_rates_dense()' when 'output_structured_array' is True.
+SPREADING_RATES_DENSE_DTYPE = np.dtype([
+    ('lon', np.float64),
+    ('lat', np.float64),
+    ('spreading_rate', np.float64),
+    ('spreading_obliquity', np.float64),
+    ('arc_length', np.float64),
+    ('normal_azimuth', np.float64),
+    ('left_plate_id', np.int64),
+    ('right_plate_id', np.int64)])
+
 
 def spreading_rates(
         rotation_features_or_model,
@@ -40,7 +60,8 @@ def spreading_rates(
         spreading_feature_types = None,
         transform_segment_deviation_in_radians = separate_ridge_transform_segments.DEFAULT_TRANSFORM_SEGMENT_DEVIATION_RADIANS,
         velocity_delta_time = 1.0,
-        anchor_plate_id = 0):
+        anchor_plate_id = 0,
+        output_structured_array = False):
     """
     Calculates spreading rate and length of ridge segments of spreading features (mid-ocean ridges) of resolved topologies at specified time.
     
@@ -71,12 +92,16 @@ def spreading_rates(
     
     velocity_delta_time: Delta time interval used to calculate spreading velocity.
     
-    Returns: List of the tuples described above.
+    output_structured_array: If True then return a NumPy structured array (with dtype SPREADING_RATES_DTYPE)
+                             instead of a list of tuples. Its fields are the tuple items described above.
+    
+    Returns: List of the tuples described above (or a structured array if 'output_structured_array' is True).
     """
     time = float(time)
     
-    # Turn rotation data into a RotationModel (if not already).
-    rotation_model = pygplates.RotationModel(rotation_features_or_model)
+    # Turn rotation data into a CachedRotationModel (if not already).
+    # The same stage rotations are requested by many spreading features (that share the same plate IDs).
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
     
     # Turn topology data into a list of features (if not already).
     topology_features = pygplates.FeaturesFunctionArgument(topology_features)
@@ -85,9 +110,9 @@ def spreading_rates(
     # We generate both the resolved topology boundaries and the boundary sections between them.
     resolved_topologies = []
     shared_boundary_sections = []
-    pygplates.resolve_topologies(topology_features.get_features(), rotation_model, resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
+    pygplates.resolve_topologies(topology_features.get_features(), rotation_model.get_rotation_model(), resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
     
-    # List of tesselated spreading points and associated spreading parameters for the current 'time'.
+    # Array blocks (one per sub-segment) of tesselated spreading points and associated spreading parameters for the current 'time'.
     output_data = []
     
     # Iterate over the shared boundary sections of all resolved topologies.
@@ -129,46 +154,41 @@ def spreading_rates(
                 ridge_sub_segment_geometry.to_tessellated(threshold_sampling_distance_radians)
                     for ridge_sub_segment_geometry in ridge_sub_segment_geometries]
             
-            # Iterate over the great circle arcs of the tessellated polylines to get the arc midpoints and lengths.
+            # Get the arc midpoints and lengths of the great circle arcs of the tessellated polylines (as arrays).
             # There is an arc between each adjacent pair of points in the polyline.
-            arc_midpoints = []
-            arc_lengths = []
-            for tessellated_shared_sub_segment_polyline in tessellated_shared_sub_segment_polylines:
-                for arc in tessellated_shared_sub_segment_polyline.get_segments():
-                    if not arc.is_zero_length():
-                        arc_midpoints.append(arc.get_arc_point(0.5))
-                        arc_lengths.append(arc.get_arc_length())
+            arc_start_points, arc_end_points = _get_non_zero_length_arcs(tessellated_shared_sub_segment_polylines)
             
             # Shouldn't happen, but just in case ridge sub-segment polylines coincide with points.
-            if not arc_midpoints:
+            if not len(arc_start_points):
                 continue
             
+            arc_midpoints = great_circle_arcs.get_arc_midpoints(arc_start_points, arc_end_points)
+            arc_lengths = great_circle_arcs.get_arc_lengths(arc_start_points, arc_end_points)
+            
             # Calculate the spreading velocities at the arc midpoints.
             #
             # Note that the stage rotation can be used directly on the reconstructed geometries because
             # it is already in the frame of reference of the reconstructed geometries.
-            spreading_velocity_vectors = pygplates.calculate_velocities(
+            spreading_velocity_vectors = great_circle_arcs.calculate_velocities(
                     arc_midpoints,
                     spreading_stage_rotation,
                     velocity_delta_time,
                     pygplates.VelocityUnits.cms_per_yr)
             
-            for arc_index in range(len(arc_midpoints)):
-                
-                arc_midpoint = arc_midpoints[arc_index]
-                arc_length = arc_lengths[arc_index]
-                lat, lon = arc_midpoint.to_lat_lon()
-                
-                spreading_velocity_magnitude = spreading_velocity_vectors[arc_index].get_magnitude()
-                
-                # The data will be output in GMT format (ie, lon first, then lat, etc).
-                output_data.append((
-                        lon,
-                        lat,
-                        spreading_velocity_magnitude,
-                        math.degrees(arc_length)))
-    
-    return output_data
+            lats, lons = great_circle_arcs.xyz_to_lat_lon(arc_midpoints)
+            
+            # The data will be output in GMT format (ie, lon first, then lat, etc).
+            # Append one (num_arcs, num_columns) block for the entire sub-segment.
+            output_data.append(np.column_stack((
+                    lons,
+                    lats,
+                    np.linalg.norm(spreading_velocity_vectors, axis=-1),
+                    np.degrees(arc_lengths))))
+    
+    if output_structured_array:
+        return great_circle_arcs.output_blocks_to_structured_array(output_data, SPREADING_RATES_DTYPE)
+    
+    return great_circle_arcs.output_blocks_to_tuples(output_data, SPREADING_RATES_DTYPE)
 
 def spreading_rates_dense(
         rotation_features_or_model,
@@ -178,7 +198,8 @@ def spreading_rates_dense(
         spreading_feature_types = None,
         transform_segment_deviation_in_radians = separate_ridge_transform_segments.DEFAULT_TRANSFORM_SEGMENT_DEVIATION_RADIANS,
         velocity_delta_time = 1.0,
-        anchor_plate_id = 0):
+        anchor_plate_id = 0,
+        output_structured_array = False):
     """
     Calculates spreading rate and length of ridge segments of spreading features (mid-ocean ridges) of resolved topologies at specified time.
     
@@ -212,11 +233,15 @@ def spreading_rates_dense(
     
     velocity_delta_time: Delta time interval used to calculate spreading velocity.
     
-    Returns: List of the tuples described above.
+    output_structured_array: If True then return a NumPy structured array (with dtype SPREADING_RATES_DENSE_DTYPE)
+                             instead of a list of tuples. Its fields are the tuple items described above.
+    
+    Returns: List of the tuples described above (or a structured array if 'output_structured_array' is True).
     """
     
-    # Turn rotation data into a RotationModel (if not already).
-    rotation_model = pygplates.RotationModel(rotation_features_or_model)
+    # Turn rotation data into a CachedRotationModel (if not already).
+    # The same stage rotations are requested by many spreading features (that share the same plate IDs).
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
     
     # Turn topology data into a list of features (if not already).
     topology_features = pygplates.FeaturesFunctionArgument(topology_features)
@@ -225,9 +250,41 @@ def spreading_rates_dense(
     # We generate both the resolved topology boundaries and the boundary sections between them.
     resolved_topologies = []
     shared_boundary_sections = []
-    pygplates.resolve_topologies(topology_features.get_features(), rotation_model, resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
+    pygplates.resolve_topologies(topology_features.get_features(), rotation_model.get_rotation_model(), resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
+    
+    return spreading_rates_dense_from_shared_boundary_sections(
+            shared_boundary_sections,
+            rotation_model,
+            time,
+            threshold_sampling_distance_radians,
+            spreading_feature_types,
+            transform_segment_deviation_in_radians,
+            velocity_delta_time,
+            output_structured_array)
+
+
+def spreading_rates_dense_from_shared_boundary_sections(
+        shared_boundary_sections,
+        rotation_features_or_model,
+        time,
+        threshold_sampling_distance_radians,
+        spreading_feature_types = None,
+        transform_segment_deviation_in_radians = separate_ridge_transform_segments.DEFAULT_TRANSFORM_SEGMENT_DEVIATION_RADIANS,
+        velocity_delta_time = 1.0,
+        output_structured_array = False):
+    """
+    Same as 'spreading_rates_dense()' except the topologies have already been resolved.
+    
+    shared_boundary_sections: The shared boundary sections output by 'pygplates.resolve_topologies()' at 'time'
+                              (using the same rotation model and anchor plate).
+    
+    For description of the remaining parameters, and the return value, see 'spreading_rates_dense()'.
+    """
     
-    # List of tesselated spreading points and associated spreading parameters for the current 'time'.
+    # Turn rotation data into a CachedRotationModel (if not already).
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
+    
+    # Array blocks (one per sub-segment) of tesselated spreading points and associated spreading parameters for the current 'time'.
     output_data = []
     
     # Iterate over the shared boundary sections of all resolved topologies.
@@ -272,73 +329,82 @@ def spreading_rates_dense(
                 ridge_sub_segment_geometry.to_tessellated(threshold_sampling_distance_radians)
                     for ridge_sub_segment_geometry in ridge_sub_segment_geometries]
             
-            # Iterate over the great circle arcs of the tessellated polylines to get the arc midpoints and lengths.
+            # Get the arc midpoints, lengths and normals of the great circle arcs of the tessellated polylines (as arrays).
             # There is an arc between each adjacent pair of points in the polyline.
-            arc_midpoints = []
-            arc_lengths = []
-            spreading_arc_normals = []
-            for tessellated_shared_sub_segment_polyline in tessellated_shared_sub_segment_polylines:
-                for arc in tessellated_shared_sub_segment_polyline.get_segments():
-                    if not arc.is_zero_length():
-                        arc_midpoints.append(arc.get_arc_point(0.5))
-                        arc_lengths.append(arc.get_arc_length())
-                        # The normal to the spreading ridge.
-                        spreading_arc_normals.append(arc.get_great_circle_normal())
+            arc_start_points, arc_end_points = _get_non_zero_length_arcs(tessellated_shared_sub_segment_polylines)
             
             # Shouldn't happen, but just in case ridge sub-segment polylines coincide with points.
-            if not arc_midpoints:
+            if not len(arc_start_points):
                 continue
-
+            
+            arc_midpoints = great_circle_arcs.get_arc_midpoints(arc_start_points, arc_end_points)
+            arc_lengths = great_circle_arcs.get_arc_lengths(arc_start_points, arc_end_points)
+            # The normal to the spreading ridge.
+            spreading_arc_normals = great_circle_arcs.get_great_circle_normals(arc_start_points, arc_end_points)
+            
             # The spreading arc normals relative to North (azimuth).
-            # Convert global 3D normal vectors to local (magnitude, azimuth, inclination) tuples (one tuple per point).
-            spreading_arc_local_normals = pygplates.LocalCartesian.convert_from_geocentric_to_magnitude_azimuth_inclination(
-                    arc_midpoints, spreading_arc_normals)
+            spreading_arc_normal_azimuths = great_circle_arcs.get_local_azimuths(arc_midpoints, spreading_arc_normals)
             
             # Calculate the spreading velocities at the arc midpoints.
             #
             # Note that the stage rotation can be used directly on the reconstructed geometries because
             # it is already in the frame of reference of the reconstructed geometries.
-            spreading_velocity_vectors = pygplates.calculate_velocities(
+            spreading_velocity_vectors = great_circle_arcs.calculate_velocities(
                     arc_midpoints,
                     spreading_stage_rotation,
                     velocity_delta_time,
                     pygplates.VelocityUnits.cms_per_yr)
+            spreading_velocity_magnitudes = np.linalg.norm(spreading_velocity_vectors, axis=-1)
             
-            for arc_index in range(len(arc_midpoints)):
-                arc_midpoint = arc_midpoints[arc_index]
-                arc_length = arc_lengths[arc_index]
-                
-                arc_midpoint = arc_midpoints[arc_index]
-                arc_length = arc_lengths[arc_index]
-                spreading_arc_normal = spreading_arc_normals[arc_index]
-                spreading_arc_normal_azimuth = spreading_arc_local_normals[arc_index][1]
-                lat, lon = arc_midpoint.to_lat_lon()
-
-                # The direction towards which we rotate from the subducting normal in a clockwise fashion.
-                clockwise_direction = pygplates.Vector3D.cross(spreading_arc_normal, arc_midpoint.to_xyz())
+            # Angle range [0, 180]
+            spreading_obliquities_degrees = np.degrees(great_circle_arcs.angle_between(
+                    spreading_velocity_vectors, spreading_arc_normals))
+            # Minimum deviation from 'spreading_arc_normal' and '-spreading_arc_normal'.
+            # Angle range [0, 90]
+            spreading_obliquities_degrees = np.where(
+                    spreading_obliquities_degrees > 90, 180 - spreading_obliquities_degrees, spreading_obliquities_degrees)
+            # A zero spreading velocity has no direction (so zero obliquity).
+            spreading_obliquities_degrees[spreading_velocity_magnitudes <= great_circle_arcs.ZERO_MAGNITUDE_EPSILON] = 0.0
+            
+            lats, lons = great_circle_arcs.xyz_to_lat_lon(arc_midpoints)
+            
+            # The data will be output in GMT format (ie, lon first, then lat, etc).
+            # Append one (num_arcs, num_columns) block for the entire sub-segment.
+            num_arcs = len(arc_midpoints)
+            output_data.append(np.column_stack((
+                    lons,
+                    lats,
+                    spreading_velocity_magnitudes,
+                    spreading_obliquities_degrees,
+                    np.degrees(arc_lengths),
+                    np.degrees(spreading_arc_normal_azimuths),
+                    np.full(num_arcs, pID_left),
+                    np.full(num_arcs, pID_right))))
+    
+    if output_structured_array:
+        return great_circle_arcs.output_blocks_to_structured_array(output_data, SPREADING_RATES_DENSE_DTYPE)
+    
+    return great_circle_arcs.output_blocks_to_tuples(output_data, SPREADING_RATES_DENSE_DTYPE)
 
-                # calculate the spreading rate parameters
-                spreading_velocity_vector = spreading_velocity_vectors[arc_index]
-                spreading_velocity_magnitude = spreading_velocity_vector.get_magnitude()
 
+##################
+# Implementation #
+##################
 
-                # Angle range [0, 180]
-                spreading_obliquity_degrees = math.degrees(pygplates.Vector3D.angle_between(
-                            spreading_velocity_vector, spreading_arc_normal))
-                # Minimum deviation from 'spreading_arc_normal' and '-spreading_arc_normal'.
-                # Angle range [0, 90]
-                if spreading_obliquity_degrees > 90:
-                    spreading_obliquity_degrees = 180 - spreading_obliquity_degrees
 
-                # The data will be output in GMT format (ie, lon first, then lat, etc).
-                output_data.append((
-                        lon,
-                        lat,
-                        spreading_velocity_magnitude,
-                        spreading_obliquity_degrees,
-                        math.degrees(arc_length),
-                        math.degrees(spreading_arc_normal_azimuth),
-                        pID_left,
-                        pID_right))
-    
-    return output_data
+def _get_non_zero_length_arcs(polylines):
+    """
+    Returns the (start points, end points) arrays of the non-zero length arcs of all 'polylines' (in order).
+    """
+    arc_start_points = []
+    arc_end_points = []
+    for polyline in polylines:
+        polyline_arc_start_points, polyline_arc_end_points = great_circle_arcs.get_non_zero_length_arcs(
+                great_circle_arcs.polyline_to_xyz_array(polyline))
+        arc_start_points.append(polyline_arc_start_points)
+        arc_end_points.append(polyline_arc_end_points)
+    
+    if not arc_start_points:
+        return np.empty((0, 3)), np.empty((0, 3))
+    
+    return np.vstack(arc_start_points), np.vstack(arc_end_points)
@@ -24,8 +24,12 @@
 
 from __future__ import print_function
 import math
+import numpy as np
 import pygplates
 import warnings
+from .utils import cached_rotation_model
+from .utils import great_circle_arcs
+from .utils import plate_model_cache
 
 
 # Required pygplates version.
@@ -190,8 +194,9 @@ def subduction_convergence(
     
     Parameters
     ----------
-    rotation_features_or_model : pygplates.RotationModel, or any combination of str, pygplates.FeatureCollection, pygplates.Feature
-        The rotation model can be specified as a RotationModel. Or it can be specified as a rotation feature collection,
+    rotation_features_or_model : pygplates.RotationModel, ptt.utils.cached_rotation_model.CachedRotationModel, or any combination of str, pygplates.FeatureCollection, pygplates.Feature
+        The rotation model can be specified as a RotationModel (or a CachedRotationModel to share cached rotations across calls).
+        Or it can be specified as a rotation feature collection,
         or rotation filename, or rotation feature, or sequence of rotation features, or a sequence (eg, list or tuple) of any combination
         of those four types.
     topology_features: any combination of str, pygplates.FeatureCollection, pygplates.Feature
@@ -229,6 +234,13 @@ def subduction_convergence(
         
         * extra data can be appended by specifying optional keyword arguments (*kwargs* - see list of options below).
     
+    numpy.ndarray
+        If the *output_structured_array* keyword argument is True then a NumPy structured array is returned instead
+        (with one record per sampled point). The field names are returned by :func:`get_output_field_names` and are
+        (in the same order as the tuple items above) 'lon', 'lat', 'conv_rate', 'conv_obliquity', 'trench_abs_rate',
+        'trench_abs_obliquity', 'arc_length', 'normal_azimuth', 'subducting_plate_id' and 'trench_plate_id'
+        followed by any optional fields requested via *kwargs*.
+    
     Notes
     -----
     Each point in the output is the midpoint of a great circle arc between two adjacent points in the trench polyline.
@@ -243,6 +255,11 @@ def subduction_convergence(
     
     The trench normal (at each arc segment mid-point) always points *towards* the overriding plate.
     
+    The arc midpoints, lengths, normals, azimuths and obliquities are calculated with NumPy (see :mod:`ptt.utils.great_circle_arcs`).
+    They agree with the equivalent pyGPlates arc queries to within floating-point rounding (not bit-for-bit), for example
+    within about 1e-11 degrees for the point locations and 1e-9 degrees for the azimuths and obliquities.
+    Zero velocities have a magnitude and obliquity of 0.0 (never -0.0).
+    
     The optional *kwargs* parameters can be used to append extra data to the output tuple of each sample point.
     The order of any extra data is the same order in which the parameters are listed below.
     
@@ -277,11 +294,15 @@ def subduction_convergence(
     |                                                |       |         | Orthogonal is normal to trench in direction of overriding plate.                |
     |                                                |       |         | Parallel is along trench and 90 degrees clockwise from orthogonal.              |
     +------------------------------------------------+-------+---------+---------------------------------------------------------------------------------+
+    | output_structured_array                        | bool  | False   | Return a NumPy structured array (one record per sample point) with named        |
+    |                                                |       |         | fields (see :func:`get_output_field_names`) instead of a list of tuples.        |
+    +------------------------------------------------+-------+---------+---------------------------------------------------------------------------------+
     """
     time = float(time)
 
-    # Turn rotation data into a RotationModel (if not already).
-    rotation_model = pygplates.RotationModel(rotation_features_or_model)
+    # Turn rotation data into a CachedRotationModel (if not already).
+    # The same rotations are requested by many trench sub-segments (that share the same plate IDs).
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
     
     # Turn topology data into a list of features (if not already).
     topology_features = pygplates.FeaturesFunctionArgument(
@@ -299,10 +320,53 @@ def subduction_convergence(
     # We generate both the resolved topology boundaries and the boundary sections between them.
     resolved_topologies = []
     shared_boundary_sections = []
-    pygplates.resolve_topologies(topology_features, rotation_model, resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
+    pygplates.resolve_topologies(topology_features, rotation_model.get_rotation_model(), resolved_topologies, time, shared_boundary_sections, anchor_plate_id)
+    
+    return subduction_convergence_from_shared_boundary_sections(
+            shared_boundary_sections,
+            rotation_model,
+            threshold_sampling_distance_radians,
+            time,
+            velocity_delta_time,
+            anchor_plate_id,
+            include_slab_topologies,
+            **kwargs)
+
+
+def subduction_convergence_from_shared_boundary_sections(
+        shared_boundary_sections,
+        rotation_features_or_model,
+        threshold_sampling_distance_radians,
+        time,
+        velocity_delta_time=1.0,
+        anchor_plate_id=0,
+        include_slab_topologies=False,
+        **kwargs):
+    """Same as :func:`subduction_convergence` except the topologies have already been resolved.
+    
+    This avoids resolving the topologies again when other boundary statistics (such as ridge spreading rates)
+    are also calculated from the same resolved topologies.
+    
+    Parameters
+    ----------
+    shared_boundary_sections : list of pygplates.ResolvedTopologicalSharedSubSegment
+        The shared boundary sections output by `pygplates.resolve_topologies()` at *time*
+        (using the same rotation model and anchor plate).
+    
+    Notes
+    -----
+    The remaining parameters, *kwargs* and the return value are the same as those of :func:`subduction_convergence`.
+    """
+    time = float(time)
+    
+    # Turn rotation data into a CachedRotationModel (if not already).
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
     
     # List of tesselated subduction zone (trench) shared subsegment points and associated convergence parameters
     # for the current 'time'.
+    #
+    # Each shared sub-segment appends one 2D array block (one row per point) which gets converted
+    # to a list of tuples (one per point) at the end.
     output_data = []
     
     # Iterate over the shared boundary sections of all resolved topologies.
@@ -428,7 +492,10 @@ def subduction_convergence(
                 # Accumulate distance-along-trench by length of sub-segment geometry.
                 distance_along_trench_radians += sub_segment_geometry.get_arc_length()
 
-    return output_data
+    if kwargs.get('output_structured_array', False):
+        return great_circle_arcs.output_blocks_to_structured_array(output_data, get_output_dtype(**kwargs))
+
+    return great_circle_arcs.output_blocks_to_tuples(output_data, get_output_dtype(**kwargs))
 
 
 def _sub_segment_subduction_convergence(
@@ -548,207 +615,221 @@ def _sub_segment_subduction_convergence(
     tessellated_shared_sub_segment_polyline = (
             sub_segment_geometry.to_tessellated(threshold_sampling_distance_radians))
     
-    # Iterate over the great circle arcs of the tessellated polyline to get the
-    # arc midpoints, lengths and trench normals.
-    # There is an arc between each adjacent pair of points in the polyline.
-    arc_midpoints = []
-    arc_lengths = []
-    trench_normals = []
-    for arc in tessellated_shared_sub_segment_polyline.get_segments():
-        if not arc.is_zero_length():
-            arc_midpoints.append(arc.get_arc_point(0.5))
-            arc_lengths.append(arc.get_arc_length())
-            # The normal to the trench in the direction of subduction (towards overriding plate).
-            trench_normals.append(trench_normal_reversal * arc.get_great_circle_normal())
+    # Get the arc midpoints, lengths and trench normals of all great circle arcs of the tessellated polyline
+    # in one go (instead of iterating over the arcs).
+    # There is an arc between each adjacent pair of points in the polyline (excluding zero length arcs).
+    arc_start_points, arc_end_points = great_circle_arcs.get_non_zero_length_arcs(
+            great_circle_arcs.polyline_to_xyz_array(tessellated_shared_sub_segment_polyline))
     
     # Shouldn't happen, but just in case the shared sub-segment polyline coincides with a point.
-    if not arc_midpoints:
+    if not len(arc_start_points):
         return
     
+    arc_midpoints = great_circle_arcs.get_arc_midpoints(arc_start_points, arc_end_points)
+    arc_lengths = great_circle_arcs.get_arc_lengths(arc_start_points, arc_end_points)
+    # The normal to the trench in the direction of subduction (towards overriding plate).
+    trench_normals = trench_normal_reversal * great_circle_arcs.get_great_circle_normals(arc_start_points, arc_end_points)
+    
     # The trench normals relative to North (azimuth).
-    # Convert global 3D normal vectors to local (magnitude, azimuth, inclination) tuples (one tuple per point).
-    trench_local_normals = pygplates.LocalCartesian.convert_from_geocentric_to_magnitude_azimuth_inclination(
-            arc_midpoints, trench_normals)
+    trench_normal_azimuths = great_circle_arcs.get_local_azimuths(arc_midpoints, trench_normals)
+    
+    lats, lons = great_circle_arcs.xyz_to_lat_lon(arc_midpoints)
+    
+    # The direction towards which we rotate from the trench normal in a clockwise fashion.
+    clockwise_directions = np.cross(trench_normals, arc_midpoints)
     
     # Calculate the convergence velocities at the arc midpoints.
     #
     # Note; We need to convert the reconstructed geometry points into the convergence stage rotation
     # reference frame to calculate velocities and then convert the velocities using the
     # reverse transform as mentioned above.
-    arc_midpoints_in_convergence_stage_frame = [
-            to_convergence_stage_frame * arc_midpoint
-                    for arc_midpoint in arc_midpoints]
-    convergence_velocity_vectors_in_convergence_stage_frame = pygplates.calculate_velocities(
+    arc_midpoints_in_convergence_stage_frame = great_circle_arcs.rotate_points(
+            to_convergence_stage_frame, arc_midpoints)
+    convergence_velocity_vectors_in_convergence_stage_frame = great_circle_arcs.calculate_velocities(
             arc_midpoints_in_convergence_stage_frame,
             convergence_relative_stage_rotation,
             velocity_delta_time,
             pygplates.VelocityUnits.cms_per_yr)
-    convergence_velocity_vectors = [
-            from_convergence_stage_frame * velocity
-                    for velocity in convergence_velocity_vectors_in_convergence_stage_frame]
+    convergence_velocity_vectors = great_circle_arcs.rotate_points(
+            from_convergence_stage_frame, convergence_velocity_vectors_in_convergence_stage_frame)
+    
+    # Calculate the convergence rate parameters.
+    convergence_velocity_magnitudes, convergence_obliquities_degrees = great_circle_arcs.get_signed_obliquities(
+            convergence_velocity_vectors, trench_normals, clockwise_directions)
+    # See if plates are diverging (moving away from each other).
+    # If plates are diverging (moving away from each other) then make the
+    # velocity magnitude negative to indicate this. This could be inferred from
+    # the obliquity but it seems this is the standard way to output convergence rate.
+    convergence_velocity_magnitudes = great_circle_arcs.negate_where(
+            np.fabs(convergence_obliquities_degrees) > 90,
+            convergence_velocity_magnitudes)
     
     # Calculate the trench absolute velocities at the arc midpoints.
-    trench_absolute_velocity_vectors = pygplates.calculate_velocities(
+    trench_absolute_velocity_vectors = great_circle_arcs.calculate_velocities(
             arc_midpoints, trench_equivalent_stage_rotation,
             velocity_delta_time, pygplates.VelocityUnits.cms_per_yr)
     
-    if output_subducting_absolute_velocity or output_subducting_absolute_velocity_components:
-        # Calculate the subducting absolute velocities at the arc midpoints.
-        subducting_absolute_velocity_vectors = pygplates.calculate_velocities(
-                arc_midpoints, subducting_equivalent_stage_rotation,
-                velocity_delta_time, pygplates.VelocityUnits.cms_per_yr)
+    # Calculate the trench absolute velocity magnitude and obliquity.
+    trench_absolute_velocity_magnitudes, trench_absolute_obliquities_degrees = great_circle_arcs.get_signed_obliquities(
+            trench_absolute_velocity_vectors, trench_normals, clockwise_directions)
+    # See if the trench absolute motion is heading in the direction of the
+    # overriding plate. If it is then make the velocity magnitude negative to
+    # indicate this. This could be inferred from the obliquity but it seems this
+    # is the standard way to output trench velocity magnitude.
+    #
+    # Note that we are not calculating the motion of the trench
+    # relative to the overriding plate - they are usually attached to each other
+    # and hence wouldn't move relative to each other.
+    trench_absolute_velocity_magnitudes = great_circle_arcs.negate_where(
+            np.fabs(trench_absolute_obliquities_degrees) < 90,
+            trench_absolute_velocity_magnitudes)
     
-    for arc_index in range(len(arc_midpoints)):
-        arc_midpoint = arc_midpoints[arc_index]
-        arc_length = arc_lengths[arc_index]
-        trench_normal = trench_normals[arc_index]
-        trench_normal_azimuth = trench_local_normals[arc_index][1]
-        lat, lon = arc_midpoint.to_lat_lon()
-        
-        # The direction towards which we rotate from the trench normal in a clockwise fashion.
-        clockwise_direction = pygplates.Vector3D.cross(trench_normal, arc_midpoint.to_xyz())
-        
-        # Calculate the convergence rate parameters.
-        convergence_velocity_vector = convergence_velocity_vectors[arc_index]
-        if convergence_velocity_vector.is_zero_magnitude():
-            convergence_velocity_magnitude = 0
-            convergence_obliquity_degrees = 0
-        else:
-            convergence_velocity_magnitude = convergence_velocity_vector.get_magnitude()
-            convergence_obliquity_degrees = math.degrees(pygplates.Vector3D.angle_between(
-                    convergence_velocity_vector, trench_normal))
-            # Anti-clockwise direction has range (0, -180) instead of (0, 180).
-            if pygplates.Vector3D.dot(convergence_velocity_vector, clockwise_direction) < 0:
-                convergence_obliquity_degrees = -convergence_obliquity_degrees
-            
-            # See if plates are diverging (moving away from each other).
-            # If plates are diverging (moving away from each other) then make the
-            # velocity magnitude negative to indicate this. This could be inferred from
-            # the obliquity but it seems this is the standard way to output convergence rate.
-            if math.fabs(convergence_obliquity_degrees) > 90:
-                convergence_velocity_magnitude = -convergence_velocity_magnitude
+    num_arcs = len(arc_midpoints)
+    
+    # Start with the standard columns, and add extra columns later (if requested).
+    #
+    # The data will be output in GMT format (ie, lon first, then lat, etc).
+    output_columns = [
+            lons,
+            lats,
+            convergence_velocity_magnitudes,
+            convergence_obliquities_degrees,
+            trench_absolute_velocity_magnitudes,
+            trench_absolute_obliquities_degrees,
+            np.degrees(arc_lengths),
+            np.degrees(trench_normal_azimuths),
+            np.full(num_arcs, subducting_plate_id, dtype=np.float64),
+            np.full(num_arcs, trench_plate_id, dtype=np.float64)]
+    
+    if output_distance_to_nearest_edge_of_trench or output_distance_to_start_edge_of_trench:
+        # Increase by distance from previous segment mid-point to current segment mid-point.
+        # Which is half previous segment length and half current segment length.
+        # So the distance to each mid-point is the sum of all previous segment lengths plus half the current segment length.
+        distances_along_trench_radians = distance_along_trench_radians + np.cumsum(arc_lengths) - 0.5 * arc_lengths
         
-        # Calculate the trench absolute velocity magnitude and obliquity.
-        trench_absolute_velocity_vector = trench_absolute_velocity_vectors[arc_index]
-        if trench_absolute_velocity_vector.is_zero_magnitude():
-            trench_absolute_velocity_magnitude = 0
-            trench_absolute_obliquity_degrees = 0
-        else:
-            trench_absolute_velocity_magnitude = trench_absolute_velocity_vector.get_magnitude()
-            trench_absolute_obliquity_degrees = math.degrees(pygplates.Vector3D.angle_between(
-                    trench_absolute_velocity_vector, trench_normal))
-            # Anti-clockwise direction has range (0, -180) instead of (0, 180).
-            if pygplates.Vector3D.dot(trench_absolute_velocity_vector, clockwise_direction) < 0:
-                trench_absolute_obliquity_degrees = -trench_absolute_obliquity_degrees
+        # Distance to nearest edge of the trench.
+        if output_distance_to_nearest_edge_of_trench:
+            distances_to_nearest_edge_of_trench_radians = np.where(
+                    distances_along_trench_radians < 0.5 * trench_length_radians,
+                    distances_along_trench_radians,
+                    trench_length_radians - distances_along_trench_radians)
             
-            # See if the trench absolute motion is heading in the direction of the
-            # overriding plate. If it is then make the velocity magnitude negative to
-            # indicate this. This could be inferred from the obliquity but it seems this
-            # is the standard way to output trench velocity magnitude.
-            #
-            # Note that we are not calculating the motion of the trench
-            # relative to the overriding plate - they are usually attached to each other
-            # and hence wouldn't move relative to each other.
-            if math.fabs(trench_absolute_obliquity_degrees) < 90:
-                trench_absolute_velocity_magnitude = -trench_absolute_velocity_magnitude
-        
-        # Start with the standard tuple, and add extra data later (if requested).
-        #
-        # The data will be output in GMT format (ie, lon first, then lat, etc).
-        output_tuple = (
-                lon,
-                lat,
-                convergence_velocity_magnitude,
-                convergence_obliquity_degrees,
-                trench_absolute_velocity_magnitude,
-                trench_absolute_obliquity_degrees,
-                math.degrees(arc_length),
-                math.degrees(trench_normal_azimuth),
-                subducting_plate_id,
-                trench_plate_id)
+            output_columns.append(np.degrees(distances_to_nearest_edge_of_trench_radians))
         
-        if output_distance_to_nearest_edge_of_trench or output_distance_to_start_edge_of_trench:
-            # Increase by distance from previous segment mid-point to current segment mid-point.
-            # Which is half previous segment length and half current segment length.
-            if arc_index > 0:
-                prev_arc_length = arc_lengths[arc_index-1]
-                distance_along_trench_radians += 0.5 * prev_arc_length
-            distance_along_trench_radians += 0.5 * arc_length
-            
-            # Distance to nearest edge of the trench.
-            if output_distance_to_nearest_edge_of_trench:
-                if distance_along_trench_radians < 0.5 * trench_length_radians:
-                    distance_to_nearest_edge_of_trench_radians = distance_along_trench_radians
-                else:
-                    distance_to_nearest_edge_of_trench_radians = trench_length_radians - distance_along_trench_radians
-                
-                output_tuple += (math.degrees(distance_to_nearest_edge_of_trench_radians),)
+        # Distance to start edge of the trench.
+        if output_distance_to_start_edge_of_trench:
+            # We want the distance to be along the clockwise direction around the overriding plate.
+            if trench_normal_reversal < 0:
+                # The overriding plate is on the right of the trench.
+                # So the clockwise direction starts at the beginning of the trench.
+                distances_to_start_edge_of_trench_radians = distances_along_trench_radians
+            else:
+                # The overriding plate is on the left of the trench.
+                # So the clockwise direction starts at the end of the trench.
+                distances_to_start_edge_of_trench_radians = trench_length_radians - distances_along_trench_radians
             
-            # Distance to start edge of the trench.
-            if output_distance_to_start_edge_of_trench:
-                # We want the distance to be along the clockwise direction around the overriding plate.
-                if trench_normal_reversal < 0:
-                    # The overriding plate is on the right of the trench.
-                    # So the clockwise direction starts at the beginning of the trench.
-                    distance_to_start_edge_of_trench_radians = distance_along_trench_radians
-                else:
-                    # The overriding plate is on the left of the trench.
-                    # So the clockwise direction starts at the end of the trench.
-                    distance_to_start_edge_of_trench_radians = trench_length_radians - distance_along_trench_radians
-                
-                output_tuple += (math.degrees(distance_to_start_edge_of_trench_radians),)
+            output_columns.append(np.degrees(distances_to_start_edge_of_trench_radians))
+    
+    if output_convergence_velocity_components:
+        # The orthogonal and parallel components are just magnitude multiplied by cosine and sine.
+        convergence_obliquities_radians = np.radians(convergence_obliquities_degrees)
+        output_columns.append(np.cos(convergence_obliquities_radians) * np.fabs(convergence_velocity_magnitudes))
+        output_columns.append(np.sin(convergence_obliquities_radians) * np.fabs(convergence_velocity_magnitudes))
+    
+    if output_trench_absolute_velocity_components:
+        # The orthogonal and parallel components are just magnitude multiplied by cosine and sine.
+        trench_absolute_obliquities_radians = np.radians(trench_absolute_obliquities_degrees)
+        output_columns.append(np.cos(trench_absolute_obliquities_radians) * np.fabs(trench_absolute_velocity_magnitudes))
+        output_columns.append(np.sin(trench_absolute_obliquities_radians) * np.fabs(trench_absolute_velocity_magnitudes))
+    
+    if output_subducting_absolute_velocity or output_subducting_absolute_velocity_components:
+        # Calculate the subducting absolute velocities at the arc midpoints.
+        subducting_absolute_velocity_vectors = great_circle_arcs.calculate_velocities(
+                arc_midpoints, subducting_equivalent_stage_rotation,
+                velocity_delta_time, pygplates.VelocityUnits.cms_per_yr)
         
-        if output_convergence_velocity_components:
-            # The orthogonal and parallel components are just magnitude multiplied by cosine and sine.
-            convergence_velocity_orthogonal = (
-                math.cos(math.radians(convergence_obliquity_degrees)) * math.fabs(convergence_velocity_magnitude))
-            convergence_velocity_parallel = (
-                math.sin(math.radians(convergence_obliquity_degrees)) * math.fabs(convergence_velocity_magnitude))
-            output_tuple += (convergence_velocity_orthogonal, convergence_velocity_parallel)
+        # Calculate the subducting absolute velocity magnitude and obliquity.
+        # Zero magnitude velocities have zero magnitude and obliquity (and hence zero components).
+        subducting_absolute_velocity_magnitudes, subducting_absolute_obliquities_degrees = great_circle_arcs.get_signed_obliquities(
+                subducting_absolute_velocity_vectors, trench_normals, clockwise_directions)
+        # See if the subducting absolute motion is heading in the direction of the overriding plate.
+        # If it is then make the velocity magnitude negative to indicate this.
+        subducting_absolute_velocity_magnitudes = great_circle_arcs.negate_where(
+                np.fabs(subducting_absolute_obliquities_degrees) < 90,
+                subducting_absolute_velocity_magnitudes)
         
-        if output_trench_absolute_velocity_components:
+        if output_subducting_absolute_velocity:
+            output_columns.append(subducting_absolute_velocity_magnitudes)
+            output_columns.append(subducting_absolute_obliquities_degrees)
+        if output_subducting_absolute_velocity_components:
             # The orthogonal and parallel components are just magnitude multiplied by cosine and sine.
-            trench_absolute_velocity_orthogonal = (
-                math.cos(math.radians(trench_absolute_obliquity_degrees)) * math.fabs(trench_absolute_velocity_magnitude))
-            trench_absolute_velocity_parallel = (
-                math.sin(math.radians(trench_absolute_obliquity_degrees)) * math.fabs(trench_absolute_velocity_magnitude))
-            output_tuple += (trench_absolute_velocity_orthogonal, trench_absolute_velocity_parallel)
-        
-        if output_subducting_absolute_velocity or output_subducting_absolute_velocity_components:
-            # Calculate the subducting absolute velocity magnitude and obliquity.
-            subducting_absolute_velocity_vector = subducting_absolute_velocity_vectors[arc_index]
-            if subducting_absolute_velocity_vector.is_zero_magnitude():
-                if output_subducting_absolute_velocity:
-                    output_tuple += (0.0, 0.0)
-                if output_subducting_absolute_velocity_components:
-                    output_tuple += (0.0, 0.0)
-            else:
-                subducting_absolute_velocity_magnitude = subducting_absolute_velocity_vector.get_magnitude()
-                subducting_absolute_obliquity_degrees = math.degrees(pygplates.Vector3D.angle_between(
-                        subducting_absolute_velocity_vector, trench_normal))
-                # Anti-clockwise direction has range (0, -180) instead of (0, 180).
-                if pygplates.Vector3D.dot(subducting_absolute_velocity_vector, clockwise_direction) < 0:
-                    subducting_absolute_obliquity_degrees = -subducting_absolute_obliquity_degrees
-                
-                # See if the subducting absolute motion is heading in the direction of the overriding plate.
-                # If it is then make the velocity magnitude negative to indicate this.
-                if math.fabs(subducting_absolute_obliquity_degrees) < 90:
-                    subducting_absolute_velocity_magnitude = -subducting_absolute_velocity_magnitude
-                
-                if output_subducting_absolute_velocity:
-                    output_tuple += (subducting_absolute_velocity_magnitude, subducting_absolute_obliquity_degrees)
-                if output_subducting_absolute_velocity_components:
-                    # The orthogonal and parallel components are just magnitude multiplied by cosine and sine.
-                    subducting_absolute_velocity_orthogonal = (
-                        math.cos(math.radians(subducting_absolute_obliquity_degrees)) * math.fabs(subducting_absolute_velocity_magnitude))
-                    subducting_absolute_velocity_parallel = (
-                        math.sin(math.radians(subducting_absolute_obliquity_degrees)) * math.fabs(subducting_absolute_velocity_magnitude))
-                    output_tuple += (subducting_absolute_velocity_orthogonal, subducting_absolute_velocity_parallel)
-        
-        output_data.append(output_tuple)
+            subducting_absolute_obliquities_radians = np.radians(subducting_absolute_obliquities_degrees)
+            output_columns.append(np.cos(subducting_absolute_obliquities_radians) * np.fabs(subducting_absolute_velocity_magnitudes))
+            output_columns.append(np.sin(subducting_absolute_obliquities_radians) * np.fabs(subducting_absolute_velocity_magnitudes))
+    
+    # Append one (num_arcs, num_columns) block for the entire sub-segment.
+    output_data.append(np.column_stack(output_columns))
+
+
+# Names of the standard fields of each sample point (in the same order as the output tuple items).
+_OUTPUT_FIELD_NAMES = (
+    'lon',
+    'lat',
+    'conv_rate',
+    'conv_obliquity',
+    'trench_abs_rate',
+    'trench_abs_obliquity',
+    'arc_length',
+    'normal_azimuth',
+    'subducting_plate_id',
+    'trench_plate_id')
+
+# Names of the optional fields (in output order) associated with each optional keyword argument.
+_OPTIONAL_OUTPUT_FIELD_NAMES = (
+    ('output_distance_to_nearest_edge_of_trench', ('distance_to_nearest_edge',)),
+    ('output_distance_to_start_edge_of_trench', ('distance_to_start_edge',)),
+    ('output_convergence_velocity_components', ('conv_orthogonal', 'conv_parallel')),
+    ('output_trench_absolute_velocity_components', ('trench_abs_orthogonal', 'trench_abs_parallel')),
+    ('output_subducting_absolute_velocity', ('subducting_abs_rate', 'subducting_abs_obliquity')),
+    ('output_subducting_absolute_velocity_components', ('subducting_abs_orthogonal', 'subducting_abs_parallel')))
+
+# The plate ID fields are integers (all other fields are floating-point).
+_OUTPUT_PLATE_ID_FIELD_NAMES = ('subducting_plate_id', 'trench_plate_id')
+
+
+def get_output_field_names(**kwargs):
+    """
+    Returns the list of field names of each sample point output by :func:`subduction_convergence`.
+    
+    The *kwargs* is the same as that of :func:`subduction_convergence` (the optional field names
+    are appended in the same order as the extra tuple items).
+    """
+    field_names = list(_OUTPUT_FIELD_NAMES)
+    for keyword_argument, optional_field_names in _OPTIONAL_OUTPUT_FIELD_NAMES:
+        if kwargs.get(keyword_argument, False):
+            field_names.extend(optional_field_names)
+    
+    return field_names
+
+
+def get_output_dtype(**kwargs):
+    """
+    Returns the NumPy structured dtype of the array returned by :func:`subduction_convergence`
+    when its *output_structured_array* keyword argument is True.
+    """
+    return np.dtype([
+        (field_name, np.int64 if field_name in _OUTPUT_PLATE_ID_FIELD_NAMES else np.float64)
+            for field_name in get_output_field_names(**kwargs)])
 
 
 def write_output_file(output_filename, output_data):
+    # A structured array (see 'output_structured_array') is written in bulk.
+    if isinstance(output_data, np.ndarray) and output_data.dtype.names:
+        output_formats = ['%d' if np.issubdtype(output_data.dtype[field_name], np.integer) else '%s'
+                for field_name in output_data.dtype.names]
+        np.savetxt(output_filename, output_data, fmt=output_formats, delimiter=' ')
+        return
+    
     with open(output_filename, 'w') as output_file:
         for output_line in output_data:
             output_file.write(' '.join(str(item) for item in output_line) + '\n')
@@ -821,8 +902,13 @@ def create_coverage_feature_from_convergence_data(
     output_subducting_absolute_velocity = kwargs.get('output_subducting_absolute_velocity', False)
     output_subducting_absolute_velocity_components = kwargs.get('output_subducting_absolute_velocity_components', False)
     
-    # Convert the list of tuples (one tuple per sample point) into a tuple of lists (one list per data parameter).
-    parameter_lists = list(zip(*subduction_convergence_data))
+    if isinstance(subduction_convergence_data, np.ndarray) and subduction_convergence_data.dtype.names:
+        # A structured array (see 'output_structured_array') already has one array per data parameter.
+        parameter_lists = [subduction_convergence_data[field_name].tolist()
+                for field_name in subduction_convergence_data.dtype.names]
+    else:
+        # Convert the list of tuples (one tuple per sample point) into a tuple of lists (one list per data parameter).
+        parameter_lists = list(zip(*subduction_convergence_data))
     
     # Put all convergence data for the current reconstruction time into a single feature.
     coverage_feature = pygplates.Feature()
@@ -900,6 +986,176 @@ def create_coverage_feature_from_convergence_data(
     return coverage_feature
 
 
+def subduction_convergence_time_series(
+        rotation_filenames,
+        topology_filenames,
+        threshold_sampling_distance_radians,
+        times,
+        velocity_delta_time = 1.0,
+        anchor_plate_id = 0,
+        include_slab_topologies=False,
+        num_cpus = None,
+        model_cache_dir = None,
+        **kwargs):
+    # Docstring in numpydoc format...
+    """Find the convergence and absolute velocities sampled along trenches (subduction zones) at a sequence of geological times.
+    
+    The times are distributed across a pool of processes. Each process loads (parses) the rotation and topology files
+    only once (when the process starts) and then calls :func:`subduction_convergence` for each time it is given.
+    If *model_cache_dir* is specified then the parsed files are also cached there (see `utils.plate_model_cache`),
+    so that the processes (and later runs) load the cached features instead of parsing the files.
+    
+    Parameters
+    ----------
+    rotation_filenames : sequence of str
+        The rotation filenames.
+    topology_filenames : sequence of str
+        The topological boundary and network filenames (and the filenames of the topological sections they reference).
+    threshold_sampling_distance_radians: float
+        Threshold sampling distance along trench (in radians).
+    times: sequence of float
+        The reconstruction times at which to query subduction convergence.
+    velocity_delta_time: float, optional
+        The delta time interval used for velocity calculations. Defaults to 1My.
+    anchor_plate_id: int, optional
+        The anchor plate of the rotation model. Defaults to zero.
+    include_slab_topologies : bool, default False
+        Include slab topologies (`gpml:TopologicalSlabBoundary`) in analysis.
+    num_cpus : int, optional
+        The number of processes to distribute the times across. If None (or zero) then all available CPUs are used.
+        If one then all times are processed serially in the current process.
+    model_cache_dir : str, optional
+        The directory to cache the parsed rotation and topology features in. If None then the files are always parsed.
+    
+    Returns
+    -------
+    numpy.ndarray
+        A NumPy structured array with one record per sampled point (of all times).
+        The first field is 'time' and the remaining fields are those of :func:`get_output_field_names`.
+        The records are ordered by time (in the order of *times*), regardless of the order in which the processes finish.
+    
+    Notes
+    -----
+    The *kwargs* is the same as that of :func:`subduction_convergence` (see that function for the list of options).
+    """
+    times = [float(time) for time in times]
+    
+    # Each time returns a structured array.
+    kwargs['output_structured_array'] = True
+    
+    output_data_at_times = [
+            output_data for time, output_data in iter_subduction_convergence_time_series(
+                rotation_filenames,
+                topology_filenames,
+                threshold_sampling_distance_radians,
+                times,
+                velocity_delta_time,
+                anchor_plate_id,
+                include_slab_topologies=include_slab_topologies,
+                num_cpus=num_cpus,
+                model_cache_dir=model_cache_dir,
+                **kwargs)]
+    
+    # Gather the results of all times into a single structured array (with an extra time field).
+    time_series_dtype = np.dtype([('time', np.float64)] + get_output_dtype(**kwargs).descr)
+    time_series_data = np.empty(sum(len(output_data) for output_data in output_data_at_times), dtype=time_series_dtype)
+    
+    point_index = 0
+    for time, output_data in zip(times, output_data_at_times):
+        time_series_rows = time_series_data[point_index : point_index + len(output_data)]
+        time_series_rows['time'] = time
+        for field_name in output_data.dtype.names:
+            time_series_rows[field_name] = output_data[field_name]
+        point_index += len(output_data)
+    
+    return time_series_data
+
+
+def iter_subduction_convergence_time_series(
+        rotation_filenames,
+        topology_filenames,
+        threshold_sampling_distance_radians,
+        times,
+        velocity_delta_time = 1.0,
+        anchor_plate_id = 0,
+        include_slab_topologies=False,
+        num_cpus = None,
+        model_cache_dir = None,
+        **kwargs):
+    """
+    Same as :func:`subduction_convergence_time_series` except the results are yielded one time at a time
+    (as a '(time, output_data)' tuple where 'output_data' is the output of :func:`subduction_convergence` at 'time').
+    
+    The times are yielded in the order of *times* as soon as each time (and all times before it) has been processed,
+    so the results of all times are never held in memory at once.
+    """
+    times = [float(time) for time in times]
+    
+    # Read/parse the topological features once per process so we're not doing at each time iteration
+    # (or load them from the cache, if one is specified and it's up-to-date).
+    # Slab topologies are excluded up front unless requested (they're ignored by 'subduction_convergence()' anyway).
+    #
+    # Rotations are cached across all times processed by each process.
+    plate_model = plate_model_cache.PlateModel(
+            rotation_filenames,
+            topology_filenames,
+            model_cache_dir,
+            exclude_inactive_files=False,
+            exclude_slab_topologies=not include_slab_topologies)
+    
+    output_data_at_times = plate_model_cache.imap_plate_model(
+            _subduction_convergence_at_time,
+            [(time, threshold_sampling_distance_radians, velocity_delta_time, anchor_plate_id, include_slab_topologies, kwargs)
+                for time in times],
+            plate_model,
+            num_cpus)
+    for time, output_data in zip(times, output_data_at_times):
+        yield time, output_data
+
+
+def get_time_series_data_at_time(time_series_data, time):
+    """
+    Returns the records of *time_series_data* (returned by :func:`subduction_convergence_time_series`) at *time*.
+    
+    The returned structured array excludes the 'time' field (so it has the same fields as the output of :func:`subduction_convergence`).
+    """
+    # The records are grouped by time, but the times are not necessarily sorted.
+    time_indices = np.flatnonzero(time_series_data['time'] == float(time))
+    if len(time_indices):
+        time_series_data = time_series_data[time_indices[0] : time_indices[-1] + 1]
+    else:
+        time_series_data = time_series_data[:0]
+    
+    # Copy the non-time fields into a new (packed) structured array.
+    field_names = [field_name for field_name in time_series_data.dtype.names if field_name != 'time']
+    output_data = np.empty(len(time_series_data), dtype=[(field_name, time_series_data.dtype[field_name]) for field_name in field_names])
+    for field_name in field_names:
+        output_data[field_name] = time_series_data[field_name]
+    
+    return output_data
+
+
+def _subduction_convergence_at_time(
+        rotation_model,
+        topology_features,
+        time,
+        threshold_sampling_distance_radians,
+        velocity_delta_time,
+        anchor_plate_id,
+        include_slab_topologies,
+        kwargs):
+    
+    return subduction_convergence(
+            rotation_model,
+            topology_features,
+            threshold_sampling_distance_radians,
+            time,
+            velocity_delta_time,
+            anchor_plate_id,
+            include_slab_topologies=include_slab_topologies,
+            **kwargs)
+
+
 def subduction_convergence_over_time(
         output_filename_prefix,
         output_filename_extension,
@@ -913,6 +1169,8 @@ def subduction_convergence_over_time(
         anchor_plate_id = 0,
         output_gpml_filename = None,
         include_slab_topologies=False,
+        num_cpus = None,
+        model_cache_dir = None,
         **kwargs):
     if time_increment <= 0:
         raise ValueError('The time increment "{0}" is not positive and non-zero.'.format(time_increment))
@@ -920,34 +1178,39 @@ def subduction_convergence_over_time(
     if time_young > time_old:
         raise ValueError('The young time {0} is older (larger) than the old time {1}.'.format(time_young, time_old))
     
-    rotation_model = pygplates.RotationModel(rotation_filenames)
+    # The time range.
+    times = []
+    time = time_young
+    while time <= pygplates.GeoTimeInstant(time_old):
+        times.append(time)
+        # Increment the time further into the past.
+        time += time_increment
     
-    # Read/parse the topological features once so we're not doing at each time iteration.
-    topology_features = [pygplates.FeatureCollection(topology_filename)
-            for topology_filename in topology_filenames]
+    # Each time returns a structured array.
+    kwargs['output_structured_array'] = True
     
     if output_gpml_filename:
         coverage_features = []
     
-    # Iterate over the time rage.
-    time = time_young
-    while time <= pygplates.GeoTimeInstant(time_old):
+    # Calculate the tesselated trench points and associated convergence parameters for all times
+    # (distributed across 'num_cpus' processes), and write the output file of each time as soon as it arrives.
+    #
+    # The times arrive in order (so the coverage features are also in time order).
+    for time, output_data in iter_subduction_convergence_time_series(
+            rotation_filenames,
+            topology_filenames,
+            threshold_sampling_distance_radians,
+            times,
+            velocity_delta_time,
+            anchor_plate_id,
+            include_slab_topologies=include_slab_topologies,
+            num_cpus=num_cpus,
+            model_cache_dir=model_cache_dir,
+            **kwargs):
         
         # print('Time {0}'.format(time))
         
-        # Returns a list of tesselated trench points and associated convergence parameters
-        # to write to the output file for the current 'time'.
-        output_data = subduction_convergence(
-                rotation_model,
-                topology_features,
-                threshold_sampling_distance_radians,
-                time,
-                velocity_delta_time,
-                anchor_plate_id,
-                include_slab_topologies=include_slab_topologies,
-                **kwargs)
-        
-        if output_data:
+        if len(output_data):
             output_filename = '{0}_{1:0.2f}.{2}'.format(output_filename_prefix, time, output_filename_extension)
             write_output_file(output_filename, output_data)
             
@@ -955,9 +1218,6 @@ def subduction_convergence_over_time(
             if output_gpml_filename:
                 coverage_feature = create_coverage_feature_from_convergence_data(output_data, time, **kwargs)
                 coverage_features.append(coverage_feature)
-
-        # Increment the time further into the past.
-        time += time_increment
     
     if output_gpml_filename:
         # Write out all coverage features to a single GPML file.
@@ -1399,6 +1659,12 @@ if __name__ == '__main__':
                     'the filename suffix contains the time and the filename extension.')
         parser.add_argument('-e', '--output_filename_extension', type=str, default='xy',
                 help='The output xy filename extension. Defaults to "xy".')
+        parser.add_argument('-j', '--num_cpus', type=int, default=0,
+                help='The number of processes to distribute the times across. '
+                     'Defaults to 0 (use all available CPUs). Specify 1 to process the times serially.')
+        parser.add_argument('-c', '--model_cache_dir', type=str,
+                help='Optional directory to cache the parsed rotation and topology files in '
+                     '(later runs, and each process, then load the cache instead of parsing the files).')
         parser.add_argument('-w', '--ignore_topology_warnings', action="store_true",
                 help='If specified then topology warnings are ignored (not output). '
                      'These are the warnings about not finding the overriding and subducting plates.')
@@ -1444,6 +1710,8 @@ if __name__ == '__main__':
                 args.velocity_delta_time,
                 args.anchor_plate_id,
                 args.output_gpml_filename,
+                num_cpus=args.num_cpus,
+                model_cache_dir=args.model_cache_dir,
                 **kwargs)
         if return_code is None:
             sys.exit(1)
@@ -1,6 +1,9 @@
 from .call_system_command import *
 from .GPMLTools import *
+from . import cached_rotation_model
+from . import plate_model_cache
 from . import points_in_polygons
+from . import great_circle_arcs
 from . import points_spatial_tree
 from . import proximity_query
 from . import reconstruct_by_topologies
\ No newline at end of file
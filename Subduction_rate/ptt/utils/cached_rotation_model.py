@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Copyright (C) 2024 The University of Sydney, Australia
+
+    This program is free software; you can redistribute it and/or modify it under
+    the terms of the GNU General Public License, version 2, as published by
+    the Free Software Foundation.
+
+    This program is distributed in the hope that it will be useful, but WITHOUT
+    ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+    for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+
+###################################################################################
+# Memoize the finite/stage rotations returned by 'pygplates.RotationModel'.       #
+#                                                                                 #
+# The same rotations (same times, plate pair and anchor plate) are typically      #
+# requested many times, such as once per trench sub-segment or once per point     #
+# sharing the same plate IDs. This caches them in a bounded LRU cache.            #
+###################################################################################
+#
+#
+# For example:
+#
+#
+#    import cached_rotation_model
+#
+#    rotation_model = cached_rotation_model.CachedRotationModel(rotation_filenames)
+#
+#    # Only the first call queries the rotation features, the second call returns the cached rotation.
+#    stage_rotation = rotation_model.get_rotation(time, moving_plate_id, time + 1, fixed_plate_id)
+#    stage_rotation = rotation_model.get_rotation(time, moving_plate_id, time + 1, fixed_plate_id)
+#
+#    print(rotation_model.get_cache_info())
+#
+#    # Functions that require an actual 'pygplates.RotationModel' (such as 'pygplates.resolve_topologies()')
+#    # should be passed the wrapped rotation model.
+#    pygplates.resolve_topologies(topology_features, rotation_model.get_rotation_model(), resolved_topologies, time)
+#
+###################################################################################
+
+
+from __future__ import print_function
+from collections import namedtuple, OrderedDict
+import pygplates
+
+
+# The default maximum number of rotations stored in the cache.
+DEFAULT_MAX_CACHE_SIZE = 10000
+
+
+# The cache statistics returned by 'CachedRotationModel.get_cache_info()'.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'max_size', 'current_size'])
+
+
+class CachedRotationModel(object):
+    """
+    Wraps a 'pygplates.RotationModel' and memoizes the rotations returned by 'get_rotation()'.
+
+    Rotations are keyed by (to_time, moving_plate_id, fixed_plate_id, anchor_plate_id, from_time)
+    and the least recently used rotations are evicted once the cache reaches its maximum size.
+
+    Any other 'pygplates.RotationModel' methods are forwarded to the wrapped rotation model.
+    """
+
+    def __init__(self, rotation_features_or_model, max_cache_size=DEFAULT_MAX_CACHE_SIZE):
+        """
+        rotation_features_or_model: Rotation model or feature collection(s), or list of features, or filename(s).
+
+        max_cache_size: The maximum number of rotations to cache. Must be positive.
+
+        Raises ValueError if 'max_cache_size' is not positive.
+        """
+        if max_cache_size <= 0:
+            raise ValueError('The maximum cache size "{0}" is not positive.'.format(max_cache_size))
+
+        # Avoid wrapping a CachedRotationModel (just share its rotation model instead).
+        if isinstance(rotation_features_or_model, CachedRotationModel):
+            rotation_features_or_model = rotation_features_or_model.get_rotation_model()
+
+        # Turn rotation data into a RotationModel (if not already).
+        self.rotation_model = pygplates.RotationModel(rotation_features_or_model)
+
+        self.max_cache_size = max_cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_rotation(
+            self,
+            to_time,
+            moving_plate_id,
+            from_time=None,
+            fixed_plate_id=None,
+            anchor_plate_id=None,
+            use_identity_for_missing_plate_ids=True):
+        """
+        Same as 'pygplates.RotationModel.get_rotation()' but returns a cached rotation if the same rotation was requested previously.
+
+        Note that None is not cached (returned when a plate ID is missing and 'use_identity_for_missing_plate_ids' is False).
+        """
+        key = (
+            _get_time_key(to_time),
+            moving_plate_id,
+            fixed_plate_id,
+            anchor_plate_id,
+            _get_time_key(from_time),
+            use_identity_for_missing_plate_ids)
+
+        # Move a cached rotation to the most recently used end of the cache.
+        # Note: Using pop/insert (instead of 'move_to_end()') to also support Python 2.
+        rotation = self._cache.pop(key, None)
+        if rotation is not None:
+            self.hits += 1
+            self._cache[key] = rotation
+            return rotation
+
+        self.misses += 1
+
+        # Only pass the optional arguments that were specified (so that the wrapped rotation model uses its own defaults).
+        optional_kwargs = {}
+        if from_time is not None:
+            optional_kwargs['from_time'] = from_time
+        if fixed_plate_id is not None:
+            optional_kwargs['fixed_plate_id'] = fixed_plate_id
+        if anchor_plate_id is not None:
+            optional_kwargs['anchor_plate_id'] = anchor_plate_id
+
+        rotation = self.rotation_model.get_rotation(
+                to_time,
+                moving_plate_id,
+                use_identity_for_missing_plate_ids=use_identity_for_missing_plate_ids,
+                **optional_kwargs)
+
+        if rotation is not None:
+            self._cache[key] = rotation
+            # Evict the least recently used rotation if the cache is full.
+            if len(self._cache) > self.max_cache_size:
+                self._cache.popitem(last=False)
+
+        return rotation
+
+    def get_rotation_model(self):
+        """
+        Returns the wrapped 'pygplates.RotationModel'.
+
+        Use this for pyGPlates functions that require an actual 'pygplates.RotationModel'
+        (such as 'pygplates.resolve_topologies()', 'pygplates.reconstruct()' and 'pygplates.PlatePartitioner').
+        """
+        return self.rotation_model
+
+    def get_cache_info(self):
+        """
+        Returns the cache statistics as a named tuple (hits, misses, max_size, current_size).
+        """
+        return CacheInfo(self.hits, self.misses, self.max_cache_size, len(self._cache))
+
+    def clear_cache(self):
+        """
+        Removes all cached rotations and resets the hit/miss counters.
+        """
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        # Forward any other 'pygplates.RotationModel' methods (eg, 'get_reconstruction_tree()') to the wrapped rotation model.
+        # Note: This is only called if the attribute is not found on this object.
+        #       And avoid infinite recursion if the wrapped rotation model has not been set yet (eg, when unpickling).
+        if name == 'rotation_model':
+            raise AttributeError(name)
+        return getattr(self.rotation_model, name)
+
+
+def get_cached_rotation_model(rotation_features_or_model, max_cache_size=DEFAULT_MAX_CACHE_SIZE):
+    """
+    Returns 'rotation_features_or_model' if it's already a CachedRotationModel, otherwise wraps it in a new CachedRotationModel.
+
+    rotation_features_or_model: Cached rotation model, or rotation model or feature collection(s), or list of features, or filename(s).
+    """
+    if isinstance(rotation_features_or_model, CachedRotationModel):
+        return rotation_features_or_model
+
+    return CachedRotationModel(rotation_features_or_model, max_cache_size)
+
+
+def get_rotation_model(rotation_features_or_model):
+    """
+    Returns a 'pygplates.RotationModel' that can be passed to pyGPlates functions.
+
+    rotation_features_or_model: Cached rotation model, or rotation model or feature collection(s), or list of features, or filename(s).
+
+    If 'rotation_features_or_model' is a CachedRotationModel then its wrapped rotation model is returned.
+    """
+    if isinstance(rotation_features_or_model, CachedRotationModel):
+        return rotation_features_or_model.get_rotation_model()
+
+    # Turn rotation data into a RotationModel (if not already).
+    return pygplates.RotationModel(rotation_features_or_model)
+
+
+##################
+# Implementation #
+##################
+
+
+def _get_time_key(time):
+
+    if time is None:
+        return None
+
+    # Times can be a float or a 'pygplates.GeoTimeInstant'.
+    if isinstance(time, pygplates.GeoTimeInstant):
+        return time.get_value()
+
+    return float(time)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Copyright (C) 2024 The University of Sydney, Australia
+
+    This program is free software; you can redistribute it and/or modify it under
+    the terms of the GNU General Public License, version 2, as published by
+    the Free Software Foundation.
+
+    This program is distributed in the hope that it will be useful, but WITHOUT
+    ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+    for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+
+###################################################################################
+# Load (parse) the rotation and topology files of a plate model only when needed, #
+# and cache the parsed (and filtered) features in a pickle file.                  #
+#                                                                                 #
+# Parsing large GPML files can take seconds per process. The pickle file is much  #
+# faster to load, and is re-created when any model file is modified.              #
+###################################################################################
+#
+#
+# For example:
+#
+#
+#    import plate_model_cache
+#
+#    # Nothing is loaded yet (so this can be cheaply passed to worker processes).
+#    plate_model = plate_model_cache.PlateModel(rotation_filenames, topology_filenames, cache_dir='model_cache')
+#
+#    # The first call parses the files (or loads the pickle file if it's up-to-date), subsequent calls return the same features.
+#    topology_features = plate_model.get_topology_features()
+#    rotation_model = plate_model.get_rotation_model()
+#
+#    # Call 'function(rotation_model, topology_features, time)' for each time across a pool of processes
+#    # (each process loads the plate model only once), yielding the results in the order of the times.
+#    for result in plate_model_cache.imap_plate_model(function, [(time,) for time in times], plate_model, num_cpus=4):
+#        ...
+#
+###################################################################################
+
+
+from __future__ import print_function
+import hashlib
+import multiprocessing
+import os
+import os.path
+import pickle
+import warnings
+import pygplates
+from . import cached_rotation_model
+
+
+# Topology filenames containing this are excluded when 'exclude_inactive_files' is True.
+INACTIVE_FILENAME_PATTERN = 'Inactive'
+
+# Feature type of slab topologies (usually flat slabs) excluded when 'exclude_slab_topologies' is True.
+SLAB_TOPOLOGY_FEATURE_TYPE = 'gpml:TopologicalSlabBoundary'
+
+# Whether the imported pyGPlates can pickle features (None until first checked).
+_can_pickle_features = None
+
+
+def can_pickle_features():
+    """
+    Returns whether the imported pyGPlates can pickle features (pyGPlates 0.36 and later).
+
+    This is checked only once per process (by pickling an empty feature). If features cannot be pickled
+    then the plate model cache is not used (the model files are just parsed each time).
+    """
+    global _can_pickle_features
+    if _can_pickle_features is None:
+        try:
+            pickle.loads(pickle.dumps(pygplates.Feature(), pickle.HIGHEST_PROTOCOL))
+            _can_pickle_features = True
+        except Exception:
+            _can_pickle_features = False
+    return _can_pickle_features
+
+
+class PlateModel(object):
+    """
+    The rotation model and (filtered) topology features of a plate model, loaded when first requested.
+
+    Only the filenames (and options) are pickled, so a PlateModel can be cheaply passed to worker processes
+    (which then load the features themselves, from the cache file if it's up-to-date).
+    """
+
+    def __init__(
+            self,
+            rotation_filenames,
+            topology_filenames,
+            cache_dir = None,
+            exclude_inactive_files = True,
+            exclude_slab_topologies = True):
+        """
+        rotation_filenames: Sequence of rotation filenames.
+
+        topology_filenames: Sequence of topology filenames.
+
+        cache_dir: Optional directory of the cache (pickle) file. If None then the files are always parsed
+                   (as they are if the imported pyGPlates cannot pickle features, see 'can_pickle_features()').
+
+        exclude_inactive_files: Whether to ignore topology files containing 'Inactive' in their filename.
+
+        exclude_slab_topologies: Whether to ignore slab topology features (gpml:TopologicalSlabBoundary).
+        """
+        self.rotation_filenames = sorted(rotation_filenames)
+        self.topology_filenames = sorted(
+                topology_filename for topology_filename in topology_filenames
+                    if not (exclude_inactive_files and INACTIVE_FILENAME_PATTERN in os.path.basename(topology_filename)))
+        self.cache_dir = cache_dir
+        self.exclude_slab_topologies = exclude_slab_topologies
+
+        self._rotation_model = None
+        self._topology_features = None
+
+    def get_rotation_model(self):
+        """
+        Returns the rotation model (a 'cached_rotation_model.CachedRotationModel'), loading the model if not loaded yet.
+        """
+        if self._rotation_model is None:
+            self._load()
+        return self._rotation_model
+
+    def get_topology_features(self):
+        """
+        Returns the list of (filtered) topology features, loading the model if not loaded yet.
+        """
+        if self._topology_features is None:
+            self._load()
+        return self._topology_features
+
+    def get_topology_filenames(self):
+        """
+        Returns the (filtered) topology filenames.
+        """
+        return self.topology_filenames
+
+    def get_cache_filename(self):
+        """
+        Returns the cache filename (or None if there's no cache directory).
+
+        The filename depends on the model filenames and options (but not on the file contents or modification times).
+        """
+        if self.cache_dir is None:
+            return None
+
+        cache_key = hashlib.sha1(repr((
+            [os.path.abspath(filename) for filename in self.rotation_filenames],
+            [os.path.abspath(filename) for filename in self.topology_filenames],
+            self.exclude_slab_topologies)).encode('utf-8')).hexdigest()
+
+        return os.path.join(self.cache_dir, 'plate_model_{0}.pickle'.format(cache_key[:16]))
+
+    def __getstate__(self):
+        # Don't pickle the loaded features (each process loads them when first requested).
+        state = self.__dict__.copy()
+        state['_rotation_model'] = None
+        state['_topology_features'] = None
+        return state
+
+    def _load(self):
+
+        rotation_features, topology_features = self._load_cached_features()
+        if rotation_features is None:
+            rotation_features, topology_features = self._parse_features()
+            self._write_cached_features(rotation_features, topology_features)
+
+        self._rotation_model = cached_rotation_model.CachedRotationModel(rotation_features)
+        self._topology_features = topology_features
+
+    def _parse_features(self):
+
+        rotation_features = [pygplates.FeatureCollection(rotation_filename)
+                for rotation_filename in self.rotation_filenames]
+
+        topology_features = []
+        for topology_filename in self.topology_filenames:
+            for topology_feature in pygplates.FeatureCollection(topology_filename):
+                if (self.exclude_slab_topologies and
+                    topology_feature.get_feature_type().to_qualified_string() == SLAB_TOPOLOGY_FEATURE_TYPE):
+                    continue
+                topology_features.append(topology_feature)
+
+        return rotation_features, topology_features
+
+    def _get_file_stamps(self):
+
+        # The modification time and size of each model file (used to detect modified files).
+        return [(filename, os.path.getmtime(filename), os.path.getsize(filename))
+                for filename in self.rotation_filenames + self.topology_filenames]
+
+    def _load_cached_features(self):
+
+        cache_filename = self.get_cache_filename()
+        if cache_filename is None or not can_pickle_features() or not os.path.exists(cache_filename):
+            return None, None
+
+        try:
+            with open(cache_filename, 'rb') as cache_file:
+                file_stamps, rotation_features, topology_features = pickle.load(cache_file)
+        except Exception as exc:
+            warnings.warn('Ignoring unreadable plate model cache file "{0}": {1}'.format(cache_filename, exc), RuntimeWarning)
+            return None, None
+
+        # The cache is out-of-date if any model file was modified (or added/removed) since the cache was written.
+        if file_stamps != self._get_file_stamps():
+            return None, None
+
+        return rotation_features, topology_features
+
+    def _write_cached_features(self, rotation_features, topology_features):
+
+        cache_filename = self.get_cache_filename()
+        if cache_filename is None or not can_pickle_features():
+            return
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # Write to a temporary file first (so that other processes never read a partially written file).
+        temporary_cache_filename = '{0}.{1}.tmp'.format(cache_filename, os.getpid())
+        try:
+            with open(temporary_cache_filename, 'wb') as cache_file:
+                pickle.dump((self._get_file_stamps(), rotation_features, topology_features), cache_file, pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            # Eg, the cache directory is not writable (so just parse the files each time).
+            warnings.warn('Unable to write plate model cache file "{0}": {1}'.format(cache_filename, exc), RuntimeWarning)
+            if os.path.exists(temporary_cache_filename):
+                os.remove(temporary_cache_filename)
+            return
+
+        os.replace(temporary_cache_filename, cache_filename)
+
+
+def imap_plate_model(function, args_list, plate_model, num_cpus = None):
+    """
+    Yields 'function(rotation_model, topology_features, *args)' for each 'args' tuple in 'args_list' (in the same order),
+    where 'rotation_model' and 'topology_features' are those of 'plate_model' (a PlateModel).
+
+    The calls are distributed across a pool of processes. Each process loads the plate model only once (when first needed),
+    so 'function' and 'args' are the only things sent to the processes for each call ('function' must be picklable,
+    eg, a module-level function). Each result is yielded as soon as it (and all results before it) has arrived.
+
+    num_cpus: The number of processes. If None (or zero) then all available CPUs are used.
+              If one then the calls are made serially in the current process.
+    """
+    args_list = list(args_list)
+
+    if not num_cpus:
+        num_cpus = multiprocessing.cpu_count()
+    num_cpus = min(num_cpus, len(args_list))
+
+    if num_cpus <= 1:
+        # No need for a pool of processes.
+        for args in args_list:
+            yield function(plate_model.get_rotation_model(), plate_model.get_topology_features(), *args)
+        return
+
+    pool = multiprocessing.Pool(
+            processes=num_cpus,
+            initializer=_initialise_plate_model_process,
+            initargs=(plate_model,))
+    try:
+        # Note that 'imap()' returns the results in the same order as 'args_list' (rather than in order of completion).
+        for result in pool.imap(_call_with_process_plate_model, [(function, args) for args in args_list], chunksize=1):
+            yield result
+    finally:
+        # All results have been received (unless the caller stopped early, in which case the remaining calls are abandoned).
+        pool.terminate()
+        pool.join()
+
+
+# The plate model of the current process (used by a pool of processes).
+_process_plate_model = None
+
+
+def _initialise_plate_model_process(plate_model):
+
+    global _process_plate_model
+
+    # Only the filenames (and options) are passed to the process (the features are loaded when first needed).
+    _process_plate_model = plate_model
+
+
+def _call_with_process_plate_model(function_and_args):
+
+    function, args = function_and_args
+
+    return function(_process_plate_model.get_rotation_model(), _process_plate_model.get_topology_features(), *args)
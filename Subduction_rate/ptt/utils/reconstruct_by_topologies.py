@@ -23,7 +23,11 @@
 
 
 import math
+import numpy as np
+import os
 import pygplates
+from . import cached_rotation_model
+from . import great_circle_arcs
 from . import points_in_polygons
 
 
@@ -32,6 +36,9 @@ from . import points_in_polygons
 # Here we default to the same constants used internally in GPlates 2.0 (ie, 7.0 and 10.0).
 DEFAULT_GLOBAL_COLLISION_PARAMETERS = (7.0, 10.0)
 
+# Default number of time steps between checkpoints (when a checkpoint filename is specified).
+DEFAULT_CHECKPOINT_INTERVAL = 10
+
 
 def reconstruct_points(
             rotation_features_or_model,
@@ -45,11 +52,14 @@ def reconstruct_points(
             point_plate_ids = None,
             detect_collisions = True,
             global_collision_parameters = DEFAULT_GLOBAL_COLLISION_PARAMETERS,
-            feature_specific_collision_parameters = None):
+            feature_specific_collision_parameters = None,
+            checkpoint_filename = None,
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL,
+            time_step_callback = None):
     """
     Function to reconstruct points using the ReconstructByTopologies class below.
 
-    For description of parameters see the ReconstructByTopologies class below.
+    For description of parameters see the ReconstructByTopologies class (and its 'reconstruct()' method) below.
     """
 
     topology_reconstruction = ReconstructByTopologies(
@@ -66,7 +76,75 @@ def reconstruct_points(
             global_collision_parameters,
             feature_specific_collision_parameters)
 
-    return topology_reconstruction.reconstruct()
+    return topology_reconstruction.reconstruct(checkpoint_filename, checkpoint_interval, time_step_callback)
+
+
+def reconstruct_point_arrays(
+            rotation_features_or_model,
+            topology_features,
+            reconstruction_begin_time,
+            reconstruction_end_time,
+            reconstruction_time_interval,
+            points,
+            point_begin_times = None,
+            point_end_times = None,
+            point_plate_ids = None,
+            detect_collisions = True,
+            global_collision_parameters = DEFAULT_GLOBAL_COLLISION_PARAMETERS,
+            feature_specific_collision_parameters = None,
+            checkpoint_filename = None,
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL,
+            time_step_callback = None):
+    """
+    Function to reconstruct points using the ReconstructPointArraysByTopologies class below.
+
+    For description of parameters see the ReconstructPointArraysByTopologies class (and its 'reconstruct()' method) below.
+
+    Returns: 2-tuple of (points_xyz, point_indices) where 'points_xyz' is an (M,3) array of the active points
+             at the end of the reconstruction and 'point_indices' is an array of their indices into the original 'points'.
+    """
+
+    topology_reconstruction = ReconstructPointArraysByTopologies(
+            rotation_features_or_model,
+            topology_features,
+            reconstruction_begin_time,
+            reconstruction_end_time,
+            reconstruction_time_interval,
+            points,
+            point_begin_times,
+            point_end_times,
+            point_plate_ids,
+            detect_collisions,
+            global_collision_parameters,
+            feature_specific_collision_parameters)
+
+    topology_reconstruction.reconstruct(checkpoint_filename, checkpoint_interval, time_step_callback)
+
+    return (topology_reconstruction.get_active_current_points_xyz(),
+            topology_reconstruction.get_active_current_point_indices())
+
+
+def create_active_points_writer(filename_template):
+    """
+    Returns a function that can be used as the 'time_step_callback' of 'ReconstructByTopologies.reconstruct()'
+    to write the active points of each time step to their own compressed NumPy ('.npz') file.
+
+    filename_template: Filename containing '{0}' which is replaced by the time of each time step (eg, 'points_{0:.1f}Ma.npz').
+
+    Each file contains the reconstruction 'time', the 'point_indices' of the active points (into the original points) and
+    their positions 'points_xyz' as an (M,3) array. Files for the same time are overwritten (eg, when resuming a reconstruction).
+    """
+
+    def write_active_points(topology_reconstruction):
+        current_time = topology_reconstruction.get_current_time()
+        with open(filename_template.format(current_time), 'wb') as active_points_file:
+            np.savez_compressed(
+                    active_points_file,
+                    time = current_time,
+                    point_indices = topology_reconstruction.get_active_current_point_indices(),
+                    points_xyz = topology_reconstruction.get_active_current_points_xyz())
+
+    return write_active_points
 
 
 class ReconstructByTopologies(object):
@@ -121,8 +199,9 @@ class ReconstructByTopologies(object):
                                                Any feature type not specified here defaults to using 'global_collision_parameters'.
         """
 
-        # Turn rotation data into a RotationModel (if not already).
-        self.rotation_model = pygplates.RotationModel(rotation_features_or_model)
+        # Turn rotation data into a CachedRotationModel (if not already).
+        # The same stage rotations (per plate ID) are requested at each time step.
+        self.rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_features_or_model)
 
         # Turn topology data into a list of features (if not already).
         self.topology_features = pygplates.FeaturesFunctionArgument(topology_features).get_features()
@@ -185,21 +264,144 @@ class ReconstructByTopologies(object):
         self.global_collision_parameters = global_collision_parameters
 
 
-    def reconstruct(self):
+    def reconstruct(
+            self,
+            checkpoint_filename = None,
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL,
+            time_step_callback = None):
+        """
+        Reconstruct the points from the reconstruction begin time to the reconstruction end time.
+
+        checkpoint_filename: Optional file to periodically write the reconstruction state to (see 'write_checkpoint()').
+                             If the reconstruction is interrupted it can then be continued with 'resume_reconstruction()'.
+
+        checkpoint_interval: Number of time steps between checkpoints. Defaults to DEFAULT_CHECKPOINT_INTERVAL.
+
+        time_step_callback: Optional function called with this object at the begin time and after each time step
+                            (eg, to write the active points of each time step to disk, see 'create_active_points_writer()').
+
+        Returns the active points at the end of the reconstruction.
+        """
 
         # Initialise the reconstruction.
         self.begin_reconstruction()
+        if time_step_callback:
+            time_step_callback(self)
+
+        return self._reconstruct_remaining_times(checkpoint_filename, checkpoint_interval, time_step_callback)
+
+
+    def resume_reconstruction(
+            self,
+            checkpoint_filename,
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL,
+            time_step_callback = None):
+        """
+        Continue a reconstruction from the last checkpoint written to 'checkpoint_filename' by 'reconstruct()'.
+
+        This object must be created with the same parameters as the object that wrote the checkpoint.
+
+        Note that 'time_step_callback' is only called for the time steps after the checkpoint time
+        (the interrupted reconstruction might have already called it for some of those time steps).
+
+        Returns the active points at the end of the reconstruction.
+
+        Raises ValueError if the checkpoint does not match this reconstruction.
+        """
+
+        self.begin_reconstruction_from_checkpoint(checkpoint_filename)
+
+        return self._reconstruct_remaining_times(checkpoint_filename, checkpoint_interval, time_step_callback)
+
+
+    def write_checkpoint(self, checkpoint_filename):
+        """
+        Write the current state of the reconstruction to a compressed NumPy ('.npz') file.
+
+        This includes the current time index, and the current point positions, activity and plate IDs.
+        The resolved topologies are not written (they are resolved again when resuming).
+
+        The file is replaced atomically (so an interruption while writing does not corrupt the previous checkpoint).
+        """
+
+        checkpoint_state = self._get_checkpoint_state()
+
+        temporary_checkpoint_filename = checkpoint_filename + '.tmp'
+        # Write to a file object (otherwise 'numpy.savez_compressed()' appends '.npz' to the filename).
+        with open(temporary_checkpoint_filename, 'wb') as checkpoint_file:
+            np.savez_compressed(
+                    checkpoint_file,
+                    reconstruction_begin_time = self.reconstruction_begin_time,
+                    reconstruction_end_time = self.reconstruction_end_time,
+                    reconstruction_time_interval = self.reconstruction_time_interval,
+                    num_points = self.num_points,
+                    current_time_index = self.current_time_index,
+                    num_activated_points = self.num_activated_points,
+                    **checkpoint_state)
+        os.replace(temporary_checkpoint_filename, checkpoint_filename)
+
+
+    def begin_reconstruction(self):
+
+        self._initialise_reconstruction_state()
+
+        self._activate_deactivate_points()
+        self._find_resolved_topologies_containing_points()
+
+
+    def begin_reconstruction_from_checkpoint(self, checkpoint_filename):
+        """
+        Same as 'begin_reconstruction()' except the reconstruction starts from the state written by 'write_checkpoint()'.
+
+        Raises ValueError if the checkpoint does not match this reconstruction.
+        """
+
+        with np.load(checkpoint_filename) as checkpoint:
+            checkpoint = dict(checkpoint)
+
+        # The checkpoint must have been written by the same reconstruction.
+        if (int(checkpoint['num_points']) != self.num_points or
+            float(checkpoint['reconstruction_begin_time']) != self.reconstruction_begin_time or
+            float(checkpoint['reconstruction_end_time']) != self.reconstruction_end_time or
+            float(checkpoint['reconstruction_time_interval']) != self.reconstruction_time_interval):
+            raise ValueError('Checkpoint "{0}" was not written by a reconstruction with the same points and times.'.format(
+                    checkpoint_filename))
+
+        self._initialise_reconstruction_state()
+
+        self.current_time_index = int(checkpoint['current_time_index'])
+        self.num_activated_points = int(checkpoint['num_activated_points'])
+        self._set_checkpoint_state(checkpoint)
+
+        # The previous points and topologies are not needed since the current points are then reconstructed to the next time
+        # (which then makes them the previous points, along with the current topologies which are resolved again here).
+        self._find_resolved_topologies_containing_points()
+
+        # Restore the current plate IDs of the interrupted reconstruction (rather than those just found).
+        # They can differ for points deactivated by collision detection after the plate IDs were found (in the interrupted
+        # reconstruction), and the next time step (eg, its collision detection) must see the same plate IDs as an uninterrupted one.
+        self._set_checkpoint_topology_plate_ids(checkpoint)
+
+
+    def _reconstruct_remaining_times(self, checkpoint_filename, checkpoint_interval, time_step_callback):
+
+        if checkpoint_interval <= 0:
+            raise ValueError('The checkpoint interval "{0}" is not positive.'.format(checkpoint_interval))
 
         # Loop over the reconstruction times until reached end of the reconstruction time span, or
         # all points have entered their valid time range *and* either exited their time range or
         # have been deactivated (subducted forward in time or consumed by MOR backward in time).
         while self.reconstruct_to_next_time():
-            pass
+            if time_step_callback:
+                time_step_callback(self)
+
+            if checkpoint_filename and self.current_time_index % checkpoint_interval == 0:
+                self.write_checkpoint(checkpoint_filename)
 
         return self.get_active_current_points()
 
 
-    def begin_reconstruction(self):
+    def _initialise_reconstruction_state(self):
 
         self.current_time_index = 0
 
@@ -219,8 +421,36 @@ class ReconstructByTopologies(object):
         self.prev_resolved_plate_boundaries = [None] * self.num_points
         self.curr_resolved_plate_boundaries = [None] * self.num_points
 
-        self._activate_deactivate_points()
-        self._find_resolved_topologies_containing_points()
+
+    def _get_checkpoint_state(self):
+
+        curr_points_active = np.array([curr_point is not None for curr_point in self.curr_points], dtype=bool)
+        curr_points_xyz = np.zeros((self.num_points, 3))
+        for point_index, curr_point in enumerate(self.curr_points):
+            if curr_point is not None:
+                curr_points_xyz[point_index] = curr_point.to_xyz()
+
+        return {
+            'curr_points_xyz' : curr_points_xyz,
+            'curr_points_active' : curr_points_active,
+            'point_has_been_activated' : np.array(self.point_has_been_activated, dtype=bool),
+            # Points outside all resolved topologies (or inactive) have plate ID -1.
+            'curr_topology_plate_ids' : np.array(
+                    [plate_id if plate_id is not None else -1 for plate_id in self.curr_topology_plate_ids], dtype=np.int32)}
+
+
+    def _set_checkpoint_state(self, checkpoint_state):
+
+        self.curr_points = [pygplates.PointOnSphere(point_xyz) if point_active else None
+                for point_xyz, point_active in zip(checkpoint_state['curr_points_xyz'], checkpoint_state['curr_points_active'])]
+        self.point_has_been_activated = [bool(has_been_activated) for has_been_activated in checkpoint_state['point_has_been_activated']]
+
+
+    def _set_checkpoint_topology_plate_ids(self, checkpoint_state):
+
+        # Plate ID -1 means outside all resolved topologies (or inactive).
+        self.curr_topology_plate_ids = [int(plate_id) if plate_id != -1 else None
+                for plate_id in checkpoint_state['curr_topology_plate_ids']]
 
 
     def get_current_time(self):
@@ -239,6 +469,20 @@ class ReconstructByTopologies(object):
         return [point for point in self.get_all_current_points() if point is not None]
 
 
+    def get_active_current_point_indices(self):
+        """
+        Returns the indices (into the original points) of the currently active points.
+        """
+        return np.array([point_index for point_index, point in enumerate(self.get_all_current_points()) if point is not None], dtype=int)
+
+
+    def get_active_current_points_xyz(self):
+        """
+        Returns the currently active points as an (M,3) array of xyz unit vectors.
+        """
+        return np.array([point.to_xyz() for point in self.get_active_current_points()], dtype=np.float64).reshape(-1, 3)
+
+
     def reconstruct_to_next_time(self):
 
         # If we're at the last time then there is no next time to reconstruct to.
@@ -394,11 +638,11 @@ class ReconstructByTopologies(object):
 
         # Resolve the plate polygons for the current time.
         resolved_topologies = []
-        pygplates.resolve_topologies(self.topology_features, self.rotation_model, resolved_topologies, current_time)
+        pygplates.resolve_topologies(self.topology_features, self.rotation_model.get_rotation_model(), resolved_topologies, current_time)
 
         if ReconstructByTopologies.use_plate_partitioner:
             # Create a plate partitioner from the resolved polygons.
-            plate_partitioner = pygplates.PlatePartitioner(resolved_topologies, self.rotation_model)
+            plate_partitioner = pygplates.PlatePartitioner(resolved_topologies, self.rotation_model.get_rotation_model())
         else:
             # Some of 'curr_points' will be None so 'curr_valid_points' contains only the valid (not None)
             # points, and 'curr_valid_points_indices' is the same length as 'curr_points' but indexes into
@@ -573,3 +817,506 @@ class ReconstructByTopologies(object):
                 return True
 
         return False
+
+
+class ReconstructPointArraysByTopologies(ReconstructByTopologies):
+    """
+    Same as ReconstructByTopologies except the point state is stored in NumPy arrays (instead of lists of points and None).
+
+    This is intended for reconstructing large numbers of points (eg, millions of seafloor points over hundreds of Myr):
+      * point positions are (N,3) arrays of xyz unit vectors,
+      * plate IDs are int32 arrays (with -1 meaning outside all resolved topologies),
+      * active points are boolean masks, and
+      * points are reconstructed per plate (one stage rotation matrix applied to all points of a plate at once).
+
+    Note that active points falling outside all resolved topologies are reconstructed using their plate IDs in 'point_plate_ids'.
+    """
+
+    # Plate ID (and resolved topology index) used for points not contained by any resolved topology.
+    NO_PLATE_ID = -1
+
+
+    def __init__(
+            self,
+            rotation_features_or_model,
+            topology_features,
+            reconstruction_begin_time,
+            reconstruction_end_time,
+            reconstruction_time_interval,
+            points,
+            point_begin_times = None,
+            point_end_times = None,
+            point_plate_ids = None,
+            detect_collisions = True,
+            global_collision_parameters = DEFAULT_GLOBAL_COLLISION_PARAMETERS,
+            feature_specific_collision_parameters = None):
+        """
+        points: An (N,3) array of xyz unit vectors, or a sequence of 'pygplates.PointOnSphere'.
+
+        point_begin_times, point_end_times, point_plate_ids: Optional sequences (or arrays) of length N.
+
+        For description of the remaining parameters see the ReconstructByTopologies class.
+        """
+
+        super(ReconstructPointArraysByTopologies, self).__init__(
+                rotation_features_or_model,
+                topology_features,
+                reconstruction_begin_time,
+                reconstruction_end_time,
+                reconstruction_time_interval,
+                points,
+                point_begin_times,
+                point_end_times,
+                point_plate_ids,
+                detect_collisions,
+                global_collision_parameters,
+                feature_specific_collision_parameters)
+
+        # Convert the points to an (N,3) array of xyz unit vectors (if not already).
+        if isinstance(points, np.ndarray):
+            self.points_xyz = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        else:
+            self.points_xyz = np.array([point.to_xyz() for point in points], dtype=np.float64).reshape(-1, 3)
+        self.points_xyz = self.points_xyz / np.linalg.norm(self.points_xyz, axis=-1, keepdims=True)
+
+        self.point_begin_times = np.asarray(self.point_begin_times, dtype=np.float64)
+        self.point_end_times = np.asarray(self.point_end_times, dtype=np.float64)
+        self.point_plate_ids = np.asarray(self.point_plate_ids, dtype=np.int32)
+
+
+    def _initialise_reconstruction_state(self):
+
+        self.current_time_index = 0
+
+        # Set up point arrays.
+        # Positions of inactive points are undefined (use the active masks to determine which points are active).
+        self.prev_points_xyz = np.zeros((self.num_points, 3))
+        self.curr_points_xyz = np.zeros((self.num_points, 3))
+        self.next_points_xyz = np.zeros((self.num_points, 3))
+        self.prev_points_active = np.zeros(self.num_points, dtype=bool)
+        self.curr_points_active = np.zeros(self.num_points, dtype=bool)
+
+        # Each point can only get activated once (after deactivation it cannot be reactivated).
+        self.point_has_been_activated = np.zeros(self.num_points, dtype=bool)
+        self.num_activated_points = 0
+
+        # Set up topology arrays (corresponding to active/inactive points at same indices).
+        # The resolved topology indices index into the resolved topologies of the previous/current time.
+        self.prev_topology_plate_ids = np.full(self.num_points, self.NO_PLATE_ID, dtype=np.int32)
+        self.curr_topology_plate_ids = np.full(self.num_points, self.NO_PLATE_ID, dtype=np.int32)
+        self.prev_resolved_topology_indices = np.full(self.num_points, self.NO_PLATE_ID, dtype=np.int32)
+        self.curr_resolved_topology_indices = np.full(self.num_points, self.NO_PLATE_ID, dtype=np.int32)
+        self.prev_resolved_topologies = []
+        self.curr_resolved_topologies = []
+
+
+    def _get_checkpoint_state(self):
+
+        return {
+            'curr_points_xyz' : self.curr_points_xyz,
+            'curr_points_active' : self.curr_points_active,
+            'point_has_been_activated' : self.point_has_been_activated,
+            'curr_topology_plate_ids' : self.curr_topology_plate_ids}
+
+
+    def _set_checkpoint_state(self, checkpoint_state):
+
+        self.curr_points_xyz[:] = checkpoint_state['curr_points_xyz']
+        self.curr_points_active[:] = checkpoint_state['curr_points_active']
+        self.point_has_been_activated[:] = checkpoint_state['point_has_been_activated']
+
+
+    def _set_checkpoint_topology_plate_ids(self, checkpoint_state):
+
+        self.curr_topology_plate_ids[:] = checkpoint_state['curr_topology_plate_ids']
+
+
+    def get_all_current_points(self):
+
+        # Inactive points are None (same as ReconstructByTopologies).
+        return [pygplates.PointOnSphere(point_xyz) if point_active else None
+                for point_xyz, point_active in zip(self.curr_points_xyz, self.curr_points_active)]
+
+
+    def get_active_current_points(self):
+
+        return [pygplates.PointOnSphere(point_xyz) for point_xyz in self.get_active_current_points_xyz()]
+
+
+    def get_active_current_point_indices(self):
+        """
+        Returns the indices (into the original points) of the currently active points.
+        """
+        return np.flatnonzero(self.curr_points_active)
+
+
+    def get_active_current_points_xyz(self):
+        """
+        Returns the currently active points as an (M,3) array of xyz unit vectors.
+        """
+        return self.curr_points_xyz[self.curr_points_active]
+
+
+    def reconstruct_to_next_time(self):
+
+        # If we're at the last time then there is no next time to reconstruct to.
+        if self.current_time_index == self.last_time_index:
+            return False
+
+        # If all points have been previously activated, but none are currently active then we're finished.
+        # This means all points have entered their valid time range *and* either exited their time range or
+        # have been deactivated (subducted forward in time or consumed by MOR backward in time).
+        if (self.num_activated_points == self.num_points and
+            not self.curr_points_active.any()):
+            return False
+
+        current_time = self.get_current_time()
+
+        # Get plate ID of resolved topology containing each current point
+        # (this was determined in last call to '_find_resolved_topologies_containing_points()').
+        # If an active point fell outside all resolved polygons then instead we just reconstruct using its
+        # plate ID (that was manually assigned by the user/caller).
+        curr_plate_ids = np.where(
+                self.curr_topology_plate_ids != self.NO_PLATE_ID,
+                self.curr_topology_plate_ids,
+                self.point_plate_ids)
+
+        # Reconstruct the active points one plate at a time (using a single stage rotation per plate).
+        # Inactive points are left as is (their positions are undefined).
+        active_point_indices = np.flatnonzero(self.curr_points_active)
+        active_plate_ids = curr_plate_ids[active_point_indices]
+        # Sort the active points by plate ID so each plate's points are a contiguous slice.
+        plate_sort_order = np.argsort(active_plate_ids, kind='stable')
+        active_point_indices = active_point_indices[plate_sort_order]
+        active_plate_ids = active_plate_ids[plate_sort_order]
+        unique_plate_ids, plate_start_indices = np.unique(active_plate_ids, return_index=True)
+        plate_end_indices = np.append(plate_start_indices[1:], len(active_plate_ids))
+        for plate_id, plate_start_index, plate_end_index in zip(unique_plate_ids, plate_start_indices, plate_end_indices):
+            # Get the stage rotation that will move the points from where they are at the current time to their
+            # location at the next time step, based on the plate id that contains the points at the current time.
+            stage_rotation = self.rotation_model.get_rotation(
+                    # Positive/negative time step means reconstructing backward/forward in time.
+                    current_time + self.reconstruction_time_step,
+                    int(plate_id),
+                    current_time)
+
+            # Use the stage rotation to reconstruct the tracked points from position at current time
+            # to position at the next time step.
+            plate_point_indices = active_point_indices[plate_start_index:plate_end_index]
+            next_plate_points_xyz = great_circle_arcs.rotate_points(
+                    stage_rotation, self.curr_points_xyz[plate_point_indices])
+            # Renormalise the rotated points (otherwise rounding errors accumulate over many time steps and
+            # the points can drift far enough from unit length for 'pygplates.PointOnSphere' to reject them).
+            self.next_points_xyz[plate_point_indices] = (
+                    next_plate_points_xyz / np.linalg.norm(next_plate_points_xyz, axis=-1, keepdims=True))
+
+        #
+        # Set up for next loop iteration.
+        #
+        # Rotate previous, current and next point arrays.
+        # The new previous will be the old current.
+        # The new current will be the old next.
+        # The new next will be the old previous (but values are ignored and overridden in next time step; just re-using its memory).
+        self.prev_points_xyz, self.curr_points_xyz, self.next_points_xyz = self.curr_points_xyz, self.next_points_xyz, self.prev_points_xyz
+        # The active points at the next time are the same as those at the current time (until activated/deactivated below).
+        self.prev_points_active = self.curr_points_active.copy()
+        # Swap previous and current topology arrays.
+        # The new previous will be the old current.
+        # The new current will be the old previous (but values are ignored and overridden in next time step; just re-using its memory).
+        self.prev_topology_plate_ids, self.curr_topology_plate_ids = self.curr_topology_plate_ids, self.prev_topology_plate_ids
+        self.prev_resolved_topology_indices, self.curr_resolved_topology_indices = self.curr_resolved_topology_indices, self.prev_resolved_topology_indices
+        self.prev_resolved_topologies, self.curr_resolved_topologies = self.curr_resolved_topologies, self.prev_resolved_topologies
+
+        # Move the current time to the next time.
+        self.current_time_index += 1
+        current_time = self.get_current_time()
+
+        self._activate_deactivate_points()
+        self._find_resolved_topologies_containing_points()
+
+        # Detect collisions.
+        if self.detect_collisions:
+            self._detect_collisions(current_time)
+
+        # We successfully reconstructed to the next time.
+        return True
+
+
+    def _activate_deactivate_points(self):
+
+        current_time = self.get_current_time()
+
+        points_in_valid_time_range = ((current_time <= self.point_begin_times) &
+                                      (current_time >= self.point_end_times))
+
+        # Points that are not active and have never been activated can get activated if in their valid time range.
+        # See 'ReconstructByTopologies._activate_deactivate_points()' for why the initial position is the original point.
+        points_to_activate = points_in_valid_time_range & ~self.curr_points_active & ~self.point_has_been_activated
+        self.curr_points_xyz[points_to_activate] = self.points_xyz[points_to_activate]
+        self.point_has_been_activated |= points_to_activate
+        self.num_activated_points += int(np.count_nonzero(points_to_activate))
+
+        # Points that are active can get deactivated if outside their valid time range.
+        # Note: Newly activated points are in their valid time range (so they don't get deactivated here).
+        self.curr_points_active = (self.curr_points_active | points_to_activate) & points_in_valid_time_range
+
+
+    def _find_resolved_topologies_containing_points(self):
+
+        current_time = self.get_current_time()
+
+        # Resolve the plate polygons for the current time.
+        resolved_topologies = []
+        pygplates.resolve_topologies(self.topology_features, self.rotation_model.get_rotation_model(), resolved_topologies, current_time)
+        self.curr_resolved_topologies = resolved_topologies
+
+        # Inactive points are not contained by any resolved topology.
+        self.curr_resolved_topology_indices.fill(self.NO_PLATE_ID)
+        self.curr_topology_plate_ids.fill(self.NO_PLATE_ID)
+
+        active_point_indices = np.flatnonzero(self.curr_points_active)
+        if not len(active_point_indices) or not resolved_topologies:
+            return
+
+        active_points = [pygplates.PointOnSphere(point_xyz) for point_xyz in self.curr_points_xyz[active_point_indices]]
+
+        # For each active point find the index of the resolved topology containing it (or None).
+        if ReconstructByTopologies.use_plate_partitioner:
+            # Create a plate partitioner from the resolved polygons.
+            plate_partitioner = pygplates.PlatePartitioner(resolved_topologies, self.rotation_model.get_rotation_model())
+            # Map each resolved topology (via its feature ID) to its index.
+            resolved_topology_index_map = dict((resolved_topology.get_feature().get_feature_id(), resolved_topology_index)
+                    for resolved_topology_index, resolved_topology in enumerate(resolved_topologies))
+            resolved_topology_indices_containing_active_points = []
+            for active_point in active_points:
+                active_polygon = plate_partitioner.partition_point(active_point)
+                resolved_topology_indices_containing_active_points.append(
+                        resolved_topology_index_map.get(active_polygon.get_feature().get_feature_id())
+                                if active_polygon is not None else None)
+        else:
+            resolved_topology_indices_containing_active_points = points_in_polygons.find_polygons(
+                    active_points,
+                    [resolved_topology.get_resolved_boundary() for resolved_topology in resolved_topologies],
+                    list(range(len(resolved_topologies))))
+
+        # If the polygon is None, that means (presumably) that it fell into a crack between topologies.
+        resolved_topology_indices = np.array(
+                [self.NO_PLATE_ID if resolved_topology_index is None else resolved_topology_index
+                    for resolved_topology_index in resolved_topology_indices_containing_active_points],
+                dtype=np.int32)
+        self.curr_resolved_topology_indices[active_point_indices] = resolved_topology_indices
+
+        # Set the plate ID of resolved topology containing each active point.
+        resolved_topology_plate_ids = np.array(
+                [resolved_topology.get_feature().get_reconstruction_plate_id() for resolved_topology in resolved_topologies],
+                dtype=np.int32)
+        is_in_resolved_topology = resolved_topology_indices != self.NO_PLATE_ID
+        self.curr_topology_plate_ids[active_point_indices[is_in_resolved_topology]] = (
+                resolved_topology_plate_ids[resolved_topology_indices[is_in_resolved_topology]])
+
+
+    def _detect_collisions(self, time):
+        #
+        # Same collision test as 'ReconstructByTopologies._detect_collision()' (see there for details) except
+        # batched over all transitioning points (rather than one point at a time).
+        #
+        # The velocity deltas of all transitioning points are calculated with one velocity calculation per plate ID,
+        # and the distances of the *previous* points to the *previous* boundary are calculated for all points in
+        # the same previous boundary at once (using an arc index of that boundary).
+        #
+
+        # Only points that transitioned from one resolved topology to another (with a different plate ID) can collide.
+        # Also the point must have been active at the previous time (it might have just got activated at the current time).
+        transitioning_point_indices = np.flatnonzero(
+                self.curr_points_active &
+                self.prev_points_active &
+                (self.curr_topology_plate_ids != self.NO_PLATE_ID) &
+                (self.prev_topology_plate_ids != self.NO_PLATE_ID) &
+                (self.curr_topology_plate_ids != self.prev_topology_plate_ids))
+        if not len(transitioning_point_indices):
+            return
+
+        delta_velocity_magnitudes = self._calculate_delta_velocity_magnitudes(time, transitioning_point_indices)
+
+        # Only points whose velocity delta exceeds the smallest threshold velocity delta can possibly collide.
+        min_threshold_velocity_delta = min(
+                [self.global_collision_parameters[0]] +
+                [collision_parameters[0] for collision_parameters in self.feature_specific_collision_parameters.values()])
+        can_collide = delta_velocity_magnitudes > min_threshold_velocity_delta
+        transitioning_point_indices = transitioning_point_indices[can_collide]
+        delta_velocity_magnitudes = delta_velocity_magnitudes[can_collide]
+
+        # Group the remaining points by their *previous* resolved topology and test them against an arc index of its boundary
+        # (so each boundary is converted to arrays once per time step, and only if a point might have collided with it).
+        prev_resolved_topology_indices = self.prev_resolved_topology_indices[transitioning_point_indices]
+        for prev_resolved_topology_index in np.unique(prev_resolved_topology_indices):
+            is_in_prev_resolved_topology = prev_resolved_topology_indices == prev_resolved_topology_index
+            point_indices = transitioning_point_indices[is_in_prev_resolved_topology]
+
+            collided = self._detect_collisions_with_boundary(
+                    self.prev_points_xyz[point_indices],
+                    delta_velocity_magnitudes[is_in_prev_resolved_topology],
+                    self._create_collision_boundary_arc_index(self.prev_resolved_topologies[prev_resolved_topology_index]))
+
+            # De-activate points if subducted (forward in time) or consumed back into MOR (backward in time).
+            self.curr_points_active[point_indices[collided]] = False
+
+
+    def _calculate_delta_velocity_magnitudes(self, time, point_indices):
+
+        # Note that even though the current point is not inside the previous boundary (because different plate ID), we can still
+        # calculate a velocity using its plate ID (because we really should use the same point in our velocity comparison).
+        curr_points_xyz = self.curr_points_xyz[point_indices]
+        prev_plate_ids = self.prev_topology_plate_ids[point_indices]
+        curr_plate_ids = self.curr_topology_plate_ids[point_indices]
+
+        # One velocity calculation per plate ID (using all points that have that plate ID as their previous or current plate).
+        prev_location_velocities = np.empty((len(point_indices), 3))
+        curr_location_velocities = np.empty((len(point_indices), 3))
+        for plate_id in np.union1d(prev_plate_ids, curr_plate_ids):
+            stage_rotation = self.rotation_model.get_rotation(time + 1, int(plate_id), time)
+
+            has_prev_plate_id = prev_plate_ids == plate_id
+            has_curr_plate_id = curr_plate_ids == plate_id
+            velocities = great_circle_arcs.calculate_velocities(
+                    curr_points_xyz[has_prev_plate_id | has_curr_plate_id],
+                    stage_rotation, 1, pygplates.VelocityUnits.kms_per_my)
+
+            # Scatter the velocities back (a point can't have the same previous and current plate ID).
+            prev_location_velocities[has_prev_plate_id] = velocities[has_prev_plate_id[has_prev_plate_id | has_curr_plate_id]]
+            curr_location_velocities[has_curr_plate_id] = velocities[has_curr_plate_id[has_prev_plate_id | has_curr_plate_id]]
+
+        return np.linalg.norm(curr_location_velocities - prev_location_velocities, axis=-1)
+
+
+    def _create_collision_boundary_arc_index(self, resolved_topology):
+        #
+        # The arc index of a boundary is its arcs (as arrays) with per-arc collision thresholds and bounding caps
+        # (the bounding caps are used to cull arcs that are out of reach of a group of points).
+        #
+        # It's built when needed rather than cached across time steps: topologies are re-resolved at every time step
+        # (so the boundary arcs move and change shape), and each resolved topology is the *previous* topology at only
+        # one time step. So an index could never be reused. Within a time step each previous boundary is indexed at most once
+        # (for all points that might have collided with it), and only if any such points exist. So the cost is proportional to
+        # the number of boundaries crossed (and their arcs), not the number of points.
+        #
+
+        arc_start_points = []
+        arc_end_points = []
+        arc_collision_parameters = []
+
+        # If we have feature-specific collision parameters then use the boundary sub-segments of the topological boundary
+        # (with sub-segment feature type specific collision parameters).
+        # Otherwise just use the entire boundary polygon with the global collision parameters.
+        if self.feature_specific_collision_parameters:
+            for boundary_sub_segment in resolved_topology.get_boundary_sub_segments():
+                # Use feature-specific collision parameters if found (falling back to global collision parameters).
+                collision_parameters = self.feature_specific_collision_parameters.get(
+                        boundary_sub_segment.get_feature().get_feature_type(),
+                        self.global_collision_parameters)
+
+                sub_segment_start_points, sub_segment_end_points = _get_geometry_arcs(boundary_sub_segment.get_resolved_geometry())
+                arc_start_points.append(sub_segment_start_points)
+                arc_end_points.append(sub_segment_end_points)
+                arc_collision_parameters.extend([collision_parameters] * len(sub_segment_start_points))
+        else:
+            boundary_start_points, boundary_end_points = _get_geometry_arcs(resolved_topology.get_resolved_boundary())
+            arc_start_points.append(boundary_start_points)
+            arc_end_points.append(boundary_end_points)
+            arc_collision_parameters.extend([self.global_collision_parameters] * len(boundary_start_points))
+
+        arc_start_points = np.concatenate(arc_start_points) if arc_start_points else np.empty((0, 3))
+        arc_end_points = np.concatenate(arc_end_points) if arc_end_points else np.empty((0, 3))
+        arc_collision_parameters = np.asarray(arc_collision_parameters, dtype=np.float64).reshape(-1, 2)
+
+        # Bounding cap (centre and angular radius) of each arc (used to cull arcs that are too far from a group of points).
+        arc_bounding_cap_centres = arc_start_points + arc_end_points
+        arc_bounding_cap_centre_magnitudes = np.linalg.norm(arc_bounding_cap_centres, axis=-1)
+        # Arcs spanning (nearly) a half circle (if any) are never culled.
+        is_half_circle_arc = arc_bounding_cap_centre_magnitudes <= great_circle_arcs.ZERO_MAGNITUDE_EPSILON
+        arc_bounding_cap_centre_magnitudes[is_half_circle_arc] = 1.0
+        arc_bounding_cap_centres /= arc_bounding_cap_centre_magnitudes[:, np.newaxis]
+        arc_bounding_cap_radii = 0.5 * great_circle_arcs.get_arc_lengths(arc_start_points, arc_end_points)
+        arc_bounding_cap_radii[is_half_circle_arc] = np.pi
+
+        return (
+                arc_start_points,
+                arc_end_points,
+                arc_collision_parameters[:, 0],  # threshold velocity deltas
+                arc_collision_parameters[:, 1],  # threshold distances to boundary per My
+                arc_bounding_cap_centres,
+                arc_bounding_cap_radii)
+
+
+    def _detect_collisions_with_boundary(self, prev_points_xyz, delta_velocity_magnitudes, arc_index):
+
+        (arc_start_points, arc_end_points,
+            arc_threshold_velocity_deltas, arc_threshold_distances_to_boundary_per_my,
+            arc_bounding_cap_centres, arc_bounding_cap_radii) = arc_index
+
+        collided = np.zeros(len(prev_points_xyz), dtype=bool)
+        if not len(arc_start_points):
+            return collided
+
+        # Add the minimum distance threshold to the delta velocity threshold (see '_detect_collision_using_collision_parameters()').
+        radians_per_kms = self.reconstruction_time_interval / pygplates.Earth.equatorial_radius_in_kms
+        max_distance_threshold_radians = (
+                (arc_threshold_distances_to_boundary_per_my.max() + delta_velocity_magnitudes.max()) * radians_per_kms)
+
+        # Cull arcs whose bounding caps are further than the largest distance threshold from the bounding cap of the points.
+        points_bounding_cap_centre = prev_points_xyz.sum(axis=0)
+        points_bounding_cap_centre_magnitude = np.linalg.norm(points_bounding_cap_centre)
+        if points_bounding_cap_centre_magnitude > great_circle_arcs.ZERO_MAGNITUDE_EPSILON:
+            points_bounding_cap_centre /= points_bounding_cap_centre_magnitude
+            points_bounding_cap_radius = np.arccos(np.clip(prev_points_xyz.dot(points_bounding_cap_centre), -1.0, 1.0)).max()
+            arc_distances_to_points_bounding_cap = (
+                    np.arccos(np.clip(arc_bounding_cap_centres.dot(points_bounding_cap_centre), -1.0, 1.0)) -
+                    arc_bounding_cap_radii - points_bounding_cap_radius)
+            arc_indices = np.flatnonzero(arc_distances_to_points_bounding_cap <= max_distance_threshold_radians)
+            if not len(arc_indices):
+                return collided
+        else:
+            arc_indices = np.arange(len(arc_start_points))
+
+        # Process the points in chunks to limit the size of the (points x arcs) distance matrix.
+        num_points_per_chunk = max(1, _MAX_COLLISION_DISTANCE_MATRIX_SIZE // len(arc_indices))
+        for chunk_start in range(0, len(prev_points_xyz), num_points_per_chunk):
+            chunk = slice(chunk_start, chunk_start + num_points_per_chunk)
+            chunk_delta_velocity_magnitudes = delta_velocity_magnitudes[chunk, np.newaxis]
+
+            distances = great_circle_arcs.get_distances_to_arcs(
+                    prev_points_xyz[chunk], arc_start_points[arc_indices], arc_end_points[arc_indices])
+            distance_thresholds = (
+                    (arc_threshold_distances_to_boundary_per_my[arc_indices] + chunk_delta_velocity_magnitudes) * radians_per_kms)
+
+            # A point collides if it's close enough to any arc with a low enough threshold velocity delta.
+            collided[chunk] = ((chunk_delta_velocity_magnitudes > arc_threshold_velocity_deltas[arc_indices]) &
+                               (distances <= distance_thresholds)).any(axis=-1)
+
+        return collided
+
+
+##################
+# Implementation #
+##################
+
+
+# Limit the number of elements in each (points x arcs) distance matrix when detecting collisions.
+_MAX_COLLISION_DISTANCE_MATRIX_SIZE = 1 << 20
+
+
+def _get_geometry_arcs(geometry):
+    # Returns the (start points, end points) arrays of the great circle arcs of a point, polyline or polygon.
+    if isinstance(geometry, pygplates.PointOnSphere):
+        points_xyz = np.asarray(geometry.to_xyz(), dtype=np.float64).reshape(-1, 3)
+        return points_xyz, points_xyz
+
+    points_xyz = great_circle_arcs.polyline_to_xyz_array(geometry)
+    if len(points_xyz) == 1:
+        return points_xyz, points_xyz
+
+    if isinstance(geometry, pygplates.PolygonOnSphere):
+        # A polygon also has an arc from its last point back to its first point.
+        return points_xyz, np.roll(points_xyz, -1, axis=0)
+
+    return points_xyz[:-1], points_xyz[1:]
@@ -16,6 +16,7 @@
 import pygplates
 import numpy as np
 import cartopy.crs as ccrs
+from .utils import cached_rotation_model
 
 def plot_velocities_uv(x,y,u,v,ax):
     '''draw the velocity vectors in a map
@@ -85,47 +86,70 @@ def make_GPML_velocity_feature(Long,Lat):
 # function to get velocites via pygplates  
 def get_plate_velocities(velocity_domain_features, topology_features, 
                          rotation_model, time, delta_time, rep='vector_comp'):
-    # All domain points and associated (magnitude, azimuth, inclination) velocities for the current time.
-    all_domain_points = []
-    all_velocities = []
+    '''get the velocities of the domain points on their partitioning plates
+    
+    The points are grouped by partitioning plate ID, so there is one stage rotation
+    and one batched velocity calculation per plate (rather than per point).
+    
+    Returns
+    -------
+    an (N,3) array with one row per domain point - (north, east, down) if rep is 'vector_comp' or
+    (magnitude, azimuth, inclination) if rep is 'mag_azim' - points outside all plates have zero velocity
+    '''
+    if rep not in ('mag_azim', 'vector_comp'):
+        raise ValueError('Unknown velocity representation "{0}".'.format(rep))
+
+    # The same stage rotation is requested for all points in the same plate.
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_model)
 
-    # Partition our velocity domain features into our topological plate polygons at the current 'time'.
-    plate_partitioner = pygplates.PlatePartitioner(topology_features, rotation_model, time)
+    # All domain points.
+    all_domain_points = []
     for velocity_domain_feature in velocity_domain_features:
         # A velocity domain feature usually has a single geometry but we'll assume it can be any number.
         # Iterate over them all.
         for velocity_domain_geometry in velocity_domain_feature.get_geometries():
-            for velocity_domain_point in velocity_domain_geometry.get_points():
-                all_domain_points.append(velocity_domain_point)
-                partitioning_plate = plate_partitioner.partition_point(velocity_domain_point)
-                if partitioning_plate:
-                    # We need the newly assigned plate ID to get the equivalent stage rotation of that tectonic plate.
-                    partitioning_plate_id = partitioning_plate.get_feature().get_reconstruction_plate_id()
-                    # Get the stage rotation of partitioning plate from 'time + delta_time' to 'time'.
-                    equivalent_stage_rotation = rotation_model.get_rotation(time, partitioning_plate_id, time + delta_time)
-
-                    # Calculate velocity at the velocity domain point.
-                    # This is from 'time + delta_time' to 'time' on the partitioning plate.
-                    velocity_vectors = pygplates.calculate_velocities(
-                        [velocity_domain_point],
-                        equivalent_stage_rotation,
-                        delta_time)
-                    
-                    if rep=='mag_azim':
-                        # Convert global 3D velocity vectors to local (magnitude, azimuth, inclination) tuples (one tuple per point).
-                        velocities = pygplates.LocalCartesian.convert_from_geocentric_to_magnitude_azimuth_inclination(
-                            [velocity_domain_point],
-                            velocity_vectors)
-                        all_velocities.append(velocities[0])
-
-                    elif rep=='vector_comp':
-                        # Convert global 3D velocity vectors to local (magnitude, azimuth, inclination) tuples (one tuple per point).
-                        velocities = pygplates.LocalCartesian.convert_from_geocentric_to_north_east_down(
-                                [velocity_domain_point],
-                                velocity_vectors)
-                        all_velocities.append(velocities[0])
-                else:
-                    all_velocities.append((0,0,0))
+            all_domain_points.extend(velocity_domain_geometry.get_points())
+
+    # Partition our velocity domain points into our topological plate polygons at the current 'time'.
+    plate_partitioner = pygplates.PlatePartitioner(topology_features, rotation_model.get_rotation_model(), time)
+    partitioning_plate_ids = np.zeros(len(all_domain_points), dtype=int)
+    is_partitioned = np.zeros(len(all_domain_points), dtype=bool)
+    for point_index, velocity_domain_point in enumerate(all_domain_points):
+        partitioning_plate = plate_partitioner.partition_point(velocity_domain_point)
+        if partitioning_plate:
+            # We need the newly assigned plate ID to get the equivalent stage rotation of that tectonic plate.
+            partitioning_plate_ids[point_index] = partitioning_plate.get_feature().get_reconstruction_plate_id()
+            is_partitioned[point_index] = True
+
+    # Points outside all plates have zero velocity.
+    all_velocities = np.zeros((len(all_domain_points), 3))
+    for partitioning_plate_id in np.unique(partitioning_plate_ids[is_partitioned]):
+        point_indices = np.flatnonzero(is_partitioned & (partitioning_plate_ids == partitioning_plate_id))
+        plate_points = [all_domain_points[point_index] for point_index in point_indices]
+
+        # Get the stage rotation of partitioning plate from 'time + delta_time' to 'time'.
+        equivalent_stage_rotation = rotation_model.get_rotation(time, int(partitioning_plate_id), time + delta_time)
+
+        # Calculate velocities at all the plate's domain points.
+        # This is from 'time + delta_time' to 'time' on the partitioning plate.
+        velocity_vectors = pygplates.calculate_velocities(
+            plate_points,
+            equivalent_stage_rotation,
+            delta_time)
+
+        if rep=='mag_azim':
+            # Convert global 3D velocity vectors to local (magnitude, azimuth, inclination) tuples (one tuple per point).
+            velocities = pygplates.LocalCartesian.convert_from_geocentric_to_magnitude_azimuth_inclination(
+                plate_points,
+                velocity_vectors)
+            all_velocities[point_indices] = velocities
+
+        elif rep=='vector_comp':
+            # Convert global 3D velocity vectors to local (north, east, down) vectors (one vector per point).
+            velocities = pygplates.LocalCartesian.convert_from_geocentric_to_north_east_down(
+                    plate_points,
+                    velocity_vectors)
+            all_velocities[point_indices] = [velocity.to_xyz() for velocity in velocities]
     return all_velocities
 
 def get_velocities(time,rotation_model,topology_filenames, delta_time = 5., Xnodes=[], Ynodes=[]):
@@ -178,6 +202,12 @@ def get_x_y_u_v(Xnodes, Ynodes, all_velocities):
     -------
     the coordinates of domain points and velocity u, v components
     '''
+    if isinstance(all_velocities, np.ndarray):
+        # An (N,3) array of (north, east, down) velocities.
+        u = all_velocities[:,1].reshape((Ynodes.shape[0],Xnodes.shape[0]))
+        v = all_velocities[:,0].reshape((Ynodes.shape[0],Xnodes.shape[0]))
+        return Xnodes, Ynodes, u, v
+
     uu=[]
     vv=[]
     for vel in all_velocities:
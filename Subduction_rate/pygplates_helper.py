@@ -1,5 +1,7 @@
+import os
 import numpy as np
 import pygplates
+from ptt.utils import cached_rotation_model
 from scipy.interpolate import RegularGridInterpolator as RGI
 
 
@@ -105,7 +107,100 @@ def fill_ndimage(data,invalid=None):
     ind = distance_transform_edt(invalid, return_distances=False, return_indices=True)
     return data[tuple(ind)]
 
-def read_netcdf_grid(filename, return_grids=False, resample=None):
+def get_nearest_indices(grid, x):
+    """
+    Return the indices of the nodes of (ascending) 1D 'grid' nearest to 'x'.
+
+    This is the same as the 'nearest' method of the RegularGridInterpolator above along one axis
+    (ties round down, and points outside the grid take the nearest edge node, since it does not fill
+    out-of-bounds points).
+    """
+    grid = np.asarray(grid)
+    x = np.asarray(x)
+    i = np.clip(np.searchsorted(grid, x) - 1, 0, grid.size - 2)
+    norm_distances = (x - grid[i]) / (grid[i+1] - grid[i])
+    return np.where(norm_distances <= .5, i, i+1)
+
+# The (row, column) gather indices of each resampling (keyed by the source and target grids).
+# All the grids in a time series are on the same grid, so these are only computed once.
+resample_indices_cache = {}
+
+def get_resample_indices(cdf_lon, cdf_lat, lon_grid, lat_grid):
+    """
+    Return the row and column indices (into a grid with 'cdf_lat' rows and 'cdf_lon' columns) of the
+    nearest neighbour of each node of the 'lat_grid' x 'lon_grid' grid, such that
+    grid[row_indices[:,None], column_indices] resamples 'grid'.
+
+    Nodes just outside 'grid' (eg, the last row of np.arange round-off) take the nearest edge node.
+    """
+    key = (np.asarray(cdf_lon).tobytes(), np.asarray(cdf_lat).tobytes(),
+           np.asarray(lon_grid).tobytes(), np.asarray(lat_grid).tobytes())
+    if key not in resample_indices_cache:
+        # The nearest neighbour of a regular grid is separable (nearest row and nearest column).
+        resample_indices_cache[key] = (get_nearest_indices(cdf_lat, lat_grid), get_nearest_indices(cdf_lon, lon_grid))
+    return resample_indices_cache[key]
+
+def get_window_offsets(radius):
+    """
+    Return the (row, column) offsets of the nodes within a square window of half-width 'radius'
+    (nodes) and their distances (in nodes), sorted by increasing distance.
+    """
+    row_offsets, column_offsets = np.mgrid[-radius:radius+1, -radius:radius+1]
+    row_offsets, column_offsets = row_offsets.ravel(), column_offsets.ravel()
+    distances = np.hypot(row_offsets, column_offsets)
+    order = np.argsort(distances, kind='stable')
+    return row_offsets[order], column_offsets[order], distances[order]
+
+def sample_grid_nearest_valid(lon, lat, grid, lon_grid, lat_grid, max_search_radius=64):
+    """
+    Sample 'grid' (with 'lat_grid' rows and 'lon_grid' columns) at the nearest node of each point,
+    where points whose nearest node is invalid (NaN or masked) take the value of the nearest valid node.
+
+    This gives the same values as sampling the grid filled by fill_ndimage, but only the nodes
+    around the points are accessed (so 'grid' can be a memory-mapped array and is never copied).
+    The nearest valid node is searched for in windows of increasing size (up to 'max_search_radius' nodes),
+    only points with no valid node within that radius (or when searching would access more nodes than
+    the grid contains) fall back to filling the entire grid.
+    Points outside the grid take the nearest edge node (as when sampling with the RegularGridInterpolator above).
+    """
+    nrows, ncols = np.shape(grid)
+    rows = get_nearest_indices(lat_grid, np.atleast_1d(lat))
+    columns = get_nearest_indices(lon_grid, np.atleast_1d(lon))
+
+    def gather(rows, columns):
+        # masked (and out-of-bounds) nodes are NaN
+        in_bounds = (rows >= 0) & (rows < nrows) & (columns >= 0) & (columns < ncols)
+        values = np.full(rows.shape, np.nan)
+        values[in_bounds] = np.ma.filled(np.ma.asarray(grid[rows[in_bounds], columns[in_bounds]], dtype=float), np.nan)
+        return values
+
+    values = gather(rows, columns)
+
+    # search for the nearest valid node of the invalid points, doubling the window each time
+    # (the nearest valid node in a window is the nearest overall if it is no further than the window half-width)
+    unresolved = np.flatnonzero(np.isnan(values))
+    radius = 1
+    while unresolved.size and radius <= max_search_radius:
+        if unresolved.size * (2 * radius + 1) ** 2 > nrows * ncols:
+            break
+        row_offsets, column_offsets, distances = get_window_offsets(radius)
+        window_values = gather(
+            rows[unresolved, np.newaxis] + row_offsets,
+            columns[unresolved, np.newaxis] + column_offsets)
+        window_valid = ~np.isnan(window_values)
+        # the offsets are sorted by distance, so the first valid node is the nearest
+        nearest = np.argmax(window_valid, axis=1)
+        found = window_valid.any(axis=1) & (distances[nearest] <= radius)
+        values[unresolved[found]] = window_values[found, nearest[found]]
+        unresolved = unresolved[~found]
+        radius *= 2
+
+    if unresolved.size:
+        values[unresolved] = fill_ndimage(np.ma.filled(np.ma.asarray(grid, dtype=float), np.nan))[rows[unresolved], columns[unresolved]]
+
+    return values
+
+def read_netcdf_grid(filename, return_grids=False, resample=None, fill=False, cache_dir=None):
     """
     Read in a netCDF file and re-align from -180 to 180 degrees
     
@@ -118,7 +213,22 @@ def read_netcdf_grid(filename, return_grids=False, resample=None):
     resample : tuple
         optionally resample grid, pass spacing in X and Y direction as a tuple
         e.g. resample=(spacingX, spacingY)
+    fill : bool
+        optionally replace invalid (NaN) cells by the nearest valid cell (see fill_ndimage)
+    cache_dir : str
+        optionally cache the (resampled/filled) grid in this directory, and memory-map it
+        on subsequent reads (the cache is re-created when the netCDF file is modified)
     """
+    if cache_dir is not None:
+        grid_cache_filename, grids_cache_filename = get_netcdf_grid_cache_filenames(filename, resample, fill, cache_dir)
+        if os.path.exists(grid_cache_filename) and os.path.exists(grids_cache_filename):
+            cdf_grid_z = np.load(grid_cache_filename, mmap_mode='r')
+            if return_grids:
+                with np.load(grids_cache_filename) as cached_grids:
+                    return cdf_grid_z, cached_grids['lon'], cached_grids['lat']
+            else:
+                return cdf_grid_z
+
     import netCDF4
     
     # open netCDF file and re-align from -180, 180 degrees
@@ -139,21 +249,59 @@ def read_netcdf_grid(filename, return_grids=False, resample=None):
         else:
             cdf_grid_z = cdf_grid[:]
 
-    # resample
+    # resample (gather the nearest neighbours)
     if resample is not None:
         spacingX, spacingY = resample
         lon_grid = np.arange(cdf_lon.min(), cdf_lon.max()+spacingX, spacingX)
         lat_grid = np.arange(cdf_lat.min(), cdf_lat.max()+spacingY, spacingY)
-        lonq, latq = np.meshgrid(lon_grid, lat_grid)
-        interp = RegularGridInterpolator((cdf_lat, cdf_lon), cdf_grid_z, method='nearest', bounds_error=False)
-        cdf_grid_z = interp((latq, lonq))
+        row_indices, column_indices = get_resample_indices(cdf_lon, cdf_lat, lon_grid, lat_grid)
+        cdf_grid_z = cdf_grid_z[row_indices[:,np.newaxis], column_indices]
         cdf_lon = lon_grid
         cdf_lat = lat_grid
+
+    if fill:
+        cdf_grid_z = fill_ndimage(cdf_grid_z)
+
+    if cache_dir is not None:
+        # masked cells are cached as NaN
+        cdf_grid_z = np.ma.filled(np.ma.asarray(cdf_grid_z, dtype=float), np.nan)
+        cdf_lon = np.ma.getdata(cdf_lon)
+        cdf_lat = np.ma.getdata(cdf_lat)
+        write_netcdf_grid_cache(grid_cache_filename, grids_cache_filename, cdf_grid_z, cdf_lon, cdf_lat)
             
     if return_grids:
         return cdf_grid_z, cdf_lon, cdf_lat
     else:
         return cdf_grid_z
+
+def get_netcdf_grid_cache_filenames(filename, resample, fill, cache_dir):
+    """
+    Return the cache filenames of the grid (.npy, so it can be memory-mapped) and
+    its lon, lat arrays (.npz) read from netCDF 'filename' with 'resample' and 'fill'.
+    """
+    import hashlib
+
+    # the modification time and size of the netCDF file are part of the key (so modified files are re-cached)
+    cache_key = hashlib.sha1(repr((
+        os.path.abspath(filename), os.path.getmtime(filename), os.path.getsize(filename),
+        None if resample is None else tuple(float(spacing) for spacing in resample), bool(fill))).encode('utf-8')).hexdigest()
+
+    cache_basename = os.path.join(cache_dir, '{0}_{1}'.format(
+        os.path.splitext(os.path.basename(filename))[0], cache_key[:16]))
+    return cache_basename + '.npy', cache_basename + '_grids.npz'
+
+def write_netcdf_grid_cache(grid_cache_filename, grids_cache_filename, grid, lon_grid, lat_grid):
+    cache_dir = os.path.dirname(grid_cache_filename)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # write to temporary files first (so that other processes never read a partially written file),
+    # the grid last since its existence marks the cache as complete
+    temporary_suffix = '.{0}.tmp'.format(os.getpid())
+    np.savez(grids_cache_filename + temporary_suffix + '.npz', lon=lon_grid, lat=lat_grid)
+    os.replace(grids_cache_filename + temporary_suffix + '.npz', grids_cache_filename)
+    np.save(grid_cache_filename + temporary_suffix + '.npy', grid)
+    os.replace(grid_cache_filename + temporary_suffix + '.npy', grid_cache_filename)
     
 def write_netcdf_grid(filename, grid, extent=[-180,180,-90,90]):
     import netCDF4
@@ -216,70 +364,56 @@ def haversine_distance(lon1, lon2, lat1, lat2):
 
 def get_point_velocities(lons, lats, topology_features, rotation_model, reconstruction_time, delta_time=1.0):
     """ function to make a velocity mesh nodes at an arbitrary set of points defined in Lat
-    Lon and Lat are assumed to be 1d arrays. """
-    # Add points to a multipoint geometry
+    Lon and Lat are assumed to be 1d arrays. 
+    Returns an (N,2) array of (north, east) velocities - points outside all plates have zero velocity. """
 
     reconstruction_time = float(reconstruction_time)
 
-    multi_point = pygplates.MultiPointOnSphere([(float(lat),float(lon)) for lat, lon in zip(lats,lons)])
-
-    # Create a feature containing the multipoint feature, and defined as MeshNode type
-    meshnode_feature = pygplates.Feature(pygplates.FeatureType.create_from_qualified_string('gpml:MeshNode'))
-    meshnode_feature.set_geometry(multi_point)
-    meshnode_feature.set_name('Velocity Mesh Nodes from pygplates')
-
-    velocity_domain_features = pygplates.FeatureCollection(meshnode_feature)
-    
-    # NB: at this point, the feature could be written to a file using
-    # output_feature_collection.write('myfilename.gpmlz')
-    
-    
-    # All domain points and associated (magnitude, azimuth, inclination) velocities for the current time.
-    all_domain_points = []
-    all_velocities = []
-
-    # Partition our velocity domain features into our topological plate polygons at the current 'time'.
-    plate_partitioner = pygplates.PlatePartitioner(topology_features, rotation_model, reconstruction_time)
-
-    for velocity_domain_feature in velocity_domain_features:
-        # A velocity domain feature usually has a single geometry but we'll assume it can be any number.
-        # Iterate over them all.
-        for velocity_domain_geometry in velocity_domain_feature.get_geometries():
-
-            for velocity_domain_point in velocity_domain_geometry.get_points():
-
-                all_domain_points.append(velocity_domain_point)
-
-                partitioning_plate = plate_partitioner.partition_point(velocity_domain_point)
-                if partitioning_plate:
-
-                    # We need the newly assigned plate ID
-                    # to get the equivalent stage rotation of that tectonic plate.
-                    partitioning_plate_id = partitioning_plate.get_feature().get_reconstruction_plate_id()
-
-                    # Get the stage rotation of partitioning plate from 'time + delta_time' to 'time'.
-                    equivalent_stage_rotation = rotation_model.get_rotation(reconstruction_time,
-                                                                            partitioning_plate_id,
-                                                                            reconstruction_time + delta_time)
-
-                    # Calculate velocity at the velocity domain point.
-                    # This is from 'time + delta_time' to 'time' on the partitioning plate.
-                    velocity_vectors = pygplates.calculate_velocities(
-                        [velocity_domain_point],
-                        equivalent_stage_rotation,
-                        delta_time)
-
-                    # Convert global 3D velocity vectors to local (magnitude, azimuth, inclination) tuples
-                    # (one tuple per point).
-                    velocities =pygplates.LocalCartesian.convert_from_geocentric_to_north_east_down(
-                            [velocity_domain_point],
-                            velocity_vectors)
-                    all_velocities.append((velocities[0].get_x(), velocities[0].get_y()))
-
-                else:
-                    all_velocities.append((0,0))
+    all_domain_points = [pygplates.PointOnSphere(float(lat),float(lon)) for lat, lon in zip(lats,lons)]
+
+    # The same stage rotation is requested for all points in the same plate.
+    rotation_model = cached_rotation_model.get_cached_rotation_model(rotation_model)
+
+    # Partition our velocity domain points into our topological plate polygons at the current 'time'.
+    plate_partitioner = pygplates.PlatePartitioner(topology_features, rotation_model.get_rotation_model(), reconstruction_time)
+
+    partitioning_plate_ids = np.zeros(len(all_domain_points), dtype=int)
+    is_partitioned = np.zeros(len(all_domain_points), dtype=bool)
+    for point_index, velocity_domain_point in enumerate(all_domain_points):
+        partitioning_plate = plate_partitioner.partition_point(velocity_domain_point)
+        if partitioning_plate:
+            # We need the newly assigned plate ID
+            # to get the equivalent stage rotation of that tectonic plate.
+            partitioning_plate_ids[point_index] = partitioning_plate.get_feature().get_reconstruction_plate_id()
+            is_partitioned[point_index] = True
+
+    # Group the points by partitioning plate so that each plate has one stage rotation
+    # and one batched velocity calculation (rather than one per point).
+    all_velocities = np.zeros((len(all_domain_points), 2))
+    for partitioning_plate_id in np.unique(partitioning_plate_ids[is_partitioned]):
+        point_indices = np.flatnonzero(is_partitioned & (partitioning_plate_ids == partitioning_plate_id))
+        plate_points = [all_domain_points[point_index] for point_index in point_indices]
+
+        # Get the stage rotation of partitioning plate from 'time + delta_time' to 'time'.
+        equivalent_stage_rotation = rotation_model.get_rotation(reconstruction_time,
+                                                                int(partitioning_plate_id),
+                                                                reconstruction_time + delta_time)
+
+        # Calculate velocity at the velocity domain points.
+        # This is from 'time + delta_time' to 'time' on the partitioning plate.
+        velocity_vectors = pygplates.calculate_velocities(
+            plate_points,
+            equivalent_stage_rotation,
+            delta_time)
+
+        # Convert global 3D velocity vectors to local (north, east, down) vectors
+        # (one vector per point).
+        velocities = pygplates.LocalCartesian.convert_from_geocentric_to_north_east_down(
+                plate_points,
+                velocity_vectors)
+        all_velocities[point_indices] = [(velocity.get_x(), velocity.get_y()) for velocity in velocities]
                     
-    return np.array(all_velocities)
+    return all_velocities
 
 def get_valid_geometries(shape_filename):
     """ only return valid geometries """
@@ -296,7 +430,7 @@ def get_reconstructed_polygons(feature, rotation_model, time):
     import shapely
 
     reconstructed_feature = []
-    pygplates.reconstruct(feature, rotation_model, reconstructed_feature, float(time))
+    pygplates.reconstruct(feature, cached_rotation_model.get_rotation_model(rotation_model), reconstructed_feature, float(time))
 
     all_geometries = []
     for feature in reconstructed_feature:
@@ -321,7 +455,7 @@ def get_reconstructed_lines(feature, rotation_model, time):
     import shapely
 
     reconstructed_feature = []
-    pygplates.reconstruct(feature, rotation_model, reconstructed_feature, float(time))
+    pygplates.reconstruct(feature, cached_rotation_model.get_rotation_model(rotation_model), reconstructed_feature, float(time))
 
     all_geometries = []
     for feature in reconstructed_feature:
@@ -400,7 +534,7 @@ def get_ridge_transforms(topology_features, rotation_model, reconstruction_time)
     resolved_topologies = []
     shared_boundary_sections = []
     pygplates.resolve_topologies(topology_features,
-                                 rotation_model,
+                                 cached_rotation_model.get_rotation_model(rotation_model),
                                  resolved_topologies,
                                  reconstruction_time,
                                  shared_boundary_sections)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Load the proxy time series (CO2, carbon flux, Li and Sr isotopes, temperature)
+shared by the regression and signal processing scripts.
+
+Each source file is parsed, resampled to 1 Myr and normalized once, and the resulting
+arrays are cached in a '.npz' file (in a 'proxy_cache' directory next to the source file)
+keyed by the hash of the source file contents, so later runs just load the arrays
+(and a modified source file is parsed again).
+"""
+import os
+import csv
+import hashlib
+import numpy as np
+from scipy import interpolate
+
+
+# bump this when a parser changes (so the cached series are parsed again)
+CACHE_VERSION = 1
+CACHE_DIRNAME = 'proxy_cache'
+
+
+
+def normalize(values):
+    '''
+    min-max normalization to the range 0~1
+    '''
+    values_max = values.max()
+    values_min = values.min()
+    return (values-values_min) / (values_max-values_min)
+
+
+
+def load_cached(file, parse, cache=True):
+    '''
+    return the arrays parse(file) returns, loading them from the cache if the file has not changed
+    (otherwise parse the file and cache the arrays)
+    '''
+    if not cache:
+        return parse(file)
+
+    with open(file, 'rb') as f:
+        source_hash = hashlib.sha1(f.read())
+    source_hash.update(f'{parse.__name__}:{CACHE_VERSION}'.encode('utf-8'))
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file)), CACHE_DIRNAME)
+    cache_prefix = f'{os.path.basename(file)}_{parse.__name__}_'
+    cache_file = os.path.join(cache_dir, cache_prefix + source_hash.hexdigest()[:16] + '.npz')
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            return tuple(data[f'arr_{i}'] for i in range(len(data.files)))
+
+    arrays = parse(file)
+
+    # remove the cache files of previous versions of the source file
+    os.makedirs(cache_dir, exist_ok=True)
+    for cache_name in os.listdir(cache_dir):
+        if cache_name.startswith(cache_prefix):
+            os.remove(os.path.join(cache_dir, cache_name))
+
+    # write to a temporary file first (so other processes never read a partially written file)
+    temporary_cache_file = f'{cache_file}.{os.getpid()}.tmp.npz'
+    np.savez(temporary_cache_file, *arrays)
+    os.replace(temporary_cache_file, cache_file)
+
+    return arrays
+
+
+
+def parse_CO2(file):
+    f = open(file, 'r', encoding=u'utf-8', errors='ignore')
+    reader = csv.reader(f)
+    reader = list(reader)
+    f.close()
+    age = np.array([float(row[0]) for row in reader])
+    CO2 = np.array([float(row[1]) for row in reader])
+
+    # interpolate to 1~65 with interval of 1 Ma
+    age_interp = np.arange(1,66)
+    f = interpolate.interp1d(age, CO2)
+    CO2_interp = f(age_interp)
+
+    # calculate feedback strength (Caves et al., 2016)
+    CO2_modern = 278 # pre-industrial CO2 (Foster et al., 2015)
+    # feedback strength relative to modern
+    R_CO2 = CO2_interp / CO2_modern
+    R_fs = np.log2(R_CO2) + 1
+
+    return age_interp, normalize(CO2_interp), R_fs
+
+
+
+def load_CO2(file, cache=True):
+    '''
+    normalized CO2 (and feedback strength) at 1~65 Ma with interval of 1 Ma
+    '''
+    return load_cached(file, parse_CO2, cache)
+
+
+
+def parse_carbon_flux(file):
+    with open(file, 'r') as f:
+        header = next(csv.reader(f))
+    data = np.loadtxt(file, delimiter=',', skiprows=1)
+    age = data[0:65, header.index('# time')]
+    carbon_flux = data[0:65, header.index('total_subducted_mean  (Mt C/yr)')]
+
+    return age, normalize(carbon_flux)
+
+
+
+def load_carbon_flux(file, cache=True):
+    '''
+    normalized mean subducted carbon flux (of the tomography models) at 1~65 Ma
+    '''
+    return load_cached(file, parse_carbon_flux, cache)
+
+
+
+def parse_flux_file(file):
+    # columns: age, slab flux, lithosphere, serpentinite, crust and sediment carbon flux, total carbon flux
+    data = np.loadtxt(file, skiprows=1)
+
+    return data[:, 0], data[:, 1], data[:, 6]
+
+
+
+def load_flux_file(file, cache=True):
+    '''
+    age, slab flux (km^3/yr) and total carbon flux (Mt/yr) of one tomography model
+    (as written by Calculate_subducted_Carbonflux.py), not normalized
+    '''
+    return load_cached(file, parse_flux_file, cache)
+
+
+
+def parse_Li_isotope(file):
+    import pandas as pd
+    df = pd.read_excel(file, sheet_name='All Foram')
+    Age = np.array(df['Age'])[3:].astype(float)
+    Li_isotope = np.array(df['Li'])[3:].astype(float)
+
+    # 5 points running mean (of consecutive blocks of 5 points, the last block can be shorter)
+    block_starts = np.arange(0, len(Age), 5)
+    block_lengths = np.diff(np.append(block_starts, len(Age)))
+    Age_new = np.add.reduceat(Age, block_starts) / block_lengths
+    Li_isotope_new = np.add.reduceat(Li_isotope, block_starts) / block_lengths
+
+    # interpolate to 1~65 with interval of 1 Ma
+    Age_interp = np.arange(1,66)
+    f = interpolate.interp1d(Age_new, Li_isotope_new)
+    Li_interp = f(Age_interp)
+
+    return Age_interp, normalize(Li_interp)
+
+
+
+def load_Li_isotope(file, cache=True):
+    '''
+    normalized Li isotope (5 points running mean) at 1~65 Ma with interval of 1 Ma
+    '''
+    return load_cached(file, parse_Li_isotope, cache)
+
+
+
+def parse_Sr_isotope(file):
+    data = np.loadtxt(file)
+
+    return data[:, 0], normalize(data[:, 1])
+
+
+
+def load_Sr_isotope(file, cache=True):
+    '''
+    normalized Sr isotope ratio (at the ages in the file)
+    '''
+    return load_cached(file, parse_Sr_isotope, cache)
+
+
+
+def parse_temperature(file):
+    data = np.loadtxt(file)
+
+    age_interp = np.arange(1,66)
+    f = interpolate.interp1d(data[:, 0], data[:, 1], kind='cubic')
+    temp_interp = f(age_interp)
+
+    return age_interp, normalize(temp_interp)
+
+
+
+def load_temperature(file, cache=True):
+    '''
+    normalized temperature at 1~65 Ma with interval of 1 Ma
+    '''
+    return load_cached(file, parse_temperature, cache)
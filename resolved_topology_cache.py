@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Cache the resolved topologies of a plate motion model on disk.
+
+The boundary sub-segments of the resolved topologies at each reconstruction time are
+stored as compact arrays in a '.npz' file keyed by (model files hash, time, anchor plate),
+so later runs load the boundary geometries instead of resolving the topologies again.
+"""
+import os
+import hashlib
+import numpy as np
+from gplately import pygplates
+
+
+def model_files_hash(model_filenames):
+    # hash the contents of the model files (independent of their order and directory)
+    model_hash = hashlib.sha1()
+    for model_filename in sorted(model_filenames, key=os.path.basename):
+        model_hash.update(os.path.basename(model_filename).encode('utf-8'))
+        with open(model_filename, 'rb') as model_file:
+            for chunk in iter(lambda: model_file.read(1 << 20), b''):
+                model_hash.update(chunk)
+    return model_hash.hexdigest()
+
+
+def resolve_topology_arrays(rotation_model, topology_features, time, anchor_plate_id=0):
+    '''resolve the topologies and extract their boundary sub-segments as arrays
+    
+    Returns
+    -------
+    a dict of arrays with one entry per boundary sub-segment (in the order of the resolved topologies):
+        'topology_plate_id': plate ID of the resolved topology the sub-segment belongs to
+        'plate_id': plate ID of the sub-segment feature
+        'feature_type': feature type of the sub-segment (eg, 'gpml:SubductionZone')
+        'polarity': subduction polarity of the sub-segment ('Left', 'Right', or '' if none)
+        'reversed': whether the sub-segment geometry was reversed in the topology
+        'offsets': the points of sub-segment i are points[offsets[i]:offsets[i+1]]
+    and 'points' (all sub-segment points as (lat, lon) rows)
+    '''
+    resolved_topologies = []
+    pygplates.resolve_topologies(topology_features, rotation_model, resolved_topologies, time, anchor_plate_id=anchor_plate_id)
+
+    topology_plate_ids = []
+    plate_ids = []
+    feature_types = []
+    polarities = []
+    reversed_flags = []
+    offsets = [0]
+    points = []
+    for resolved_topology in resolved_topologies:
+        topology_plate_id = resolved_topology.get_feature().get_reconstruction_plate_id()
+        for boundary_sub_segment in resolved_topology.get_boundary_sub_segments():
+            sub_segment_feature = boundary_sub_segment.get_resolved_feature()
+            sub_segment_geometry = boundary_sub_segment.get_resolved_geometry()
+            if isinstance(sub_segment_geometry, pygplates.PointOnSphere):
+                sub_segment_points = [sub_segment_geometry.to_lat_lon()]
+            else:
+                sub_segment_points = sub_segment_geometry.to_lat_lon_list()
+
+            topology_plate_ids.append(topology_plate_id)
+            plate_ids.append(sub_segment_feature.get_reconstruction_plate_id())
+            feature_types.append(sub_segment_feature.get_feature_type().to_qualified_string())
+            polarity = sub_segment_feature.get_enumeration(pygplates.PropertyName.gpml_subduction_polarity)
+            polarities.append(polarity if polarity else '')
+            reversed_flags.append(boundary_sub_segment.was_geometry_reversed_in_topology())
+            points.extend(sub_segment_points)
+            offsets.append(len(points))
+
+    return {
+        'topology_plate_id': np.array(topology_plate_ids, dtype=np.int32),
+        'plate_id': np.array(plate_ids, dtype=np.int32),
+        'feature_type': np.array(feature_types, dtype=str),
+        'polarity': np.array(polarities, dtype=str),
+        'reversed': np.array(reversed_flags, dtype=bool),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'points': np.array(points, dtype=np.float64).reshape(-1, 2)}
+
+
+class ResolvedTopologyCache(object):
+    '''resolved topologies of one plate motion model, cached on disk per reconstruction time
+    
+    Parameters
+    ----------
+    cache_dir: the directory of the cache files (created if it does not exist)
+    model_filenames: the rotation and topology files of the model (their contents are hashed into the cache key,
+                     so editing a file invalidates its cached topologies)
+    anchor_plate_id: the anchor plate used to resolve the topologies
+    '''
+    def __init__(self, cache_dir, model_filenames, anchor_plate_id=0):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+        self.model_hash = model_files_hash(model_filenames)
+        self.anchor_plate_id = anchor_plate_id
+
+    def get_cache_filename(self, time):
+        return os.path.join(self.cache_dir, 'resolved_topologies_{}_anchor{}_{:g}Ma.npz'.format(
+            self.model_hash[:16], self.anchor_plate_id, float(time)))
+
+    def get(self, rotation_model, topology_features, time):
+        '''load the topology arrays (see resolve_topology_arrays) at time, resolving and caching them if not cached yet'''
+        cache_filename = self.get_cache_filename(time)
+        if os.path.exists(cache_filename):
+            with np.load(cache_filename) as cache_file:
+                return dict(cache_file)
+
+        topology_arrays = resolve_topology_arrays(rotation_model, topology_features, time, self.anchor_plate_id)
+
+        # write to a temporary file first (so that parallel runs never read a partially written file)
+        temporary_filename = '{}.{}.tmp'.format(cache_filename, os.getpid())
+        with open(temporary_filename, 'wb') as cache_file:
+            np.savez_compressed(cache_file, **topology_arrays)
+        os.replace(temporary_filename, cache_filename)
+
+        return topology_arrays
+
+    def get_boundary_segments(self, rotation_model, topology_features, time, feature_type=None):
+        '''get the boundary sub-segments (optionally only those of feature_type, eg, 'gpml:SubductionZone') at time
+        
+        Returns
+        -------
+        a list with one list of (lat, lon) tuples per sub-segment
+        '''
+        topology_arrays = self.get(rotation_model, topology_features, time)
+        offsets = topology_arrays['offsets']
+        points = topology_arrays['points'].tolist()
+
+        segments = []
+        for segment_index in range(len(offsets) - 1):
+            if feature_type is not None and topology_arrays['feature_type'][segment_index] != feature_type:
+                continue
+            segments.append([tuple(point) for point in points[offsets[segment_index]:offsets[segment_index + 1]]])
+        return segments